@@ -0,0 +1,229 @@
+import os
+import re
+import time
+import statistics
+import torch
+from dotenv import load_dotenv
+from transformers.models.table_transformer.modeling_table_transformer import TableTransformerObjectDetectionOutput
+
+load_dotenv()
+
+# "eager"      - the fp32 PyTorch models as loaded from the hub (default).
+# "torch-int8" - dynamic int8 quantization of the Linear layers, still in PyTorch.
+# "onnx"       - the models exported to ONNX and run with ONNX Runtime.
+# "onnx-int8"  - the ONNX export with dynamically quantized int8 weights.
+# Everything but "eager" targets CPU-only nodes.
+BACKENDS = ("eager", "torch-int8", "onnx", "onnx-int8")
+BACKEND_CACHE_DIR = os.getenv("INFERENCE_BACKEND_CACHE", "cache/backends")
+
+
+class EagerBackend:
+    """
+    Calls the PyTorch model directly. Every backend is called like the model,
+    `backend(pixel_values, pixel_mask=None)`, and returns outputs with `logits`
+    and `pred_boxes`, so the rest of TableExtractor doesn't care which runs.
+    """
+    name = "eager"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, pixel_values, pixel_mask=None):
+        with torch.no_grad():
+            if pixel_mask is None:
+                return self.model(pixel_values.to(self.device))
+            return self.model(pixel_values.to(self.device), pixel_mask=pixel_mask.to(self.device))
+
+
+class QuantizedTorchBackend(EagerBackend):
+    """
+    Dynamic int8 quantization of the transformer's Linear layers (CPU only).
+    Quantizing only packs the Linear weights and takes a moment at load, so
+    nothing is cached on disk.
+    """
+    name = "torch-int8"
+
+    def __init__(self, model):
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=False)
+        quantized.eval()
+        super().__init__(quantized, "cpu")
+
+
+class _OnnxExportWrapper(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values, pixel_mask):
+        outputs = self.model(pixel_values=pixel_values, pixel_mask=pixel_mask)
+        return outputs.logits, outputs.pred_boxes
+
+
+class OnnxBackend:
+    """
+    Runs an ONNX export of the model with ONNX Runtime on CPU. The export
+    (and its int8-quantized variant) is cached under BACKEND_CACHE_DIR.
+    """
+    name = "onnx"
+
+    def __init__(self, model, artifact_path: str, quantize: bool = False, intra_op_threads: int = 0):
+        import onnxruntime
+
+        fp32_path = artifact_path.replace("-int8.onnx", ".onnx")
+        if not os.path.exists(fp32_path):
+            self._export(model, fp32_path)
+        if quantize and not os.path.exists(artifact_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            _atomic_save(artifact_path, lambda path: quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8))
+        if quantize:
+            self.name = "onnx-int8"
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            artifact_path if quantize else fp32_path, options, providers=["CPUExecutionProvider"]
+        )
+
+    def _export(self, model, path: str):
+        sample = torch.zeros((1, 3, 800, 800))
+        mask = torch.ones((1, 800, 800), dtype=torch.long)
+        _atomic_save(path, lambda tmp_path: torch.onnx.export(
+            _OnnxExportWrapper(model.cpu().eval()),
+            (sample, mask),
+            tmp_path,
+            input_names=["pixel_values", "pixel_mask"],
+            output_names=["logits", "pred_boxes"],
+            dynamic_axes={
+                "pixel_values": {0: "batch", 2: "height", 3: "width"},
+                "pixel_mask": {0: "batch", 1: "height", 2: "width"},
+                "logits": {0: "batch"},
+                "pred_boxes": {0: "batch"},
+            },
+            opset_version=17,
+        ))
+
+    def __call__(self, pixel_values, pixel_mask=None):
+        if pixel_mask is None:
+            pixel_mask = torch.ones((pixel_values.shape[0], pixel_values.shape[2], pixel_values.shape[3]), dtype=torch.long)
+        logits, pred_boxes = self.session.run(None, {
+            "pixel_values": pixel_values.cpu().numpy(),
+            "pixel_mask": pixel_mask.cpu().numpy().astype("int64"),
+        })
+        return TableTransformerObjectDetectionOutput(
+            logits=torch.from_numpy(logits), pred_boxes=torch.from_numpy(pred_boxes)
+        )
+
+
+def _atomic_save(path: str, save):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def artifact_path(backend: str, model_id: str, revision: str) -> str:
+    """Cache path of an ONNX export; keyed on model, revision and torch version."""
+    slug = re.sub(r'[^A-Za-z0-9.]+', '-', f"{model_id}-{revision}-torch{torch.__version__}")
+    suffix = "-int8" if backend.endswith("int8") else ""
+    return os.path.join(BACKEND_CACHE_DIR, f"{slug}{suffix}.onnx")
+
+
+def load_backend(backend: str, model, model_id: str, revision: str, device: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}.")
+    if backend == "eager":
+        return EagerBackend(model, device)
+    if device != "cpu":
+        raise ValueError(f"The '{backend}' backend only runs on CPU, not on '{device}'.")
+    if backend == "torch-int8":
+        return QuantizedTorchBackend(model)
+    return OnnxBackend(model, artifact_path(backend, model_id, revision), quantize=backend == "onnx-int8",
+                       intra_op_threads=torch.get_num_threads())
+
+
+def _match_objects(reference: list, candidate: list) -> float:
+    """Mean best IoU of every reference object against candidate objects of the same label."""
+    from model import _box_iou
+    if not reference:
+        return 1.0 if not candidate else 0.0
+    ious = []
+    for obj in reference:
+        same_label = [c['bbox'] for c in candidate if c['label'] == obj['label']]
+        ious.append(max((_box_iou(obj['bbox'], bbox) for bbox in same_label), default=0.0))
+    return sum(ious) / len(ious)
+
+
+def _cell_agreement(reference: dict, candidate: dict) -> float:
+    cells = [(row, col, text) for row, texts in reference.items() for col, text in enumerate(texts)]
+    if not cells:
+        return 1.0 if not candidate else 0.0
+    same = sum(1 for row, col, text in cells
+               if row in candidate and col < len(candidate[row]) and candidate[row][col] == text)
+    return same / len(cells)
+
+
+def compare_backends(image_path: str, backends=BACKENDS, runs: int = 5,
+                     min_box_iou: float = 0.9, min_cell_agreement: float = 0.98) -> dict:
+    """
+    Accuracy-parity and latency check of every backend against "eager" on one
+    report image (sample_report.png). Parity compares the detection and
+    structure objects (mean IoU per label) and the extracted cell texts; latency
+    is the median over `runs` calls of each model.
+    """
+    from PIL import Image
+    from model import TableExtractor
+
+    image = Image.open(image_path).convert("RGB")
+    report = {}
+    reference = None
+    # "eager" always runs first, it is the reference for the others.
+    for backend in ["eager"] + [b for b in backends if b != "eager"]:
+        extractor = TableExtractor(device="cpu", backend=backend)
+        detection_input = extractor.detection_transform(image)
+        detection = extractor._outputs_to_objects(
+            extractor._run_model("detection", detection_input), image.size, extractor.id2label)
+        structure_input, structure = None, []
+        if detection:
+            cropped_table = image.crop(extractor._select_tables(detection)[0]['bbox'])
+            structure_input = extractor.structure_transform(cropped_table)
+            structure = extractor._outputs_to_objects(
+                extractor._run_model("structure", structure_input), cropped_table.size, extractor.structure_id2label)
+        extracted = extractor.extract_table(image)
+
+        latency = {}
+        for name, pixel_values in (("detection", detection_input), ("structure", structure_input)):
+            if pixel_values is None:
+                continue
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                extractor._run_model(name, pixel_values)
+                timings.append(time.perf_counter() - started)
+            latency[f"{name}_ms"] = round(statistics.median(timings) * 1000, 1)
+
+        result = {"latency": latency, "confidence": extracted.get("confidence")}
+        if reference is None:
+            reference = {"detection": detection, "structure": structure, "data": extracted.get("data", {})}
+        else:
+            result["detection_iou"] = round(_match_objects(reference["detection"], detection), 4)
+            result["structure_iou"] = round(_match_objects(reference["structure"], structure), 4)
+            result["cell_agreement"] = round(_cell_agreement(reference["data"], extracted.get("data", {})), 4)
+            result["parity"] = (result["detection_iou"] >= min_box_iou and result["structure_iou"] >= min_box_iou
+                                and result["cell_agreement"] >= min_cell_agreement)
+        report[backend] = result
+        del extractor
+    return report
+
+
+if __name__ == '__main__':
+    # Usage (from the app/ directory): python backends.py ../sample_report.png
+    import sys
+    import json
+
+    image_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "sample_report.png")
+    report = compare_backends(image_path)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(result.get("parity", True) for result in report.values()) else 1)
@@ -0,0 +1,172 @@
+import json
+import shutil
+import asyncio
+import tarfile
+import zipfile
+import tempfile
+
+# PDFs (and multi-frame TIFFs) are read as multi-page reports, see documents.py.
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp", ".pdf")
+BATCH_MODES = ("normalize", "analyze", "summarize")
+
+
+class BatchItem:
+    """
+    One report of a batch request. `load()` returns the image bytes or the
+    report text; items are only read when a worker picks them up, so a
+    large archive is never held in memory all at once.
+    """
+    def __init__(self, index: int, item_id: str, kind: str, load):
+        self.index = index
+        self.id = item_id
+        self.kind = kind  # "image" or "text"
+        self.load = load
+
+
+class SpooledUpload:
+    """
+    Our own copy of an UploadFile. FastAPI closes uploads once the endpoint
+    returns, while a streamed batch keeps reading them long after that.
+    """
+    def __init__(self, filename: str, file):
+        self.filename = filename
+        self.file = file
+
+
+def _spool(upload) -> SpooledUpload:
+    upload.file.seek(0)
+    copy = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    shutil.copyfileobj(upload.file, copy)
+    copy.seek(0)
+    return SpooledUpload(upload.filename, copy)
+
+
+async def spool_uploads(uploads: list) -> list:
+    return [await asyncio.to_thread(_spool, upload) for upload in uploads if upload is not None]
+
+
+def close_uploads(uploads: list):
+    for upload in uploads:
+        upload.file.close()
+
+
+def _archive_members(upload):
+    """Yields (name, loader) for every image inside a zip or tar upload."""
+    upload.file.seek(0)
+    if zipfile.is_zipfile(upload.file):
+        upload.file.seek(0)
+        archive = zipfile.ZipFile(upload.file)
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield info.filename, (lambda info=info: archive.read(info))
+        return
+
+    # A (compressed) tar is one sequential stream, so a member is read while
+    # iterating, not later from a worker thread: concurrent extractfile()
+    # reads seek the shared gzip stream under each other.
+    upload.file.seek(0)
+    archive = tarfile.open(fileobj=upload.file, mode="r:*")
+    for member in archive:
+        if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+            data = archive.extractfile(member).read()
+            yield member.name, (lambda data=data: data)
+
+
+def _is_archive(upload) -> bool:
+    name = (upload.filename or "").lower()
+    return name.endswith((".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz"))
+
+
+def _text_reports(upload):
+    """
+    Yields (id, text) for every line of a JSONL upload. Each line is an object
+    with the report text under "text_input", "text" or "body" and an optional
+    "id" / "request_id" (the line number otherwise).
+    """
+    upload.file.seek(0)
+    for line_number, raw_line in enumerate(upload.file, start=1):
+        if not raw_line.strip():
+            continue
+        try:
+            record = json.loads(raw_line)
+            text = record.get("text_input") or record.get("text") or record.get("body")
+            item_id = str(record.get("id") or record.get("request_id") or f"line-{line_number}")
+        except (json.JSONDecodeError, AttributeError) as e:
+            yield f"line-{line_number}", ValueError(f"Invalid JSON line: {e}")
+            continue
+        yield item_id, text if text else ValueError("No text_input/text/body field in the line.")
+
+
+def iter_batch_items(files: list, reports=None):
+    """
+    Lazily turns a batch request into BatchItems: every uploaded image, every
+    image inside uploaded zip/tar archives, and every line of a JSONL upload.
+    """
+    index = 0
+    for upload in files or []:
+        if _is_archive(upload):
+            for name, loader in _archive_members(upload):
+                yield BatchItem(index, f"{upload.filename}:{name}", "image", loader)
+                index += 1
+        else:
+            yield BatchItem(index, upload.filename or f"file-{index}", "image",
+                            lambda upload=upload: (upload.file.seek(0), upload.file.read())[1])
+            index += 1
+
+    if reports is not None:
+        for item_id, text in _text_reports(reports):
+            yield BatchItem(index, item_id, "text", lambda text=text: _raise_or_return(text))
+            index += 1
+
+
+def _raise_or_return(value):
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+
+async def stream_batch(items, process_item, concurrency: int = 4):
+    """
+    Runs `await process_item(item)` for every item with at most `concurrency`
+    items in flight, yielding one NDJSON line per item as soon as it finishes.
+    A failing item produces an error line and doesn't affect the others.
+    """
+    items = iter(items)
+    results = asyncio.Queue(maxsize=2 * max(1, concurrency))  # backpressure on slow readers
+    done = object()
+    # Pulling an item reads (and decompresses) archive data, so it runs in a
+    # thread, one pull at a time: the iterator is a generator over shared files.
+    pulling = asyncio.Lock()
+
+    async def worker():
+        while True:
+            try:
+                async with pulling:
+                    item = await asyncio.to_thread(next, items, done)
+            except Exception as e:
+                # e.g. a truncated or corrupt archive; report it and stop reading further items.
+                await results.put({"index": None, "id": None, "status": "error", "error": f"Could not read batch input: {e}"})
+                break
+            if item is done:
+                break
+            try:
+                result = await process_item(item)
+                line = {"index": item.index, "id": item.id, "status": "ok", "result": result}
+            except Exception as e:
+                line = {"index": item.index, "id": item.id, "status": "error", "error": str(e)}
+            await results.put(line)
+        await results.put(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        finished = 0
+        while finished < len(workers):
+            line = await results.get()
+            if line is done:
+                finished += 1
+                continue
+            yield json.dumps(line) + "\n"
+    finally:
+        # The client went away (or we are done): stop pulling new items.
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,139 @@
+import os
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+import torch
+
+
+def pad_images(images: list) -> tuple:
+    """
+    Pads (C, H, W) images to the largest height/width among them and stacks
+    them. The returned pixel mask keeps the padding out of attention, and
+    DETR-style boxes stay relative to each image's own (unpadded) size.
+    """
+    max_h = max(image.shape[1] for image in images)
+    max_w = max(image.shape[2] for image in images)
+    pixel_values = torch.zeros((len(images), images[0].shape[0], max_h, max_w), dtype=images[0].dtype)
+    pixel_mask = torch.zeros((len(images), max_h, max_w), dtype=torch.long)
+    for i, image in enumerate(images):
+        _, h, w = image.shape
+        pixel_values[i, :, :h, :w] = image
+        pixel_mask[i, :h, :w] = 1
+    return pixel_values, pixel_mask
+
+
+def split_outputs(outputs) -> list:
+    """Splits batched detection outputs into batch-size-1 outputs, one per image."""
+    return [
+        type(outputs)(logits=outputs.logits[i:i + 1], pred_boxes=outputs.pred_boxes[i:i + 1])
+        for i in range(outputs.logits.shape[0])
+    ]
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-image calls to one table-transformer model into
+    padded batches.
+
+    Callers hand `submit` a (C, H, W) tensor and block until their slice of the
+    batched output is ready. A background thread waits at most `max_wait_ms`
+    after the first pending image (or until `max_batch_size` images are
+    queued), pads the images to a common size with a pixel mask and runs the
+    model once. Raising `max_batch_size`/`max_wait_ms` trades per-request
+    latency for throughput; `stats()` shows the batch sizes actually reached.
+    The thread is started by the first `submit`, in the process that submits,
+    so a batcher built before a fork (gunicorn --preload) works in the workers.
+    """
+    def __init__(self, model, device, max_batch_size: int = 4, max_wait_ms: float = 5.0, name: str = "model"):
+        self.model = model
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._total_wait = 0.0
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, pixel_values: torch.Tensor):
+        """Runs the model on one (C, H, W) image and returns batch-size-1 outputs."""
+        return self.submit_many([pixel_values])[0]
+
+    def submit_many(self, images: list) -> list:
+        """Queues several (C, H, W) images at once and returns their outputs in order."""
+        self._ensure_started()
+        futures = []
+        for pixel_values in images:
+            future = Future()
+            self._queue.put((pixel_values, future, time.perf_counter()))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # First use, or a forked child: threads don't survive a fork, and
+                # the parent's queue and lock may have been mid-use when it happened.
+                self._queue = queue.Queue()
+                self._stats_lock = threading.Lock()
+                self._thread = threading.Thread(target=self._loop, name=f"microbatch-{self.name}", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                outputs = self._run([item[0] for item in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._total_wait += sum(started - enqueued for _, _, enqueued in batch)
+
+            for (_, future, _), image_outputs in zip(batch, split_outputs(outputs)):
+                future.set_result(image_outputs)
+
+    def _run(self, images: list):
+        pixel_values, pixel_mask = pad_images(images)
+        with torch.no_grad():
+            return self.model(pixel_values.to(self.device), pixel_mask=pixel_mask.to(self.device))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            requests = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "requests": requests,
+                "mean_batch_size": round(requests / batches, 3) if batches else 0.0,
+                "mean_queue_wait_ms": round(self._total_wait / requests * 1000, 3) if requests else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "pending": self._queue.qsize(),
+            }
@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import resource
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+from synthetic import generate_report, score_report
+
+# Stages timed separately, in pipeline order.
+STAGES = ("transforms", "detection", "structure", "grid", "cell_coordinates", "ocr", "normalize")
+
+# Small, typical and large reports; every case is generated with the same seed.
+DEFAULT_CASES = [
+    {"rows": 8, "columns": 4, "width": 1200, "noise": 0.0, "blur": 0.0},
+    {"rows": 16, "columns": 5, "width": 1600, "noise": 6.0, "blur": 0.0},
+    {"rows": 30, "columns": 6, "width": 2400, "noise": 10.0, "blur": 1.0},
+]
+
+
+def case_name(params: dict) -> str:
+    return "r{rows}-c{columns}-w{width}-n{noise:g}-b{blur:g}".format(**params)
+
+
+class _StageClock:
+    """Collects per-stage seconds for one pass and, with `trace_memory`, each stage's Python heap peak."""
+    def __init__(self, trace_memory: bool = False):
+        self.seconds = {}
+        self.peak_bytes = {}
+        self.trace_memory = trace_memory
+
+    @contextmanager
+    def __call__(self, stage: str):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - started
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                self.peak_bytes[stage] = max(self.peak_bytes.get(stage, 0), peak)
+
+
+def run_stages(extractor, report, clock: _StageClock) -> dict:
+    """
+    One pass of the TableExtractor stages over a synthetic report, timing
+    each stage with `clock`. Returns the normalized rows. When detection
+    misses the table, the whole page is used as the table crop so the later
+    stages are still measured.
+    """
+    from imaging import as_array
+    image = report.image
+
+    with clock("transforms"):
+        pixel_values = extractor.detection_transform(image)
+    with clock("detection"):
+        outputs = extractor._run_model("detection", pixel_values)
+        tables = extractor._outputs_to_objects(outputs, image.size, extractor.id2label)
+        tables = extractor._select_tables(tables) if tables else []
+    cropped_table = image.crop(tables[0]['bbox']) if tables else image
+
+    with clock("transforms"):
+        pixel_values = extractor.structure_transform(cropped_table)
+    with clock("structure"):
+        outputs = extractor._run_model("structure", pixel_values)
+        labels, scores, boxes = extractor._outputs_to_arrays(outputs, cropped_table.size, extractor.structure_id2label)
+    with clock("grid"):
+        grid = extractor._build_grid(labels, scores, boxes)
+    objects = extractor._outputs_to_objects(outputs, cropped_table.size, extractor.structure_id2label)
+    with clock("cell_coordinates"):
+        extractor._get_cell_coordinates_by_row(objects)
+
+    table_image = as_array(cropped_table)
+    with clock("ocr"):
+        data, _ = extractor._apply_ocr(grid, table_image, prune_columns=extractor.column_pruning)
+    with clock("normalize"):
+        return extractor.clean_and_normalize_report({"data": data})
+
+
+def _summary(samples: list) -> dict:
+    samples = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 2),
+        "p95_ms": round(float(np.percentile(samples, 95)), 2),
+        "per_second": round(1000 / float(samples.mean()), 2) if samples.mean() > 0 else None,
+    }
+
+
+def benchmark_case(extractor, params: dict, runs: int = 10, warmup: int = 1, seed: int = 0) -> dict:
+    """p50/p95 latency, throughput and heap peak per stage, plus extraction accuracy, for one report shape."""
+    report = generate_report(seed=seed, **params)
+    for _ in range(warmup):
+        run_stages(extractor, report, _StageClock())
+
+    passes = []
+    for _ in range(runs):
+        clock = _StageClock()
+        normalized = run_stages(extractor, report, clock)
+        passes.append(clock.seconds)
+
+    # Memory is traced in a separate pass, since tracing slows every allocation down.
+    tracemalloc.start()
+    memory_clock = _StageClock(trace_memory=True)
+    try:
+        run_stages(extractor, report, memory_clock)
+    finally:
+        tracemalloc.stop()
+
+    stages = {}
+    for stage in STAGES:
+        stages[stage] = {
+            **_summary([timings.get(stage, 0.0) for timings in passes]),
+            "peak_mb": round(memory_clock.peak_bytes.get(stage, 0) / 2**20, 2),
+        }
+    total = _summary([sum(timings.values()) for timings in passes])
+    return {
+        "params": {**params, "seed": seed},
+        "stages": stages,
+        "total": {"p50_ms": total["p50_ms"], "p95_ms": total["p95_ms"], "images_per_second": total["per_second"]},
+        "accuracy": score_report(report.expected, normalized),
+    }
+
+
+def run_benchmark(cases: list, runs: int = 10, warmup: int = 1, seed: int = 0, extractor_kwargs: dict = None) -> dict:
+    import torch
+    from model import TableExtractor
+    # Micro-batching would add its batch wait to every single-image call.
+    extractor = TableExtractor(**{**(extractor_kwargs or {}), "micro_batching": False})
+    results = {
+        "environment": {
+            "backend": extractor.backend,
+            "ocr_strategy": extractor.ocr_strategy,
+            "device": extractor.device,
+            "torch_threads": torch.get_num_threads(),
+            "runs": runs,
+        },
+        "cases": {},
+    }
+    for params in cases:
+        results["cases"][case_name(params)] = benchmark_case(extractor, params, runs=runs, warmup=warmup, seed=seed)
+    results["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = 0.2, min_delta_ms: float = 1.0) -> list:
+    """
+    Stages whose p50 got more than `tolerance` slower than in the baseline
+    (and by at least `min_delta_ms`, to ignore jitter on tiny stages), plus
+    cases whose row recall dropped.
+    """
+    regressions = []
+    for name, case in results["cases"].items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            continue
+        for stage, timing in list(case["stages"].items()) + [("total", case["total"])]:
+            before = reference["stages"].get(stage) if stage != "total" else reference["total"]
+            if not before or not before["p50_ms"]:
+                continue
+            ratio = timing["p50_ms"] / before["p50_ms"]
+            timing["vs_baseline"] = round(ratio, 3)
+            if ratio > 1 + tolerance and timing["p50_ms"] - before["p50_ms"] >= min_delta_ms:
+                regressions.append(f"{name} {stage}: p50 {before['p50_ms']} -> {timing['p50_ms']} ms (x{ratio:.2f})")
+        if case["accuracy"]["row_recall"] < reference["accuracy"]["row_recall"]:
+            regressions.append(
+                f"{name} accuracy: row recall {reference['accuracy']['row_recall']} -> {case['accuracy']['row_recall']}")
+    return regressions
+
+
+def format_results(results: dict) -> str:
+    lines = []
+    for name, case in results["cases"].items():
+        accuracy = case["accuracy"]
+        lines.append(f"{name}  ({case['total']['images_per_second']} img/s, row recall {accuracy['row_recall']}, "
+                     f"status accuracy {accuracy['status_accuracy']})")
+        lines.append(f"  {'stage':<18}{'p50 ms':>10}{'p95 ms':>10}{'per s':>10}{'peak MB':>10}{'vs base':>10}")
+        for stage, timing in list(case["stages"].items()) + [("total", case["total"])]:
+            lines.append(f"  {stage:<18}{timing['p50_ms']:>10}{timing['p95_ms']:>10}"
+                         f"{str(timing.get('per_second', timing.get('images_per_second'))):>10}"
+                         f"{str(timing.get('peak_mb', '')):>10}{str(timing.get('vs_baseline', '')):>10}")
+    lines.append(f"max RSS: {results['max_rss_mb']} MB")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    # Usage (from the app/ directory):
+    #   python benchmark.py --save-baseline bench_baseline.json     # before a change
+    #   python benchmark.py --baseline bench_baseline.json          # after it
+    from inference import extractor_kwargs_from_env
+
+    parser = argparse.ArgumentParser(description="Per-stage TableExtractor benchmark on synthetic lab reports.")
+    parser.add_argument("--rows", type=int, nargs="+", help="table rows (with --columns etc. replaces the default cases)")
+    parser.add_argument("--columns", type=int, nargs="+", default=[4])
+    parser.add_argument("--width", type=int, nargs="+", default=[1600])
+    parser.add_argument("--noise", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--blur", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against a results JSON; exits 1 on regressions")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    cases = DEFAULT_CASES
+    if args.rows:
+        cases = [
+            {"rows": rows, "columns": columns, "width": width, "noise": noise, "blur": blur}
+            for rows, columns, width, noise, blur in itertools.product(
+                args.rows, args.columns, args.width, args.noise, args.blur)
+        ]
+
+    results = run_benchmark(cases, runs=args.runs, warmup=args.warmup, seed=args.seed,
+                            extractor_kwargs=extractor_kwargs_from_env())
+    regressions = []
+    if args.baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                regressions = compare_to_baseline(results, json.load(f), tolerance=args.tolerance)
+        else:
+            print(f"No baseline at {args.baseline}, skipping the comparison.", file=sys.stderr)
+
+    print(format_results(results))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+    if regressions:
+        print("\nRegressions against the baseline:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+
+class ResultCache:
+    """
+    Content-addressed cache for image pipeline results.
+
+    Keys are a SHA-256 of the decoded image pixels plus the stage name and
+    the pipeline parameters, so re-uploads and client retries of the same scan
+    are served without running detection, structure recognition and OCR again.
+
+    Entries live in an in-memory LRU bounded to `max_entries`, backed by JSON
+    files under `cache_dir/<namespace>/` that survive restarts. `namespace`
+    should fingerprint the models (ids + revisions); entries written under any
+    other namespace are ignored and can be purged with `purge_stale()`.
+
+    Entries unused for `ttl` seconds expire. The disk tier holds at most
+    `disk_max_entries` files and `disk_max_bytes` bytes: beyond that the least
+    recently used files (by mtime, refreshed on every hit) are deleted.
+    """
+    # Expired files nobody asks for again are swept at least this often.
+    PRUNE_INTERVAL = 600
+
+    def __init__(self, namespace: str, max_entries: int = 256, cache_dir: str = None, ttl: float = 24 * 3600,
+                 disk_max_entries: int = 10000, disk_max_bytes: int = 1024 ** 3):
+        self.namespace = hashlib.sha256(namespace.encode()).hexdigest()[:16]
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.cache_dir = cache_dir
+        self.disk_dir = os.path.join(cache_dir, self.namespace) if cache_dir else None
+        self._memory = OrderedDict()  # key -> (last used, value)
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+                          "expired": 0, "disk_evictions": 0}
+        # Approximate disk usage of this process's view, corrected by every prune.
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        self._last_prune = 0.0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self.prune_disk()
+
+    def key(self, image: Image.Image, stage: str, **params) -> str:
+        digest = hashlib.sha256()
+        if isinstance(image, list):
+            # The pages of a PDF / multi-frame TIFF (see documents.py), keyed on the file itself.
+            digest.update(f"{stage}|document|{len(image)}|{json.dumps(params, sort_keys=True)}|".encode())
+            digest.update(image[0].contents)
+            return digest.hexdigest()
+        digest.update(f"{stage}|{image.mode}|{image.size}|{json.dumps(params, sort_keys=True)}|".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        now = time.time()
+        value = None
+        with self._lock:
+            if key in self._memory:
+                last_used, value = self._memory[key]
+                if now - last_used < self.ttl:
+                    self._memory[key] = (now, value)
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                else:
+                    del self._memory[key]
+                    self._counters["expired"] += 1
+                    value = None
+
+        if value is not None:
+            self._touch(key, now)
+            return value
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                if now - os.path.getmtime(path) >= self.ttl:
+                    os.remove(path)
+                    with self._lock:
+                        self._counters["expired"] += 1
+                else:
+                    with open(path) as f:
+                        value = json.load(f)
+                    self._touch(key, now)
+            except (OSError, json.JSONDecodeError):
+                value = None
+
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._remember(key, value, now)
+        return value
+
+    def _touch(self, key: str, now: float):
+        # A file's mtime is its last use: it drives the TTL and LRU eviction of the disk tier.
+        if self.disk_dir:
+            try:
+                os.utime(self._disk_path(key), (now, now))
+            except OSError:
+                pass
+
+    def put(self, key: str, value: dict):
+        with self._lock:
+            self._remember(key, value, time.time())
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so a crash never leaves half a JSON behind.
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(value, f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_entries += 1
+                self._disk_bytes += size
+                over = self._disk_entries > self.disk_max_entries or self._disk_bytes > self.disk_max_bytes
+            if over or time.time() - self._last_prune > self.PRUNE_INTERVAL:
+                self.prune_disk()
+
+    def _remember(self, key: str, value: dict, last_used: float):
+        self._memory[key] = (last_used, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def prune_disk(self):
+        """
+        Deletes expired files of the disk tier, then the least recently used
+        ones until it is within `disk_max_entries` and `disk_max_bytes`.
+        Other processes sharing the directory may prune at the same time.
+        """
+        if not self.disk_dir or not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.time()
+            self._last_prune = now
+            files, expired = [], 0
+            for shard in os.scandir(self.disk_dir):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        stat = entry.stat()
+                        if now - stat.st_mtime >= self.ttl:
+                            os.remove(entry.path)
+                            expired += 1
+                        elif entry.name.endswith(".json"):
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                    except OSError:
+                        continue
+
+            files.sort()
+            entries, total = len(files), sum(size for _, size, _ in files)
+            evicted = 0
+            for _, size, path in files:
+                if entries <= self.disk_max_entries and total <= self.disk_max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                entries -= 1
+                total -= size
+                evicted += 1
+
+            with self._lock:
+                self._disk_entries, self._disk_bytes = entries, total
+                self._counters["expired"] += expired
+                self._counters["disk_evictions"] += evicted
+        finally:
+            self._prune_lock.release()
+
+    def invalidate(self):
+        """Drops every entry of the current namespace, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            self._counters["invalidations"] += 1
+            self._disk_entries = self._disk_bytes = 0
+        if self.disk_dir:
+            shutil.rmtree(self.disk_dir, ignore_errors=True)
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def purge_stale(self):
+        """Removes on-disk entries written under other namespaces (older model revisions)."""
+        if not self.cache_dir:
+            return
+        for entry in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, entry)
+            if entry != self.namespace and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "namespace": self.namespace,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk": bool(self.disk_dir),
+                "disk_entries": self._disk_entries,
+                "disk_bytes": self._disk_bytes,
+                **self._counters,
+            }
+
+
+class ExplanationCache:
+    """
+    Memoizes validated LLM explanations per finding, e.g. ("hemoglobin", "low").
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`. The cache is persisted as a single JSON file
+    at `path`; call `save()` after a batch of `put`s.
+    """
+    def __init__(self, max_entries: int = 2048, ttl: float = 7 * 24 * 3600, path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()  # key -> (stored_at, explanation)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        now = time.time()
+        for key, (stored_at, explanation) in stored.items():
+            if now - stored_at < self.ttl:
+                self._entries[key] = (stored_at, explanation)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] >= self.ttl:
+                del self._entries[key]
+                self._counters["expired"] += 1
+                self._dirty = True
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, explanation: str):
+        with self._lock:
+            self._entries[key] = (time.time(), explanation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            snapshot = dict(self._entries)
+            self._dirty = False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, **self._counters}
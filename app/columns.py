@@ -0,0 +1,43 @@
+import re
+import difflib
+
+# Header words by column role, checked in this order ("Normal Value" is a
+# range, "Result Unit" a result, "Test Method" a method).
+# clean_and_normalize_report only reads the parameter, result and range
+# columns; result comes before the skipped roles so a combined header keeps
+# its column.
+COLUMN_ROLES = (
+    ("range", ("reference", "range", "ref", "interval", "normal", "limits", "bio")),
+    ("result", ("result", "results", "value", "values", "observed", "observation", "reading")),
+    ("unit", ("unit", "units", "uom")),
+    ("method", ("method", "methodology", "technique", "specimen", "sample")),
+    ("flag", ("flag", "flags", "remark", "remarks", "comment", "comments", "interpretation", "status")),
+    ("parameter", ("test", "tests", "parameter", "investigation", "analyte", "examination", "description", "name")),
+)
+NEEDED_ROLES = ("parameter", "result", "range")
+
+
+def column_role(header: str):
+    """The role of a column from its header cell text, or None if no header word is recognized."""
+    # Header words are short and OCR slips a letter now and then ("Resu1t").
+    words = re.findall(r"[a-z0-9]+", header.lower())
+    for role, keywords in COLUMN_ROLES:
+        if any(difflib.get_close_matches(word, keywords, n=1, cutoff=0.8) for word in words if len(word) > 2):
+            return role
+    return None
+
+
+def columns_to_ocr(header_row: list):
+    """
+    Which columns of a table the normalizer needs, from the OCR'd header row:
+    False for unit, method and flag columns. Returns None (OCR everything)
+    unless both a result and a range column were recognized. The first column
+    is always kept, since the normalizer reads the parameter from it, and so
+    are columns whose header wasn't recognized.
+    """
+    roles = [column_role(text) for text in header_row]
+    if "result" not in roles or "range" not in roles:
+        return None
+    keep = [role is None or role in NEEDED_ROLES for role in roles]
+    keep[0] = True
+    return keep
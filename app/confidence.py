@@ -0,0 +1,41 @@
+import threading
+
+
+class ConfidenceGate:
+    """
+    Keeps a running sum of the pipeline's confidence scores and tells whether
+    the final average can still reach `threshold`, assuming each of the
+    `pending` scores still expected is a perfect 1.0. Rounded like the reported
+    confidence, so a rejection here always matches what the full pipeline
+    would have decided. Shared by the per-table OCR threads, hence the lock.
+    """
+    def __init__(self, threshold: float):
+        self.threshold = float(threshold)
+        self.total = 0.0
+        self.count = 0
+        self.pending = 0
+        self.rejected_stage = None
+        self._lock = threading.Lock()
+
+    def expect(self, max_scores: int):
+        with self._lock:
+            self.pending += max_scores
+
+    def add(self, scores, settled: int = 0):
+        """Adds `scores` and retires `settled` of the expected scores."""
+        with self._lock:
+            self.total += sum(scores)
+            self.count += len(scores)
+            self.pending -= settled
+
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def can_pass(self) -> bool:
+        with self._lock:
+            count = self.count + self.pending
+            best_possible = (self.total + self.pending) / count if count else 0.0
+        return round(best_possible, 4) >= self.threshold
+
+    def reject(self, stage: str):
+        self.rejected_stage = stage
@@ -0,0 +1,122 @@
+import io
+import os
+import threading
+from dotenv import load_dotenv
+from PIL import Image
+from imaging import IMAGE_MAX_SIDE, MAX_IMAGE_PIXELS, ImageTooLarge, UploadTooLarge, decode_image, probe_image
+
+load_dotenv()
+
+# PDFs and multi-frame TIFFs with more pages than this are refused.
+MAX_DOCUMENT_PAGES = int(os.getenv("MAX_DOCUMENT_PAGES", "30"))
+# PDF pages have no pixel size; with IMAGE_MAX_SIDE=0 they are rendered at this DPI.
+PDF_DPI = int(os.getenv("PDF_DPI", "200"))
+
+# PDFium is not thread-safe, so pages are rendered one at a time per process.
+_PDFIUM_LOCK = threading.Lock()
+
+
+class TooManyPages(UploadTooLarge):
+    def __init__(self, pages: int, max_pages: int):
+        super().__init__(f"The document has {pages} pages, more than the allowed {max_pages}.")
+        self.pages = pages
+        self.max_pages = max_pages
+
+
+class DocumentPage:
+    """
+    One page of an uploaded PDF or multi-frame TIFF. Nothing is decoded until
+    `render` is called, and a page only holds the document's bytes, so a
+    list of pages can be pickled to an inference process cheaply (pages of
+    the same document share one bytes object).
+    """
+    def __init__(self, contents: bytes, kind: str, index: int):
+        self.contents = contents
+        self.kind = kind  # "pdf" or "tiff"
+        self.index = index
+
+    @property
+    def number(self) -> int:
+        return self.index + 1
+
+    def render(self, max_side: int = IMAGE_MAX_SIDE, max_pixels: int = MAX_IMAGE_PIXELS) -> Image.Image:
+        """Rasterizes the page to RGB with its longest side at `max_side` pixels (TIFF frames are never upscaled)."""
+        if self.kind == "pdf":
+            return self._render_pdf(max_side, max_pixels)
+        return self._render_tiff(max_side, max_pixels)
+
+    def _render_pdf(self, max_side: int, max_pixels: int) -> Image.Image:
+        import pypdfium2 as pdfium
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(self.contents)
+            try:
+                page = pdf[self.index]
+                width, height = page.get_size()  # in points
+                scale = max_side / max(width, height) if max_side else PDF_DPI / 72
+                pixels = round(width * scale) * round(height * scale)
+                if max_pixels and pixels > max_pixels:
+                    raise ImageTooLarge(pixels, max_pixels)
+                image = page.render(scale=scale).to_pil()
+                page.close()
+            finally:
+                pdf.close()
+        return image.convert("RGB")
+
+    def _render_tiff(self, max_side: int, max_pixels: int) -> Image.Image:
+        # Every render opens its own handle, so pages can be rendered from several threads.
+        image = Image.open(io.BytesIO(self.contents))
+        image.seek(self.index)
+        pixels = image.width * image.height
+        if max_pixels and pixels > max_pixels:
+            raise ImageTooLarge(pixels, max_pixels)
+        if max_side and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), reducing_gap=2.0)
+        return image.convert("RGB")
+
+
+def _page_count(contents: bytes, kind: str) -> int:
+    if kind == "pdf":
+        import pypdfium2 as pdfium
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(contents)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+    with Image.open(io.BytesIO(contents)) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def open_document(contents: bytes, max_pages: int = MAX_DOCUMENT_PAGES):
+    """
+    The lazily rendered pages of a PDF or multi-frame TIFF upload, or None
+    for anything else (single images go through imaging.decode_image).
+    Only the page count is read here.
+    """
+    if contents[:5] == b"%PDF-":
+        kind = "pdf"
+    elif contents[:4] in (b"II*\x00", b"MM\x00*"):
+        kind = "tiff"
+    else:
+        return None
+
+    pages = _page_count(contents, kind)
+    if kind == "tiff" and pages < 2:
+        return None
+    if pages == 0:
+        raise ValueError("The document has no pages.")
+    if max_pages and pages > max_pages:
+        raise TooManyPages(pages, max_pages)
+    return [DocumentPage(contents, kind, index) for index in range(pages)]
+
+
+def decode_upload(contents: bytes):
+    """An uploaded image decoded with imaging.decode_image, or the pages of a PDF / multi-frame TIFF."""
+    pages = open_document(contents)
+    return pages if pages is not None else decode_image(contents)
+
+
+def probe_upload(contents: bytes):
+    """Checks an upload without rasterizing it, raising like decode_upload would."""
+    pages = open_document(contents)
+    return pages if pages is not None else probe_image(contents)
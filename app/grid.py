@@ -0,0 +1,155 @@
+import bisect
+from itertools import accumulate
+
+import numpy as np
+
+ROW_LABEL = "table row"
+COLUMN_LABEL = "table column"
+
+
+def suppress_overlaps(starts: np.ndarray, ends: np.ndarray, scores: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Greedy 1-D non-max suppression: indices of the intervals kept, best score
+    first, dropping any interval whose IoU with a kept one exceeds `threshold`.
+    """
+    lengths = ends - starts
+    overlap = np.clip(np.minimum(ends[:, None], ends[None, :]) - np.maximum(starts[:, None], starts[None, :]), 0, None)
+    union = lengths[:, None] + lengths[None, :] - overlap
+    iou = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+    suppressed = np.zeros(len(scores), dtype=bool)
+    keep = []
+    for i in np.argsort(-scores, kind="stable"):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > threshold
+    return np.array(keep, dtype=int)
+
+
+class TableGrid:
+    """
+    Row x column grid of one table, backed by arrays instead of nested dicts.
+
+    `rows` (R, 4) and `columns` (C, 4) hold xyxy boxes sorted top to bottom and
+    left to right; `cells` is the (R, C, 4) array of their intersections, cell
+    (r, c) spanning column c horizontally and row r vertically.
+    `to_cell_coordinates()` gives the list-of-dicts format of
+    TableExtractor._get_cell_coordinates_by_row.
+    """
+    def __init__(self, rows: np.ndarray, columns: np.ndarray, row_scores: np.ndarray = None,
+                 column_scores: np.ndarray = None):
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, 4)
+        columns = np.asarray(columns, dtype=np.float64).reshape(-1, 4)
+        row_scores = np.ones(len(rows)) if row_scores is None else np.asarray(row_scores, dtype=np.float64)
+        column_scores = np.ones(len(columns)) if column_scores is None else np.asarray(column_scores, dtype=np.float64)
+
+        row_order = np.argsort(rows[:, 1], kind="stable")
+        column_order = np.argsort(columns[:, 0], kind="stable")
+        self.rows, self.row_scores = rows[row_order], row_scores[row_order]
+        self.columns, self.column_scores = columns[column_order], column_scores[column_order]
+
+        self.cells = np.empty((len(self.rows), len(self.columns), 4))
+        self.cells[..., 0] = self.columns[None, :, 0]
+        self.cells[..., 1] = self.rows[:, None, 1]
+        self.cells[..., 2] = self.columns[None, :, 2]
+        self.cells[..., 3] = self.rows[:, None, 3]
+
+    @classmethod
+    def from_predictions(cls, labels: np.ndarray, scores: np.ndarray, boxes: np.ndarray,
+                         row_label: int, column_label: int, nms_threshold: float = None):
+        """
+        Builds the grid from structure-model predictions (label ids, scores and
+        xyxy boxes). Rows overlapping a better row vertically by more than
+        `nms_threshold` IoU are dropped, likewise for columns horizontally.
+        """
+        rows, columns = labels == row_label, labels == column_label
+        row_boxes, row_scores = boxes[rows], scores[rows]
+        column_boxes, column_scores = boxes[columns], scores[columns]
+        if nms_threshold:
+            keep = np.sort(suppress_overlaps(row_boxes[:, 1], row_boxes[:, 3], row_scores, nms_threshold))
+            row_boxes, row_scores = row_boxes[keep], row_scores[keep]
+            keep = np.sort(suppress_overlaps(column_boxes[:, 0], column_boxes[:, 2], column_scores, nms_threshold))
+            column_boxes, column_scores = column_boxes[keep], column_scores[keep]
+        return cls(row_boxes, column_boxes, row_scores, column_scores)
+
+    @classmethod
+    def from_objects(cls, objects: list, nms_threshold: float = None):
+        """Builds the grid from `_outputs_to_objects` dicts."""
+        label_ids = {ROW_LABEL: 0, COLUMN_LABEL: 1}
+        kept = [obj for obj in objects if obj['label'] in label_ids]
+        return cls.from_predictions(
+            np.array([label_ids[obj['label']] for obj in kept], dtype=int),
+            np.array([obj['score'] for obj in kept], dtype=np.float64),
+            np.array([obj['bbox'] for obj in kept], dtype=np.float64).reshape(-1, 4),
+            row_label=0, column_label=1, nms_threshold=nms_threshold,
+        )
+
+    @classmethod
+    def coerce(cls, grid):
+        """Accepts a TableGrid or the old cell-coordinates list (every row shares the same columns)."""
+        if isinstance(grid, cls):
+            return grid
+        rows = [row['row'] for row in grid]
+        columns = [cell['column'] for cell in grid[0]['cells']] if grid else []
+        return cls(rows, columns)
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.rows)
+
+    @property
+    def num_columns(self) -> int:
+        return len(self.columns)
+
+    @property
+    def num_cells(self) -> int:
+        return self.num_rows * self.num_columns
+
+    def pixel_boxes(self, width: int, height: int) -> tuple:
+        """
+        Integer xyxy cell boxes clipped to a `width` x `height` image, as an
+        (R, C, 4) array, with an (R, C) mask of the cells that aren't empty.
+        """
+        boxes = np.rint(self.cells).astype(int)
+        np.clip(boxes[..., 0::2], 0, width, out=boxes[..., 0::2])
+        np.clip(boxes[..., 1::2], 0, height, out=boxes[..., 1::2])
+        valid = (boxes[..., 2] > boxes[..., 0]) & (boxes[..., 3] > boxes[..., 1])
+        return boxes, valid
+
+    def to_cell_coordinates(self) -> list:
+        """The grid in the list-of-dicts format of `_get_cell_coordinates_by_row`."""
+        columns = self.columns.tolist()
+        return [
+            {
+                'row': row,
+                'cells': [{'column': column, 'cell': [column[0], row[1], column[2], row[3]]} for column in columns],
+                'cell_count': len(columns),
+            }
+            for row in self.rows.tolist()
+        ]
+
+
+class IntervalIndex:
+    """
+    Sorted 1-D interval lookup used to place OCR words into the row/column grid.
+    Intervals are sorted by start, and a running maximum of the ends lets a
+    lookup stop walking back as soon as no earlier interval can reach the value.
+    """
+    def __init__(self, intervals):
+        self.order = sorted(range(len(intervals)), key=lambda i: intervals[i][0])
+        self.starts = [intervals[i][0] for i in self.order]
+        self.ends = [intervals[i][1] for i in self.order]
+        self.max_ends = list(accumulate(self.ends, max))
+
+    def find(self, value):
+        """Returns the index of the interval containing `value` whose centre is closest, or None."""
+        best, best_distance = None, None
+        pos = bisect.bisect_right(self.starts, value) - 1
+        while pos >= 0 and self.max_ends[pos] >= value:
+            if self.ends[pos] >= value:
+                distance = abs((self.starts[pos] + self.ends[pos]) / 2 - value)
+                if best is None or distance < best_distance:
+                    best, best_distance = self.order[pos], distance
+            pos -= 1
+        return best
@@ -0,0 +1,85 @@
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local checks run on generated explanations before the validation LLM call,
+# so outputs that break the generation rules are rejected without a round trip.
+MAX_EXPLANATION_CHARS = int(os.getenv("MAX_EXPLANATION_CHARS", "600"))
+# Optional file with extra medicine names, one per line.
+MEDICINES_PATH = os.getenv("GUARDRAIL_MEDICINES_PATH")
+
+# Advice, alarming and abusive phrasing the generation prompt forbids.
+BLOCKLIST = (
+    "you should take", "you must take", "start taking", "stop taking", "you need to take",
+    "increase your dose", "decrease your dose", "dosage", "prescribe", "prescription",
+    "fatal", "deadly", "life-threatening", "you will die", "emergency room",
+    "stupid", "idiot", "shut up",
+)
+
+# Common drug names (generic and brand); explanations must not mention medicines.
+# Names that are also lab analytes (insulin, thyroxine, folic acid, vitamin
+# B12 as cyanocobalamin, erythropoietin, calcitriol) are left out: the
+# explanation of that very test has to name it.
+MEDICINES = {
+    "acetaminophen", "paracetamol", "ibuprofen", "aspirin", "naproxen", "diclofenac",
+    "metformin", "glipizide", "glimepiride", "sitagliptin", "empagliflozin",
+    "atorvastatin", "rosuvastatin", "simvastatin", "statin", "statins", "ezetimibe",
+    "lisinopril", "enalapril", "losartan", "amlodipine", "metoprolol", "atenolol", "hydrochlorothiazide",
+    "furosemide", "spironolactone", "warfarin", "heparin", "clopidogrel", "apixaban", "rivaroxaban",
+    "levothyroxine", "methimazole", "prednisone", "prednisolone", "dexamethasone",
+    "omeprazole", "pantoprazole", "ranitidine", "amoxicillin", "azithromycin", "ciprofloxacin",
+    "doxycycline", "allopurinol", "febuxostat", "colchicine", "epoetin",
+    "ferrous sulfate", "vitamin d3 tablets",
+    "tylenol", "advil", "motrin", "lipitor", "crestor", "glucophage", "synthroid", "lasix", "coumadin",
+}
+
+
+def _load_medicines(path: str) -> set:
+    try:
+        with open(path) as f:
+            return {line.strip().lower() for line in f if line.strip() and not line.startswith("#")}
+    except OSError:
+        return set()
+
+
+if MEDICINES_PATH:
+    MEDICINES |= _load_medicines(MEDICINES_PATH)
+
+_BLOCKLIST_REGEX = re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in BLOCKLIST) + r')\b', re.IGNORECASE)
+_MEDICINE_REGEX = re.compile(
+    r'\b(?:' + '|'.join(re.escape(name) for name in sorted(MEDICINES, key=len, reverse=True)) + r')\b', re.IGNORECASE
+)
+
+
+def pre_validate(summary_json, parameters=()) -> list:
+    """
+    Rule-based checks of generated explanations: the {"explanations": [str, ...]}
+    schema, length limits, blocklisted phrasing and medicine names. A medicine
+    name that is part of one of the findings' `parameters` (e.g. a "Heparin
+    Anti-Xa" test) is allowed. Returns the violations found; an empty list
+    means the LLM validator gets to decide.
+    """
+    tested = " ".join(str(parameter) for parameter in parameters).lower()
+    if not isinstance(summary_json, dict) or not isinstance(summary_json.get("explanations"), list):
+        return ['The output is not a JSON object with an "explanations" list.']
+    explanations = summary_json["explanations"]
+    if not explanations:
+        return ["The output contains no explanations."]
+
+    violations = []
+    for i, explanation in enumerate(explanations):
+        if not isinstance(explanation, str) or not explanation.strip():
+            violations.append(f"Explanation {i} is not a non-empty string.")
+            continue
+        if len(explanation) > MAX_EXPLANATION_CHARS:
+            violations.append(f"Explanation {i} is longer than {MAX_EXPLANATION_CHARS} characters.")
+        match = _BLOCKLIST_REGEX.search(explanation)
+        if match:
+            violations.append(f"Explanation {i} contains the blocked phrase '{match.group(0)}'.")
+        for match in _MEDICINE_REGEX.finditer(explanation):
+            if match.group(0).lower() not in tested:
+                violations.append(f"Explanation {i} mentions the medicine '{match.group(0)}'.")
+                break
+    return violations
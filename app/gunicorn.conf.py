@@ -0,0 +1,25 @@
+# Pre-fork deployment: gunicorn -c gunicorn.conf.py main:app
+#
+# The app (and with PRELOAD_MODELS=1 the model weights) is imported once in the
+# master process before the workers are forked, so every worker shares the same
+# weight memory copy-on-write instead of loading its own copy. Only done with
+# INFERENCE_MODE=thread; in process mode each worker starts its own inference
+# processes after the fork, and each of those loads its own models.
+import os
+
+os.environ.setdefault("PRELOAD_MODELS", "1")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# The models are loaded in the master (thread mode), but the warm-up inference
+# runs in each worker after the fork; give workers time to boot.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+
+
+def child_exit(server, worker):
+    # Drops the live gauges of a dead worker from the shared Prometheus directory.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,113 @@
+import io
+import os
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+# Uploads are downscaled while decoding so their longest side is at most
+# IMAGE_MAX_SIDE pixels (0 keeps full resolution). Detection only sees 800 px
+# and the OCR recognizer rescales every text line to 64 px height, so 12 MP
+# phone photos carry far more pixels than the pipeline can use.
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2400"))
+# Uploads that would still decode to more pixels than this are refused, which
+# bounds the memory a single request can take (0 disables the cap).
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))
+
+
+class UploadTooLarge(ValueError):
+    """An upload the server refuses to process because of its size; the API answers 413."""
+
+
+class ImageTooLarge(UploadTooLarge):
+    """The upload would decode to more than MAX_IMAGE_PIXELS pixels."""
+    def __init__(self, pixels: int, max_pixels: int):
+        super().__init__(f"The image has {pixels} pixels, more than the allowed {max_pixels}.")
+        self.pixels = pixels
+        self.max_pixels = max_pixels
+
+
+def _open_scaled(contents: bytes, max_side: int, max_pixels: int) -> Image.Image:
+    """Opens an upload (header only), sets up draft decoding and enforces the pixel cap."""
+    image = Image.open(io.BytesIO(contents))  # reads the header only
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        # No-op for formats other than JPEG; it updates image.size when it applies.
+        image.draft("RGB", (round(image.width * scale), round(image.height * scale)))
+
+    pixels = image.width * image.height
+    if max_pixels and pixels > max_pixels:
+        raise ImageTooLarge(pixels, max_pixels)
+    return image
+
+
+def probe_image(contents: bytes, max_side: int = IMAGE_MAX_SIDE, max_pixels: int = MAX_IMAGE_PIXELS) -> tuple:
+    """
+    Checks an upload without decoding it: raises like decode_image would for
+    unreadable or too large images, and returns the (width, height) it
+    would decode to before the final resample.
+    """
+    return _open_scaled(contents, max_side, max_pixels).size
+
+
+def decode_image(contents: bytes, max_side: int = IMAGE_MAX_SIDE, max_pixels: int = MAX_IMAGE_PIXELS) -> Image.Image:
+    """
+    Decodes an upload to RGB, downscaling during the decode where possible.
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale (PIL draft mode), so
+    the full-resolution bitmap is never allocated; the remaining factor is
+    applied with reduce() and a final resample.
+    """
+    image = _open_scaled(contents, max_side, max_pixels)
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), reducing_gap=2.0)
+    return image.convert("RGB")
+
+
+def as_array(image) -> np.ndarray:
+    """One contiguous (H, W, C) uint8 array of a PIL image; arrays are returned as they are."""
+    if isinstance(image, np.ndarray):
+        return image
+    return np.ascontiguousarray(np.asarray(image))
+
+
+def clamp_box(box, width: int, height: int):
+    """Rounds an (x_min, y_min, x_max, y_max) box to pixels inside the image; None if it is empty."""
+    x_min, y_min, x_max, y_max = [int(round(v)) for v in box]
+    x_min, x_max = max(0, x_min), min(width, x_max)
+    y_min, y_max = max(0, y_min), min(height, y_max)
+    if x_max <= x_min or y_max <= y_min:
+        return None
+    return x_min, y_min, x_max, y_max
+
+
+def crop_view(image: np.ndarray, box):
+    """A slice view (no copy) of `image` inside `box`, or None if the box is empty."""
+    box = clamp_box(box, image.shape[1], image.shape[0])
+    if box is None:
+        return None
+    x_min, y_min, x_max, y_max = box
+    return image[y_min:y_max, x_min:x_max]
+
+
+# Grey levels a pixel must differ from its cell's background to count as ink.
+INK_CONTRAST = 64
+
+
+def ink_ratio(cell: np.ndarray) -> float:
+    """
+    Share of ink pixels in a single-channel cell crop: pixels differing from
+    the crop's median (its background, light or dark) by more than
+    INK_CONTRAST. A thin border is ignored, and so are pixel rows and columns
+    that are almost all ink, i.e. ruling lines the cell box caught.
+    """
+    height, width = cell.shape[:2]
+    inset = max(1, min(height, width) // 10)
+    cell = cell[inset:height - inset, inset:width - inset]
+    if cell.size == 0:
+        return 0.0
+    cell = cell.astype(np.int16)
+    ink = np.abs(cell - int(np.median(cell))) > INK_CONTRAST
+    ink[ink.mean(axis=1) > 0.8, :] = False
+    ink[:, ink.mean(axis=0) > 0.8] = False
+    return float(ink.mean())
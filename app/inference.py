@@ -0,0 +1,229 @@
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dotenv import load_dotenv
+from PIL import Image
+from model import TableExtractor
+from metrics import call_with_timings, current_timings
+from tuning import setting
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration, overridable from the .env file / container environment.
+# The mode and worker count default to the calibrated profile, if any (see tuning.py).
+INFERENCE_MODE = setting("INFERENCE_MODE", "thread")            # "thread" or "process"
+INFERENCE_WORKERS = int(setting("INFERENCE_WORKERS", "1"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "8"))  # jobs allowed to wait for a worker
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "5"))  # seconds, sent back with a 503
+
+
+def extractor_kwargs_from_env() -> dict:
+    """TableExtractor settings of the API and the job workers (see jobs.py)."""
+    # OCR_STRATEGY selects how cells are OCR'd: per_cell (default), batched or whole_table.
+    # MICRO_BATCHING=1 lets concurrent requests share detection/structure model batches.
+    return {
+        "ocr_strategy": os.getenv("OCR_STRATEGY", "per_cell"),
+        "micro_batching": os.getenv("MICRO_BATCHING", "0") == "1",
+        "max_batch_size": int(os.getenv("MAX_BATCH_SIZE", "4")),
+        "max_batch_wait_ms": float(os.getenv("MAX_BATCH_WAIT_MS", "5")),
+        "table_score_threshold": float(os.getenv("TABLE_SCORE_THRESHOLD", "0.7")),
+        "max_tables": int(os.getenv("MAX_TABLES", "8")),
+        # Duplicate row/column predictions overlapping by more than this IoU are dropped (0 keeps all).
+        "grid_nms_threshold": float(os.getenv("GRID_NMS_THRESHOLD", "0.5")),
+        # Pages of a PDF / multi-frame TIFF extracted (and held in memory) at once.
+        "page_workers": int(os.getenv("PAGE_WORKERS", "2")),
+        # Skip OCR of unit/method/flag columns (read from the header row) and of cells without ink.
+        "column_pruning": os.getenv("COLUMN_PRUNING", "1") == "1",
+        "blank_ink_ratio": float(os.getenv("BLANK_CELL_INK_RATIO", "0.002")),
+        # eager (default), torch-int8, onnx or onnx-int8; check parity first with `python backends.py`
+        "backend": os.getenv("INFERENCE_BACKEND", "eager"),
+        # Torch threads per extractor (0 keeps torch's default of one per core) and the batched OCR
+        # strategy's chunk size (one recognizer batch on a GPU; on CPU EasyOCR reads boxes one at a time).
+        "torch_threads": int(setting("TORCH_THREADS", "0")),
+        "ocr_batch_size": int(setting("OCR_BATCH_SIZE", "32")),
+    }
+
+
+class InferenceUnavailable(Exception):
+    """
+    Raised when an image job can't be admitted right now. The API turns it
+    into a 503 with a Retry-After header instead of queueing more work.
+    """
+    message = "The server can't process images right now. Please retry shortly."
+
+    def __init__(self, retry_after: int):
+        super().__init__(self.message)
+        self.retry_after = retry_after
+
+
+class InferenceQueueFull(InferenceUnavailable):
+    """Every worker is busy and the waiting queue is full."""
+    message = "The server is busy processing other reports. Please retry shortly."
+
+
+class InferenceNotReady(InferenceUnavailable):
+    """The models are still loading (or failed to load)."""
+    message = "The models are still loading. Please retry shortly."
+
+
+# Each worker process of a "process" pool holds its own TableExtractor.
+_worker_extractor = None
+
+def _init_worker(extractor_kwargs: dict):
+    global _worker_extractor
+    _worker_extractor = TableExtractor(**extractor_kwargs)
+
+def _call_worker_extractor(method: str, args: tuple, kwargs: dict):
+    return call_with_timings(getattr(_worker_extractor, method), *args, **kwargs)
+
+
+class InferencePool:
+    """
+    Runs blocking TableExtractor calls (torch inference + EasyOCR) off the
+    asyncio event loop, so health checks and LLM-only requests stay responsive
+    while image jobs are running.
+
+    "thread" mode shares one TableExtractor between worker threads. "process"
+    mode starts `workers` processes, each loading its own TableExtractor.
+    At most `workers + max_queue` jobs are admitted at once; beyond that
+    `run` raises InferenceQueueFull so the server sheds load.
+
+    Nothing heavy happens in the constructor: `start_in_background` loads the
+    models and runs a warm-up inference while the server already accepts
+    connections, and `run` raises InferenceNotReady until that is done.
+    """
+    def __init__(self, mode: str = INFERENCE_MODE, workers: int = INFERENCE_WORKERS,
+                 max_queue: int = INFERENCE_QUEUE_SIZE, retry_after: int = INFERENCE_RETRY_AFTER,
+                 extractor_kwargs: dict = None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference mode '{mode}', expected 'thread' or 'process'.")
+        self.extractor_kwargs = extractor_kwargs or {}
+        self.mode = mode
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.retry_after = retry_after
+        self.state = "starting"   # starting -> loading -> ready, or failed
+        self.error = None
+        self.extractor = None
+        self._executor = None
+        self._owner_pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads the models (idempotent). In thread mode this can run in a
+        pre-fork server's master process, so forked workers share the weights
+        copy-on-write instead of each loading its own copy; the executor's
+        threads only start on first use, after any fork. A process pool
+        creates its queues and pipes right away, so it is never preloaded:
+        one inherited across a fork is left alone and a new one is created.
+        """
+        with self._load_lock:
+            if self._executor is not None and (self.mode == "thread" or self._owner_pid == os.getpid()):
+                return
+            if self.mode == "thread":
+                self.extractor = TableExtractor(**self.extractor_kwargs)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+            else:
+                # "spawn" so the children don't inherit a half-initialised torch runtime.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.extractor_kwargs,),
+                )
+            self._owner_pid = os.getpid()
+
+    def start_in_background(self, warmup_image: str = None) -> threading.Thread:
+        thread = threading.Thread(target=self._start, args=(warmup_image,), name="inference-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def _start(self, warmup_image: str = None):
+        try:
+            self.state = "loading"
+            self.load()
+            if warmup_image:
+                self._warm_up(warmup_image)
+            self.state = "ready"
+            logger.info("Inference pool ready.")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error("Inference pool failed to start: %s", e)
+
+    def _warm_up(self, image_path: str):
+        """
+        Runs one extraction per worker so the first real request doesn't pay
+        for lazy initialisation (process start-up, allocator, OCR models).
+        """
+        image = Image.open(image_path).convert("RGB")
+        futures = [self._submit("extract_table", (image,), {}) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _submit(self, method: str, args: tuple, kwargs: dict):
+        if self.mode == "thread":
+            return self._executor.submit(call_with_timings, getattr(self.extractor, method), *args, **kwargs)
+        return self._executor.submit(_call_worker_extractor, method, args, kwargs)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, method: str, *args, **kwargs):
+        """
+        Runs `TableExtractor.<method>(*args, **kwargs)` on the pool and awaits
+        the result, e.g. `await pool.run("process_image", image)`.
+        """
+        if not self.ready():
+            raise InferenceNotReady(self.retry_after)
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise InferenceQueueFull(self.retry_after)
+            self._pending += 1
+
+        try:
+            future = self._submit(method, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+
+        # The slot is freed when the job really finishes, even if the client
+        # disconnects and this coroutine is cancelled first.
+        future.add_done_callback(self._release)
+        result, stages = await asyncio.wrap_future(future)
+        timings = current_timings()
+        if timings is not None:
+            timings.extend(stages)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = self._pending
+        stats = {
+            "state": self.state,
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": pending,
+            "capacity": self.capacity,
+            "torch_threads": self.extractor_kwargs.get("torch_threads") or None,
+        }
+        # Batchers live inside the extractor, so they are only visible in thread mode.
+        if self.extractor is not None and self.extractor.batchers:
+            stats["batching"] = self.extractor.batching_stats()
+        return stats
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
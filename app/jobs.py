@@ -0,0 +1,459 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+import argparse
+import ipaddress
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import httpx
+from dotenv import load_dotenv
+import documents
+import metrics
+from pipeline import REPORT_MODES, finish_report
+from llm_service import parse_text_report
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# JOB_QUEUE=1 enables the /jobs/ API. Jobs are stored in a SQLite file, so they
+# survive restarts and every server process (and `python jobs.py`) shares them.
+JOB_QUEUE = os.getenv("JOB_QUEUE", "0") == "1"
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "cache/jobs.sqlite3")
+# Worker processes started by each API process, each loading its own models.
+# 0 only enqueues; the jobs are then run by `python jobs.py --workers N`.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# Admission control: submissions are refused with a 503 once this many jobs
+# of the lane are waiting.
+JOB_MAX_QUEUED = {
+    "interactive": int(os.getenv("JOB_MAX_INTERACTIVE", "64")),
+    "backfill": int(os.getenv("JOB_MAX_BACKFILL", "10000")),
+}
+JOB_RETRY_AFTER = int(os.getenv("JOB_RETRY_AFTER", "30"))
+# Running jobs hold a lease their worker renews; a job whose lease ran out
+# (its worker crashed or hung) is requeued, and failed after JOB_MAX_ATTEMPTS.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs (and their results) are deleted after this many seconds.
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "604800"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+
+# Lanes are served strictly by priority: a worker only picks a backfill job
+# when no interactive job is waiting.
+LANES = {"interactive": 0, "backfill": 1}
+WEBHOOK_ATTEMPTS = 3
+# Webhooks are off unless JOB_WEBHOOK_HOSTS lists the hosts finished jobs
+# (with the patient's results) may be POSTed to, comma-separated; ".example.com"
+# also allows its subdomains. Hosts resolving to private, loopback or
+# link-local addresses are refused even when listed.
+JOB_WEBHOOK_HOSTS = [host.strip().lower() for host in os.getenv("JOB_WEBHOOK_HOSTS", "").split(",") if host.strip()]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    lane TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    payload BLOB,
+    webhook_url TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at);
+"""
+
+
+class JobQueueFull(Exception):
+    """The lane already holds its maximum of waiting jobs; the API answers 503."""
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"The {lane} job queue is full. Please retry later.")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class WebhookRejected(ValueError):
+    """The webhook_url isn't allowed; the API answers 400."""
+
+
+def check_webhook_url(url: str, allowed_hosts: list = None) -> str:
+    """
+    Returns `url` if finished jobs may be POSTed to it: an http(s) URL whose
+    host is in `allowed_hosts` (JOB_WEBHOOK_HOSTS) and resolves only to
+    public addresses. Raises WebhookRejected otherwise.
+    """
+    allowed_hosts = JOB_WEBHOOK_HOSTS if allowed_hosts is None else allowed_hosts
+    if not allowed_hosts:
+        raise WebhookRejected("Webhooks are not enabled (JOB_WEBHOOK_HOSTS).")
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise WebhookRejected("webhook_url is not a valid URL.")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise WebhookRejected("webhook_url must be an http(s) URL.")
+    host = parts.hostname.lower().rstrip(".")
+    if not any(host == allowed or (allowed.startswith(".") and host.endswith(allowed)) for allowed in allowed_hosts):
+        raise WebhookRejected(f"The webhook host {host} is not allowed.")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise WebhookRejected(f"The webhook host {host} does not resolve.")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise WebhookRejected(f"The webhook host {host} resolves to a non-public address.")
+    return url
+
+
+class JobStore:
+    """
+    Durable job queue in a SQLite file, shared by the API processes that
+    submit jobs and the worker processes that run them.
+
+    A job goes queued -> running -> done or failed. `claim` hands out the
+    oldest job of the highest-priority lane under a lease; `requeue_expired`
+    puts running jobs whose lease ran out back in the queue.
+    """
+    def __init__(self, path: str = JOB_DB_PATH, max_queued: dict = None, retry_after: int = JOB_RETRY_AFTER,
+                 lease_seconds: float = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.max_queued = max_queued or JOB_MAX_QUEUED
+        self.retry_after = retry_after
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        # Connections made before a fork (gunicorn --preload builds the store
+        # in the master) are left open but unused: closing them in the child
+        # can disturb the parent's SQLite locks.
+        self._inherited = []
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and process, made (with the schema) on
+        # first use; WAL lets readers poll while a worker writes.
+        db = getattr(self._local, "db", None)
+        if db is not None and self._local.pid != os.getpid():
+            self._inherited.append(db)
+            db = None
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same job.
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def submit(self, kind: str, mode: str, payload: bytes, lane: str = "interactive", webhook_url: str = None) -> str:
+        """Queues an "image" (encoded bytes) or "text" (UTF-8) job and returns its id."""
+        if lane not in LANES:
+            raise ValueError(f"lane must be one of {tuple(LANES)}.")
+        if mode not in REPORT_MODES:
+            raise ValueError(f"mode must be one of {REPORT_MODES}.")
+        job_id = uuid.uuid4().hex
+        with self._transaction() as db:
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND lane = ?", (lane,)).fetchone()[0]
+            if queued >= self.max_queued[lane]:
+                raise JobQueueFull(lane, self.retry_after)
+            db.execute(
+                "INSERT INTO jobs (id, lane, priority, kind, mode, payload, webhook_url, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, lane, LANES[lane], kind, mode, payload, webhook_url, time.time()),
+            )
+        return job_id
+
+    def claim(self, worker: str):
+        """Takes the next job for `worker` (a dict with its payload), or None if the queue is empty."""
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, started_at = ?, "
+                "lease_expires_at = ? WHERE id = ?",
+                (worker, now, now + self.lease_seconds, row["id"]),
+            )
+        return {**dict(row), "status": "running", "worker": worker}
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """Renews the lease; False if the job was taken away from `worker` meanwhile."""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_seconds, job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def _finish(self, job_id: str, worker: str, status: str, result=None, error: str = None) -> bool:
+        # Only the worker holding the job may finish it; a requeued job belongs to its new worker.
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, lease_expires_at = NULL, "
+            "finished_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (status, None if result is None else json.dumps(result), error, time.time(), job_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result) -> bool:
+        return self._finish(job_id, worker, "done", result=result)
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        return self._finish(job_id, worker, "failed", error=error)
+
+    def _requeue(self, condition: str, params: tuple) -> int:
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'The job crashed its worker too many times.', "
+                f"payload = NULL, lease_expires_at = NULL, finished_at = ? WHERE status = 'running' AND {condition} "
+                "AND attempts >= ?",
+                (now, *params, self.max_attempts),
+            )
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires_at = NULL "
+                f"WHERE status = 'running' AND {condition}",
+                params,
+            )
+        if cursor.rowcount:
+            logger.warning("Requeued %d interrupted job(s).", cursor.rowcount)
+        return cursor.rowcount
+
+    def requeue_expired(self) -> int:
+        """Crash recovery: requeues running jobs whose lease ran out."""
+        return self._requeue("lease_expires_at < ?", (time.time(),))
+
+    def requeue_worker(self, worker: str) -> int:
+        """Requeues the jobs of a worker known to be dead, without waiting for its lease."""
+        return self._requeue("worker = ?", (worker,))
+
+    def purge_finished(self, older_than: float = JOB_RETENTION_SECONDS) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (time.time() - older_than,)
+        )
+        return cursor.rowcount
+
+    def get(self, job_id: str):
+        """The job's status and, once finished, its result or error; None for unknown ids."""
+        db = self._connect()
+        row = db.execute(
+            "SELECT id, lane, priority, mode, status, attempts, result, error, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "lane": row["lane"],
+            "mode": row["mode"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["status"] == "queued":
+            job["position"] = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority < ? OR (priority = ? AND created_at < ?))",
+                (row["priority"], row["priority"], row["created_at"]),
+            ).fetchone()[0]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def stats(self) -> dict:
+        counts = {lane: {"queued": 0, "running": 0, "done": 0, "failed": 0} for lane in LANES}
+        for row in self._connect().execute("SELECT lane, status, COUNT(*) FROM jobs GROUP BY lane, status"):
+            counts.setdefault(row[0], {})[row[1]] = row[2]
+        return counts
+
+
+# --- Worker processes ---
+def _run_job(extractor, loop: asyncio.AbstractEventLoop, job: dict):
+    """Runs one job through the same pipeline as the synchronous endpoints."""
+    if job["kind"] == "image":
+        upload = documents.decode_upload(job["payload"])
+        if isinstance(upload, list):
+            structured_data = extractor.process_document(upload, confidence_threshold=0.5)
+        else:
+            structured_data = extractor.process_image(upload, confidence_threshold=0.5)
+    else:
+        structured_data = loop.run_until_complete(parse_text_report(job["payload"].decode("utf-8")))
+        if not structured_data:
+            raise ValueError("Could not parse the report text.")
+    return loop.run_until_complete(finish_report(structured_data, job["mode"]))
+
+
+def _notify(webhook_url: str, job: dict):
+    """POSTs the finished job to its webhook, retrying a few times; failures are only logged."""
+    for attempt in range(WEBHOOK_ATTEMPTS):
+        try:
+            # Checked again on delivery: the allowlist may have changed, or the
+            # host now resolves elsewhere. Redirects are not followed.
+            check_webhook_url(webhook_url)
+        except WebhookRejected as e:
+            logger.error("Not delivering the webhook for job %s: %s", job["job_id"], e)
+            return
+        try:
+            response = httpx.post(webhook_url, json=job, timeout=10.0, follow_redirects=False)
+            if response.status_code < 500:
+                if response.status_code >= 400:
+                    logger.warning("Webhook for job %s answered %s.", job["job_id"], response.status_code)
+                return
+        except httpx.HTTPError as e:
+            logger.warning("Webhook for job %s failed: %s", job["job_id"], e)
+        time.sleep(2 ** attempt)
+    logger.error("Gave up delivering the webhook for job %s.", job["job_id"])
+
+
+def _keep_lease(store: JobStore, job_id: str, worker: str, done: threading.Event):
+    while not done.wait(store.lease_seconds / 3):
+        if not store.heartbeat(job_id, worker):
+            return
+
+
+def _worker_main(db_path: str, worker: str, extractor_kwargs: dict):
+    """Entry point of a job worker process: loads a TableExtractor and runs jobs until killed."""
+    from model import TableExtractor
+    metrics.configure_logging()
+    store = JobStore(db_path)
+    extractor = TableExtractor(**extractor_kwargs)
+    # One loop for the life of the process: the LLM client and its semaphore bind to it.
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    logger.info("Job worker %s ready.", worker)
+
+    while True:
+        job = store.claim(worker)
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        done = threading.Event()
+        threading.Thread(target=_keep_lease, args=(store, job["id"], worker, done), daemon=True).start()
+        try:
+            result = _run_job(extractor, loop, job)
+            finished = store.complete(job["id"], worker, result)
+            status = "done"
+        except Exception as e:
+            logger.exception("Job %s failed.", job["id"])
+            finished = store.fail(job["id"], worker, str(e))
+            status = "failed"
+        finally:
+            done.set()
+
+        if not finished:
+            # The lease ran out and the job was requeued; its new worker reports it.
+            continue
+        metrics.JOBS_FINISHED.labels(job["lane"], status).inc()
+        if job["webhook_url"]:
+            threading.Thread(target=_notify, args=(job["webhook_url"], store.get(job["id"])), daemon=True).start()
+
+
+class JobWorkers:
+    """
+    Supervises `workers` job worker processes: restarts any that die (after
+    requeueing what they were running), requeues jobs whose lease expired
+    and purges old finished jobs.
+    """
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, extractor_kwargs: dict = None):
+        self.store = store
+        self.workers = workers
+        self.extractor_kwargs = extractor_kwargs or {}
+        self._processes = {}
+        self._stopped = threading.Event()
+        # Worker names are unique across every supervisor sharing the database.
+        self._prefix = f"{os.uname().nodename}:{os.getpid()}"
+
+    def _spawn(self, index: int):
+        worker = f"{self._prefix}:{index}:{uuid.uuid4().hex[:6]}"
+        # "spawn" so the children don't inherit a half-initialised torch runtime.
+        process = multiprocessing.get_context("spawn").Process(
+            target=_worker_main, args=(self.store.path, worker, self.extractor_kwargs),
+            name=f"job-worker-{index}", daemon=True,
+        )
+        process.start()
+        self._processes[index] = (worker, process)
+
+    def start(self) -> threading.Thread:
+        self.store.requeue_expired()
+        for index in range(self.workers):
+            self._spawn(index)
+        thread = threading.Thread(target=self._supervise, name="job-supervisor", daemon=True)
+        thread.start()
+        return thread
+
+    def _supervise(self):
+        while not self._stopped.wait(5):
+            try:
+                for index, (worker, process) in list(self._processes.items()):
+                    if not process.is_alive():
+                        logger.error("Job worker %s exited with %s, restarting it.", worker, process.exitcode)
+                        self.store.requeue_worker(worker)
+                        self._spawn(index)
+                self.store.requeue_expired()
+                self.store.purge_finished()
+            except Exception as e:
+                logger.error("Job supervisor error: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "alive": sum(process.is_alive() for _, process in self._processes.values()),
+        }
+
+    def shutdown(self):
+        # Interrupted jobs keep their lease and are requeued once it expires.
+        self._stopped.set()
+        for _, process in self._processes.values():
+            process.terminate()
+
+
+if __name__ == "__main__":
+    # Standalone workers for deployments where the API runs with JOB_WORKERS=0:
+    #   python jobs.py --workers 4
+    from inference import extractor_kwargs_from_env
+
+    parser = argparse.ArgumentParser(description="Runs job workers against the job database.")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1))
+    parser.add_argument("--db", default=JOB_DB_PATH)
+    args = parser.parse_args()
+
+    metrics.configure_logging()
+    supervisor = JobWorkers(JobStore(args.db), workers=args.workers, extractor_kwargs=extractor_kwargs_from_env())
+    supervisor.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        supervisor.shutdown()
@@ -1,8 +1,16 @@
 import os
 import json
-import requests
 import re
+import random
+import asyncio
+import logging
+import httpx
 from dotenv import load_dotenv
+from cache import ExplanationCache
+from metrics import stage, record_text_lines, record_guardrail_rejection, record_speculative_summary, record_prompt_tokens
+from guardrails import pre_validate
+from text_parser import parse_report_text
+from prompts import encode_findings, encode_explanations, chunk_findings, chunk_explanations, prompt_tokens
 # prompt for generation
 GENERATION_COLANG = '''template generate_explanation {
   role system
@@ -13,6 +21,7 @@ You are a helpful medical assistant. Your task is to explain lab results in simp
 - Keep each explanation short and clear.
 - Do NOT provide any medical advice or recommendations.
 - Do NOT mention any medicine names.
+- Do NOT repeat the result values, units or reference ranges; only say whether the result is high or low.
 - YOUR FINAL OUTPUT MUST BE A VALID JSON OBJECT WITH A SINGLE KEY "explanations" WHICH CONTAINS A LIST OF STRINGS.
   """
 }
@@ -33,19 +42,153 @@ You are an AI safety validator. Your only task is to answer with TRUE or FALSE b
 }
 '''
 load_dotenv()
+logger = logging.getLogger(__name__)
 API_KEY = os.getenv("HF_TOKEN")
-API_URL = "https://router.huggingface.co/v1/chat/completions"
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
-}
-if not API_KEY:
+# LLM_API_URL lets a local chat-completions stub stand in for the router (e.g.
+# mock_llm.py in load tests); only the router itself needs HF_TOKEN.
+DEFAULT_API_URL = "https://router.huggingface.co/v1/chat/completions"
+API_URL = os.getenv("LLM_API_URL", DEFAULT_API_URL)
+HEADERS = {"Content-Type": "application/json"}
+if API_KEY:
+    HEADERS["Authorization"] = f"Bearer {API_KEY}"
+elif API_URL == DEFAULT_API_URL:
     raise ValueError("HF_TOKEN not found! Please create a .env file and add your key.")
-
-def query_llm(payload):
-    response = requests.post(API_URL, headers=HEADERS, json=payload)
-    response.raise_for_status()
-    return response.json()
+else:
+    logger.warning("HF_TOKEN is not set, calling %s without credentials.", API_URL)
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))              # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))         # retries after the first attempt
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))   # seconds, doubled on every retry
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # concurrent upstream calls per process
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# One pooled keep-alive client per process, created on first use so it binds
+# to the running event loop. The semaphore caps concurrent upstream calls.
+_client = None
+_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def _retry_delay(attempt: int, response: httpx.Response = None) -> float:
+    # Honour the upstream's Retry-After when it sends one, else back off exponentially with jitter.
+    if response is not None:
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            pass
+    return LLM_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+
+async def query_llm(payload):
+    """
+    Sends one chat-completions request, retrying timeouts, connection errors,
+    429 and 5xx responses with exponential backoff.
+    """
+    async with _semaphore:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                response = await get_client().post(API_URL, json=payload)
+            except (httpx.TimeoutException, httpx.TransportError):
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_retry_delay(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                await asyncio.sleep(_retry_delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+async def query_llm_stream(payload, on_token) -> dict:
+    """
+    Sends one chat-completions request with `"stream": true`, awaiting
+    `on_token(text)` for every content delta, and returns the response in the
+    non-streaming shape so callers parse it the same way. Only attempts that
+    fail before the first token are retried.
+    """
+    async with _semaphore:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            parts = []
+            try:
+                async with get_client().stream("POST", API_URL, json={**payload, "stream": True}) as response:
+                    if response.status_code in RETRY_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                        delay = _retry_delay(attempt, response)
+                    else:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            choices = json.loads(data).get("choices") or [{}]
+                            text = (choices[0].get("delta") or {}).get("content")
+                            if text:
+                                parts.append(text)
+                                await on_token(text)
+                        return {"choices": [{"message": {"role": "assistant", "content": "".join(parts)}}]}
+            except (httpx.TimeoutException, httpx.TransportError):
+                if attempt == LLM_MAX_RETRIES or parts:
+                    raise
+                delay = _retry_delay(attempt)
+            await asyncio.sleep(delay)
+
+# Validated explanations are memoized per finding, so repeated abnormal results
+# (e.g. "Hemoglobin / Low") skip the generation + validation round trip.
+# EXPLANATION_CACHE_BUCKETS=1 also keys on how far the result is outside its range.
+explanation_cache = None
+if os.getenv("EXPLANATION_CACHE", "1") == "1":
+    explanation_cache = ExplanationCache(
+        max_entries=int(os.getenv("EXPLANATION_CACHE_SIZE", "2048")),
+        ttl=float(os.getenv("EXPLANATION_CACHE_TTL", str(7 * 24 * 3600))),
+        path=os.getenv("EXPLANATION_CACHE_PATH", "cache/explanations.json") or None,
+    )
+EXPLANATION_CACHE_BUCKETS = os.getenv("EXPLANATION_CACHE_BUCKETS", "0") == "1"
+
+def _result_bucket(row: dict) -> str:
+    """
+    Coarse distance of the result outside its reference range, in half range
+    widths (0 = just outside, capped at 4), or "" when it can't be computed.
+    """
+    try:
+        result_val = float(re.search(r'\d+\.?\d*', row.get("results", "")).group(0))
+        lower, upper = [float(n) for n in re.findall(r'\d+\.?\d*', row.get("range", ""))]
+    except (AttributeError, ValueError, TypeError):
+        return ""
+    width = upper - lower
+    if width <= 0:
+        return ""
+    deviation = max(result_val - upper, lower - result_val, 0) / width
+    return str(min(int(deviation / 0.5), 4))
+
+def explanation_key(row: dict) -> str:
+    parameter = " ".join(re.sub(r'[^a-z0-9%+]+', ' ', str(row.get("parameter", "")).lower()).split())
+    status = str(row.get("status", "")).strip().lower()
+    key = f"{parameter}|{status}"
+    if EXPLANATION_CACHE_BUCKETS:
+        key += f"|{_result_bucket(row)}"
+    return key
+
+_NUMBER_REGEX = re.compile(r'\d+(?:\.\d+)?')
+
+def _quotes_values(row: dict, explanation: str) -> bool:
+    """True when the explanation contains a number of the finding's result or range."""
+    values = {float(n) for n in _NUMBER_REGEX.findall(f"{row.get('results', '')} {row.get('range', '')}".replace(",", ""))}
+    return any(float(n) in values for n in _NUMBER_REGEX.findall(explanation.replace(",", "")))
 
 def extract_json(text: str) -> dict:
     start = text.find('{')
@@ -58,14 +201,97 @@ def extract_prompt(template_str):
     match = re.search(r'content\s+"""(.*?)"""', template_str, re.DOTALL)
     return match.group(1).strip() if match else ""
 
-def get_llm_summary(abnormal_lab_results: dict) -> dict:
+VALIDATION_FAILED = "Generated explanation failed validation guardrail."
+EXPLANATION_COUNT_MISMATCH = "The generated explanations don't match the abnormal results one to one."
+# LOCAL_GUARDRAIL=1 rejects explanations that break the rules in guardrails.py
+# before the validation LLM call is made.
+LOCAL_GUARDRAIL = os.getenv("LOCAL_GUARDRAIL", "1") == "1"
+# SPECULATIVE_SUMMARY=1 starts the /summarize/ summary call together with the
+# validation call and discards it if validation fails.
+SPECULATIVE_SUMMARY = os.getenv("SPECULATIVE_SUMMARY", "1") == "1"
+
+
+def _cached_explanations(abnormal_lab_results: dict) -> dict:
+    cached = {}
+    if explanation_cache is not None:
+        for key, row in abnormal_lab_results.items():
+            explanation = explanation_cache.get(explanation_key(row))
+            if explanation is not None:
+                cached[key] = explanation
+    return cached
+
+
+def _merge_explanations(abnormal_lab_results: dict, cached: dict, summary_json: dict) -> dict:
+    """Merges cached and newly generated explanations back in report order."""
+    if not cached or not isinstance(summary_json.get("explanations"), list):
+        return summary_json
+    new_explanations = iter(summary_json["explanations"])
+    merged = [cached[key] if key in cached else next(new_explanations, "") for key in abnormal_lab_results]
+    merged.extend(new_explanations)
+    return {**summary_json, "explanations": [e for e in merged if e]}
+
+
+async def get_llm_summary(abnormal_lab_results: dict) -> dict:
+    """
+    Explains the abnormal results, asking the LLM (generation + validation)
+    only about findings whose explanation isn't cached yet. Cached and new
+    explanations are merged back in report order.
+    """
+    cached = _cached_explanations(abnormal_lab_results)
+    uncached_results = {key: row for key, row in abnormal_lab_results.items() if key not in cached}
+    if not uncached_results:
+        return {"explanations": [cached[key] for key in abnormal_lab_results]}
+
+    summary_json = await _generate_validated_explanations(uncached_results)
+    if "error" in summary_json:
+        return summary_json
+    await _remember_explanations(uncached_results, summary_json)
+    return _merge_explanations(abnormal_lab_results, cached, summary_json)
+
+
+async def _remember_explanations(results: dict, summary_json: dict):
+    explanations = summary_json.get("explanations")
+    # Only cache when the explanations line up one-to-one with the findings.
+    if explanation_cache is None or not isinstance(explanations, list) or len(explanations) != len(results):
+        return
+    for row, explanation in zip(results.values(), explanations):
+        # The key holds no values, so text quoting this patient's numbers isn't shared.
+        if isinstance(explanation, str) and explanation.strip() and not _quotes_values(row, explanation):
+            explanation_cache.put(explanation_key(row), explanation)
+    await asyncio.to_thread(explanation_cache.save)
+
+
+async def _generate_explanations(abnormal_lab_results: dict) -> dict:
+    """
+    Generation calls plus the local guardrail; returns {"error": ...} on
+    failure. Findings that don't fit one prompt (see prompts.chunk_findings)
+    are generated in concurrent chunks, merged back in report order. A chunk
+    that doesn't return exactly one explanation per finding fails the call.
+    """
+    chunks = chunk_findings(abnormal_lab_results)
+    outputs = await asyncio.gather(*(_generate_chunk(chunk) for chunk in chunks))
+    explanations = []
+    for chunk, output in zip(chunks, outputs):
+        if "error" in output:
+            return output
+        # Explanations are matched to findings by position (and cached per
+        # finding), so a chunk with one too few or too many would shift the rest.
+        if not isinstance(output.get("explanations"), list) or len(output["explanations"]) != len(chunk):
+            logger.info("Generation returned %s explanations for %s findings.",
+                        len(output.get("explanations") or []), len(chunk))
+            return {"error": EXPLANATION_COUNT_MISMATCH}
+        explanations.extend(output["explanations"])
+    return {"explanations": explanations}
+
+
+async def _generate_chunk(abnormal_lab_results: dict) -> dict:
+    """One generation call plus the local guardrail."""
     gen_sys_prompt = extract_prompt(GENERATION_COLANG)
-    val_sys_prompt = extract_prompt(VALIDATION_COLANG)
 
-    user_prompt = f"""Here are my abnormal lab results in JSON format:
-{json.dumps(abnormal_lab_results, indent=2)}
+    user_prompt = f"""Here are my abnormal lab results, one per line (test: result (reference range) status):
+{encode_findings(abnormal_lab_results)}
 
-Please provide the simple explanations in the required JSON format."""
+Please provide one simple explanation per result, in the same order, in the required JSON format."""
 
     # Generation payload
     gen_payload = {
@@ -78,34 +304,77 @@ Please provide the simple explanations in the required JSON format."""
 
     try:
         # Query for generation
-        gen_response = query_llm(gen_payload)
+        with stage("llm_generation"):
+            gen_response = await query_llm(gen_payload)
+        record_prompt_tokens("generation", prompt_tokens(gen_payload, gen_response))
         gen_content = gen_response["choices"][0]["message"]["content"]
         summary_json = extract_json(gen_content)
+    except Exception as e:
+        return {"error": f"An error occurred in the pipeline: {e}"}
 
-        # Validation payload
-        val_payload = {
-            "messages": [
-                {"role": "system", "content": val_sys_prompt},
-                {"role": "user", "content": json.dumps(summary_json, indent=2)}
-            ],
-            "model": "meta-llama/Llama-3.1-8B-Instruct"
-        }
+    if LOCAL_GUARDRAIL:
+        parameters = [row.get("parameter", "") for row in abnormal_lab_results.values() if isinstance(row, dict)]
+        violations = pre_validate(summary_json, parameters)
+        if violations:
+            record_guardrail_rejection("local")
+            logger.info("Explanations rejected by the local guardrail: %s", violations)
+            return {"error": VALIDATION_FAILED}
+    return summary_json
 
-        val_response = query_llm(val_payload)
-        verdict = val_response["choices"][0]["message"]["content"].strip().upper()
-        
-        if verdict == "TRUE":
+
+async def _validate_explanations(summary_json: dict) -> bool:
+    """
+    The validation LLM calls; True when the explanations are judged safe.
+    Explanations that don't fit one prompt are validated in concurrent chunks,
+    which must all pass.
+    """
+    explanations = summary_json.get("explanations")
+    if not isinstance(explanations, list):
+        return await _validate_chunk(json.dumps(summary_json))
+    verdicts = await asyncio.gather(*(
+        _validate_chunk(encode_explanations({"explanations": chunk}))
+        for chunk in chunk_explanations(explanations) or [[]]
+    ))
+    return all(verdicts)
+
+
+async def _validate_chunk(explanations_text: str) -> bool:
+    val_sys_prompt = extract_prompt(VALIDATION_COLANG)
+
+    # Validation payload
+    val_payload = {
+        "messages": [
+            {"role": "system", "content": val_sys_prompt},
+            {"role": "user", "content": explanations_text}
+        ],
+        "model": "meta-llama/Llama-3.1-8B-Instruct"
+    }
+
+    with stage("llm_validation"):
+        val_response = await query_llm(val_payload)
+    record_prompt_tokens("validation", prompt_tokens(val_payload, val_response))
+    verdict = val_response["choices"][0]["message"]["content"].strip().upper()
+    if verdict != "TRUE":
+        record_guardrail_rejection("llm")
+    return verdict == "TRUE"
+
+
+async def _generate_validated_explanations(abnormal_lab_results: dict) -> dict:
+    summary_json = await _generate_explanations(abnormal_lab_results)
+    if "error" in summary_json:
+        return summary_json
+    try:
+        if await _validate_explanations(summary_json):
             return summary_json
         else:
-            return {"error": "Generated explanation failed validation guardrail."}
-            
+            return {"error": VALIDATION_FAILED}
     except Exception as e:
         return {"error": f"An error occurred in the pipeline: {e}"}
 
 
 # Add this new function to your llm_service.py file
 
-def parse_text_to_structured_json(plain_text: str) -> dict:
+async def parse_text_to_structured_json(plain_text: str) -> dict:
     """
     Uses an LLM to parse unstructured lab report text into a structured JSON object.
     """
@@ -157,16 +426,19 @@ cLac: 1.8 mmolfl (0.5 - 1.6)
     user_prompt = f"""Please extract the data from the following lab report text:
 {plain_text}"""
 
-    print("Parsing plain text with LLM...")
-    # This calls the same query_llm function you already have
-    response = query_llm({
+    logger.debug("Parsing plain text with LLM...")
+    payload = {
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
         "model": "meta-llama/Llama-3.1-8B-Instruct"
-    })
-    print(response)
+    }
+    # This calls the same query_llm function you already have
+    with stage("llm_parse"):
+        response = await query_llm(payload)
+    record_prompt_tokens("parse", prompt_tokens(payload, response))
+    logger.debug("Parse response: %s", response)
     try:
         # 1. Get the full content string (your code was correct)
         content_string = response["choices"][0]["message"]["content"]
@@ -184,41 +456,99 @@ cLac: 1.8 mmolfl (0.5 - 1.6)
             
             return extracted_json
         else:
-            print("Error: Could not find a JSON object in the response content.")
+            logger.warning("Could not find a JSON object in the response content.")
 
     except (KeyError, IndexError, json.JSONDecodeError) as e:
-        print(f"An error occurred while parsing the response: {e}")
+        logger.warning("An error occurred while parsing the response: %s", e)
+
+
+TEXT_FAST_PATH = os.getenv("TEXT_FAST_PATH", "1") == "1"
+
 
+def _line_of(row, unparsed: list) -> int:
+    """Line number of the unparsed line an LLM-parsed row came from, if it can be told."""
+    parameter = str(row.get("parameter", "")).strip().lower() if isinstance(row, dict) else ""
+    for line_number, line in unparsed:
+        if parameter and line.lower().startswith(parameter):
+            return line_number
+    return float("inf")
 
-def summarize(explanation: dict, normalized_report: dict) -> dict:
+
+async def parse_text_report(plain_text: str) -> dict:
+    """
+    Parses a plain-text report with the local fast path (text_parser.py) and
+    sends only the lines it can't parse to the LLM. The result carries a
+    "parser" entry with the fast-path hit rate. Returns None like
+    parse_text_to_structured_json when nothing could be parsed.
+    """
+    if not TEXT_FAST_PATH:
+        return await parse_text_to_structured_json(plain_text)
+
+    with stage("text_fast_path"):
+        rows, unparsed = parse_report_text(plain_text)
+    record_text_lines(len(rows), len(unparsed))
+    total = len(rows) + len(unparsed)
+    parser_stats = {
+        "lines": total,
+        "fast_path_lines": len(rows),
+        "llm_lines": len(unparsed),
+        "fast_path_hit_rate": round(len(rows) / total, 4) if total else 0.0,
+    }
+
+    if not rows:
+        # Nothing the fast path recognises: the LLM gets the whole text, as before.
+        structured_data = await parse_text_to_structured_json(plain_text)
+        if isinstance(structured_data, dict):
+            structured_data["parser"] = parser_stats
+        return structured_data
+
+    if unparsed:
+        llm_json = await parse_text_to_structured_json("\n".join(line for _, line in unparsed))
+        llm_rows = llm_json.get("data") if isinstance(llm_json, dict) else None
+        if isinstance(llm_rows, dict):
+            rows.extend((_line_of(row, unparsed), row) for row in llm_rows.values())
+        # Rows are kept in report order; sorted() is stable for rows it can't place.
+        rows = sorted(rows, key=lambda item: item[0])
+
+    return {"data": {str(i): row for i, (_, row) in enumerate(rows)}, "parser": parser_stats}
+
+
+async def summarize(explanation: dict, normalized_report: dict, on_token=None) -> dict:
     """
     Takes a dictionary of LLM-generated explanations and the full normalized report,
     asks an LLM to create a high-level summary, and then combines everything
-    into a final report.
+    into a final report. With `on_token`, the summary is streamed and
+    `await on_token(text)` is called for every generated chunk.
     """
 
     # --- IMPROVED PROMPT ---
     # This prompt is more specific about the desired output structure from the LLM.
-    system_prompt = """You are an automated summarization service. Your sole function is to read a JSON object containing lab result explanations and provide a short, high-level non- alarming summary for a doctor's dashboard.
+    system_prompt = """You are an automated summarization service. Your sole function is to read a list of lab result explanations and provide a short, high-level non- alarming summary for a doctor's dashboard.
 - Write a small, concise sentence summarizing the key findings.
 - YOUR FINAL RESPONSE MUST BE ONLY THE VALID JSON OBJECT with a key "summary". Do not include conversational text or markdown."""
 
-    user_prompt = f"""Here is the explanation report in JSON format:
-{json.dumps(explanation, indent=2)}
+    user_prompt = f"""Here are the lab result explanations, one per line:
+{encode_explanations(explanation)}
 
 Please provide the summary in the required JSON format."""
     
-    print("Summarizing explanation with LLM...")
+    logger.debug("Summarizing explanation with LLM...")
     
     try:
         # This calls your query_llm function
-        response = query_llm({
+        payload = {
             "messages": [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             "model": "meta-llama/Llama-3.1-8B-Instruct"
-        })
+        }
+        with stage("llm_summarize"):
+            if on_token is None:
+                response = await query_llm(payload)
+            else:
+                response = await query_llm_stream(payload, on_token)
+        record_prompt_tokens("summary", prompt_tokens(payload, response))
         
         content_string = response["choices"][0]["message"]["content"]
 
@@ -241,11 +571,53 @@ Please provide the summary in the required JSON format."""
             # ------------------------------------
             
         else:
-            print("Error: Could not find a JSON object in the summary response.")
+            logger.warning("Could not find a JSON object in the summary response.")
             # Return the original report even if summarization fails
             return normalized_report
 
     except Exception as e:
-        print(f"An error occurred during summarization: {e}")
+        logger.warning("An error occurred during summarization: %s", e)
         # Return the original report if an error occurs
         return normalized_report
+
+
+async def summarize_findings(abnormal_lab_results: dict, normalized_report: dict) -> dict:
+    """
+    get_llm_summary followed by summarize. With SPECULATIVE_SUMMARY the summary
+    call starts as soon as the explanations are generated, in parallel with
+    the validation call, and is discarded if validation fails. That takes one
+    LLM round trip off the critical path of /summarize/.
+    """
+    if not SPECULATIVE_SUMMARY:
+        return await summarize(await get_llm_summary(abnormal_lab_results), normalized_report)
+
+    cached = _cached_explanations(abnormal_lab_results)
+    uncached_results = {key: row for key, row in abnormal_lab_results.items() if key not in cached}
+    if not uncached_results:
+        analyzed_report = {"explanations": [cached[key] for key in abnormal_lab_results]}
+        return await summarize(analyzed_report, normalized_report)
+
+    summary_json = await _generate_explanations(uncached_results)
+    if "error" in summary_json:
+        return await summarize(summary_json, normalized_report)
+
+    analyzed_report = _merge_explanations(abnormal_lab_results, cached, summary_json)
+    speculative_summary = asyncio.create_task(summarize(analyzed_report, normalized_report))
+    try:
+        valid = await _validate_explanations(summary_json)
+        failure = {"error": VALIDATION_FAILED}
+    except Exception as e:
+        valid, failure = False, {"error": f"An error occurred in the pipeline: {e}"}
+    except asyncio.CancelledError:
+        speculative_summary.cancel()
+        raise
+
+    if not valid:
+        speculative_summary.cancel()
+        record_speculative_summary("discarded")
+        # Same as the sequential path: the failure itself gets summarized.
+        return await summarize(failure, normalized_report)
+
+    record_speculative_summary("used")
+    await _remember_explanations(uncached_results, summary_json)
+    return await speculative_summary
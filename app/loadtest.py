@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import httpx
+import numpy as np
+
+# Endpoints a workload can hit; text reports can only go to the first two.
+TEXT_ENDPOINTS = ("/analyze-report/", "/summarize/")
+IMAGE_ENDPOINTS = ("/analyze-report/", "/summarize/", "/get-normalized-report/", "/extract-table/")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp", ".pdf")
+
+
+class LoadRequest:
+    """One request of the workload: a text report or an image upload to `endpoint`."""
+    def __init__(self, endpoint: str, text: str = None, image_path: str = None):
+        self.endpoint = endpoint
+        self.text = text
+        self.image_path = image_path
+
+
+def load_text_workload(path: str) -> list:
+    """
+    Reads a JSONL workload: one object per line with the report under
+    "text_input", "text" or "body" (as in /batch/ JSONL files) and an optional
+    "endpoint". Returns (endpoint or None, text) pairs.
+    """
+    items = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("text_input") or record.get("text") or record.get("body")
+            if text:
+                items.append((record.get("endpoint"), text))
+    return items
+
+
+def find_images(paths: list) -> list:
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS)))
+        else:
+            images.append(path)
+    return images
+
+
+def build_mix(texts: list, images: list, endpoints: list, image_ratio: float, seed: int = 0):
+    """
+    Endless seeded sequence of LoadRequests: an image upload with probability
+    `image_ratio`, a text report otherwise, cycling through the workload and
+    the `endpoints` that accept each kind.
+    """
+    rng = random.Random(seed)
+    text_endpoints = [e for e in endpoints if e in TEXT_ENDPOINTS]
+    image_endpoints = [e for e in endpoints if e in IMAGE_ENDPOINTS]
+    if texts and not text_endpoints:
+        raise ValueError(f"Text reports need one of {TEXT_ENDPOINTS} in --endpoints.")
+    if images and not image_endpoints:
+        raise ValueError(f"Images need one of {IMAGE_ENDPOINTS} in --endpoints.")
+    if not texts and not images:
+        raise ValueError("The workload is empty: pass --workload and/or --images.")
+
+    count = 0
+    while True:
+        use_image = images and (not texts or rng.random() < image_ratio)
+        if use_image:
+            yield LoadRequest(image_endpoints[count % len(image_endpoints)], image_path=images[count % len(images)])
+        else:
+            endpoint, text = texts[count % len(texts)]
+            yield LoadRequest(endpoint or text_endpoints[count % len(text_endpoints)], text=text)
+        count += 1
+
+
+async def send(client: httpx.AsyncClient, request: LoadRequest, image_cache: dict) -> tuple:
+    """
+    Sends one request; returns (outcome, seconds, prompt tokens) where outcome
+    is "ok", an HTTP status or an error name, and the prompt tokens are the
+    total of the X-Prompt-Tokens header (None without LLM calls).
+    """
+    if request.image_path:
+        if request.image_path not in image_cache:
+            with open(request.image_path, "rb") as f:
+                image_cache[request.image_path] = f.read()
+        kwargs = {"files": {"file": (os.path.basename(request.image_path), image_cache[request.image_path])}}
+    else:
+        kwargs = {"data": {"text_input": request.text}}
+
+    started = time.perf_counter()
+    try:
+        response = await client.post(request.endpoint, **kwargs)
+        elapsed = time.perf_counter() - started
+    except httpx.HTTPError as e:
+        return type(e).__name__, time.perf_counter() - started, None
+    tokens = _total_prompt_tokens(response.headers.get("X-Prompt-Tokens"))
+    if response.status_code != 200:
+        return str(response.status_code), elapsed, tokens
+    try:
+        body = response.json()
+    except ValueError:
+        return "invalid_json", elapsed, tokens
+    # Pipeline failures (e.g. a rejected explanation) come back as 200 with an "error".
+    if isinstance(body, dict) and "error" in body:
+        return "error_in_body", elapsed, tokens
+    return "ok", elapsed, tokens
+
+
+def _total_prompt_tokens(header: str):
+    for part in (header or "").split(","):
+        name, _, count = part.strip().partition("=")
+        if name == "total" and count.isdigit():
+            return int(count)
+    return None
+
+
+async def run_load(base_url: str, mix, concurrency: int = None, rate: float = None, duration: float = 60.0,
+                   max_requests: int = None, timeout: float = 300.0, seed: int = 0) -> dict:
+    """
+    Replays `mix` against the API, either closed-loop with `concurrency`
+    clients sending back to back, or open-loop with Poisson arrivals at
+    `rate` requests per second, for `duration` seconds or `max_requests`.
+    """
+    records = []  # (endpoint, outcome, seconds, prompt tokens)
+    image_cache = {}
+    deadline = time.perf_counter() + duration
+    sent = 0
+
+    def next_request():
+        nonlocal sent
+        if time.perf_counter() >= deadline or (max_requests and sent >= max_requests):
+            return None
+        sent += 1
+        return next(mix)
+
+    async def one(client, request):
+        outcome, seconds, tokens = await send(client, request, image_cache)
+        records.append((request.endpoint, outcome, seconds, tokens))
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=concurrency or 100)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        if rate:
+            rng = np.random.default_rng(seed)
+            tasks = []
+            while (request := next_request()) is not None:
+                tasks.append(asyncio.create_task(one(client, request)))
+                await asyncio.sleep(rng.exponential(1 / rate))
+            await asyncio.gather(*tasks)
+        else:
+            async def closed_loop():
+                while (request := next_request()) is not None:
+                    await one(client, request)
+            await asyncio.gather(*(closed_loop() for _ in range(concurrency or 1)))
+    return summarize_records(records, time.perf_counter() - started)
+
+
+def summarize_records(records: list, wall_seconds: float) -> dict:
+    """Throughput, latency percentiles, outcome breakdown and prompt tokens per endpoint and overall."""
+    def summary(rows):
+        latencies = np.array([seconds for _, _, seconds, _ in rows]) * 1000
+        tokens = [count for _, _, _, count in rows if count is not None]
+        outcomes = {}
+        for _, outcome, _, _ in rows:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        ok = outcomes.get("ok", 0)
+        return {
+            "requests": len(rows),
+            "ok": ok,
+            "error_rate": round(1 - ok / len(rows), 4) if rows else 0.0,
+            "throughput_rps": round(len(rows) / wall_seconds, 2) if wall_seconds else 0.0,
+            "ok_rps": round(ok / wall_seconds, 2) if wall_seconds else 0.0,
+            "latency_ms": {
+                name: round(float(np.percentile(latencies, q)), 1)
+                for name, q in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100))
+            } if rows else {},
+            "outcomes": outcomes,
+            "prompt_tokens_per_llm_request": round(sum(tokens) / len(tokens), 1) if tokens else None,
+        }
+
+    endpoints = sorted({endpoint for endpoint, _, _, _ in records})
+    return {
+        "wall_seconds": round(wall_seconds, 2),
+        "endpoints": {endpoint: summary([r for r in records if r[0] == endpoint]) for endpoint in endpoints},
+        "overall": summary(records),
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'endpoint':<26}{'reqs':>7}{'ok':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+             f"{'tokens':>9}  outcomes"]
+    for name, row in list(report["endpoints"].items()) + [("overall", report["overall"])]:
+        latency = row["latency_ms"]
+        lines.append(f"{name:<26}{row['requests']:>7}{row['ok']:>7}{row['throughput_rps']:>8}"
+                     f"{latency.get('p50', ''):>9}{latency.get('p95', ''):>9}{latency.get('p99', ''):>9}"
+                     f"{latency.get('max', ''):>9}{str(row['prompt_tokens_per_llm_request'] or '-'):>9}"
+                     f"  {json.dumps(row['outcomes'])}")
+    lines.append(f"(latencies in ms over {report['wall_seconds']} s; tokens: mean prompt tokens of requests calling the LLM)")
+    return "\n".join(lines)
+
+
+def _wait_for(url: str, timeout: float, process: subprocess.Popen = None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"The process serving {url} exited with {process.returncode}.")
+        try:
+            if httpx.get(url, timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not become ready within {timeout} s.")
+
+
+def start_mock_llm(port: int, latency_ms: float, jitter_ms: float, error_rate: float, replies: str = None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, os.path.join(here, "mock_llm.py"), "--port", str(port),
+               "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms), "--error-rate", str(error_rate)]
+    if replies:
+        command += ["--replies", replies]
+    process = subprocess.Popen(command, cwd=here)
+    _wait_for(f"http://127.0.0.1:{port}/health", 30, process)
+    return process
+
+
+def start_api(port: int, llm_url: str, wait_for_models: bool, disable_caches: bool):
+    """Starts the API (uvicorn main:app) pointed at the mock LLM."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, "LLM_API_URL": llm_url}
+    if disable_caches:
+        env.update(RESULT_CACHE="0", EXPLANATION_CACHE="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)], cwd=here, env=env)
+    # Text-only workloads don't need the models; image workloads wait until they are warmed up.
+    _wait_for(f"http://127.0.0.1:{port}/{'readyz' if wait_for_models else 'healthz'}", 900, process)
+    return process
+
+
+if __name__ == "__main__":
+    # Usage (from the app/ directory), starting a mock LLM and the API:
+    #   python loadtest.py --mock-llm --serve --workload ../requests.jsonl --images ../sample_report.png \
+    #       --concurrency 16 --duration 60
+    parser = argparse.ArgumentParser(description="Load test for the report endpoints.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API to test (ignored with --serve)")
+    parser.add_argument("--workload", help="JSONL of text reports (text_input/text/body, optional endpoint)")
+    parser.add_argument("--images", nargs="+", default=[], help="image/PDF files or directories to upload")
+    parser.add_argument("--image-ratio", type=float, default=0.2, help="share of requests that upload an image")
+    parser.add_argument("--endpoints", nargs="+", default=list(TEXT_ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    parser.add_argument("--rate", type=float, help="open-loop arrivals per second (instead of --concurrency)")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--mock-llm", action="store_true", help="start mock_llm.py")
+    parser.add_argument("--mock-port", type=int, default=9000)
+    parser.add_argument("--mock-latency-ms", type=float, default=500.0)
+    parser.add_argument("--mock-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-replies", help="JSON file of canned mock replies per call kind")
+    parser.add_argument("--serve", action="store_true", help="start the API pointed at the mock LLM")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--keep-caches", action="store_true", help="leave the result/explanation caches on with --serve")
+    args = parser.parse_args()
+
+    texts = load_text_workload(args.workload) if args.workload else []
+    images = find_images(args.images)
+    mix = build_mix(texts, images, args.endpoints, args.image_ratio if texts else 1.0, seed=args.seed)
+
+    processes = []
+    try:
+        if args.mock_llm:
+            processes.append(start_mock_llm(args.mock_port, args.mock_latency_ms, args.mock_jitter_ms,
+                                            args.mock_error_rate, args.mock_replies))
+        url = args.url
+        if args.serve:
+            llm_url = f"http://127.0.0.1:{args.mock_port}/v1/chat/completions"
+            processes.append(start_api(args.port, llm_url, wait_for_models=bool(images),
+                                       disable_caches=not args.keep_caches))
+            url = f"http://127.0.0.1:{args.port}"
+
+        report = asyncio.run(run_load(url, mix, concurrency=args.concurrency, rate=args.rate, duration=args.duration,
+                                      max_requests=args.requests, timeout=args.timeout, seed=args.seed))
+        if args.mock_llm:
+            report["mock_llm"] = httpx.get(f"http://127.0.0.1:{args.mock_port}/health").json()["calls"]
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,24 +1,263 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
-from PIL import Image
-from model import TableExtractor # Import your class from model.py
-from llm_service import get_llm_summary ,parse_text_to_structured_json, summarize
+import os
+import hmac
+import json
+import time
+import asyncio
+import logging
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Depends
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
+from inference import InferencePool, InferenceUnavailable, extractor_kwargs_from_env
+from cache import ResultCache
+from imaging import UploadTooLarge
+import documents
+from streaming import stream_events
+import jobs
+from jobs import JobStore, JobWorkers, JobQueueFull, LANES, WebhookRejected, check_webhook_url
+from batch import BatchItem, BATCH_MODES, iter_batch_items, stream_batch, spool_uploads, close_uploads
+import metrics
+import tuning
+from metrics import stage, start_timings
+from model import DETECTION_MODEL, DETECTION_REVISION, STRUCTURE_MODEL, STRUCTURE_REVISION
+from llm_service import get_llm_summary ,parse_text_report, summarize, close_client, explanation_cache
+from pipeline import REPORT_MODES, abnormal_findings, analyze_structured, summarize_structured, with_parser_stats, finish_report
 
-print("Starting API server...")
+metrics.configure_logging()
+logger = logging.getLogger("main")
+logger.info("Starting API server...")
+if tuning.PROFILE:
+    logger.info("Using the tuning profile %s: %s", tuning.PROFILE["path"], tuning.PROFILE.get("settings"))
 app = FastAPI()
 
-extractor = TableExtractor()
+# Model inference runs on a bounded worker pool (see inference.py) so it never
+# blocks the event loop.
+extractor_kwargs = extractor_kwargs_from_env()
+inference_pool = InferencePool(extractor_kwargs=extractor_kwargs)
+
+# Models load in the background so the server accepts connections right away;
+# /readyz turns 200 once they are loaded and warmed up on WARMUP_IMAGE.
+# PRELOAD_MODELS=1 (set by gunicorn.conf.py) loads them at import time instead,
+# in the pre-fork master, so all workers share one copy-on-write copy of the weights.
+# Only in thread mode: a process pool is created in each worker after the fork.
+def default_warmup_image():
+    here = os.path.dirname(os.path.abspath(__file__))
+    for path in (os.path.join(here, "sample_report.png"), os.path.join(here, "..", "sample_report.png")):
+        if os.path.exists(path):
+            return path
+    return None
+
+WARMUP_IMAGE = os.getenv("WARMUP_IMAGE", default_warmup_image() or "")
+if os.getenv("PRELOAD_MODELS", "0") == "1" and inference_pool.mode == "thread":
+    inference_pool.load()
+
+# Results are cached by image content + parameters. The namespace fingerprints
+# the models, so changing a revision (or RESULT_CACHE_VERSION) starts a fresh cache.
+result_cache = None
+if os.getenv("RESULT_CACHE", "1") == "1":
+    result_cache = ResultCache(
+        namespace="|".join([
+            f"{DETECTION_MODEL}@{DETECTION_REVISION}",
+            f"{STRUCTURE_MODEL}@{STRUCTURE_REVISION}",
+            json.dumps(extractor_kwargs, sort_keys=True),
+            os.getenv("RESULT_CACHE_VERSION", "1"),
+        ]),
+        max_entries=int(os.getenv("RESULT_CACHE_SIZE", "256")),
+        cache_dir=os.getenv("RESULT_CACHE_DIR", "cache/results") or None,
+        ttl=float(os.getenv("RESULT_CACHE_TTL", "86400")),
+        disk_max_entries=int(os.getenv("RESULT_CACHE_DISK_ENTRIES", "10000")),
+        disk_max_bytes=int(float(os.getenv("RESULT_CACHE_DISK_MB", "1024")) * 1024 * 1024),
+    )
+    result_cache.purge_stale()
+
+# Asynchronous job API (see jobs.py): jobs persist in SQLite and run on
+# JOB_WORKERS worker processes per server process (0 = run `python jobs.py`).
+job_store = None
+job_workers = None
+if jobs.JOB_QUEUE:
+    job_store = JobStore()
+    if jobs.JOB_WORKERS > 0:
+        job_workers = JobWorkers(job_store, extractor_kwargs=extractor_kwargs)
+
+
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    """
+    Collects the stage timings of the request (see metrics.py), observes its
+    latency and, with TIMING_HEADERS=1, returns the breakdown as Server-Timing.
+    Requests that called the LLM get their prompt tokens in X-Prompt-Tokens.
+    """
+    timings = start_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.labels(route.path if route else "unmatched", str(response.status_code)).observe(
+        time.perf_counter() - started)
+    if metrics.TIMING_HEADERS and timings.stages:
+        response.headers["Server-Timing"] = timings.server_timing()
+    if timings.prompt_tokens:
+        response.headers["X-Prompt-Tokens"] = timings.prompt_tokens_header()
+    return response
+
+
+@app.on_event("startup")
+async def start_inference_pool():
+    inference_pool.start_in_background(warmup_image=WARMUP_IMAGE or None)
+    if job_workers:
+        job_workers.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    inference_pool.shutdown()
+    if job_workers:
+        job_workers.shutdown()
+    await close_client()
+
+
+async def read_image(file: UploadFile):
+    """Reads an upload and decodes it off the event loop (see decode_image)."""
+    contents = await file.read()
+    return await decode_image(contents)
+
+
+async def decode_image(contents: bytes):
+    """
+    Decodes (and downscales, see imaging.py) an upload off the event loop.
+    PDFs and multi-frame TIFFs become a list of pages that are only rendered
+    during extraction (see documents.py).
+    """
+    with stage("decode"):
+        return await run_in_threadpool(documents.decode_upload, contents)
+
+
+async def normalize_upload(upload) -> dict:
+    """`TableExtractor.process_image`, or `process_document` for the pages of a PDF / TIFF."""
+    method = "process_document" if isinstance(upload, list) else "process_image"
+    return await run_cached(method, upload, confidence_threshold=0.5)
+
+
+async def run_cached(method: str, image, **kwargs) -> dict:
+    """
+    Runs `TableExtractor.<method>` on the inference pool, serving the result
+    from the result cache when the same image was processed before.
+    """
+    if result_cache is None:
+        return await inference_pool.run(method, image, **kwargs)
+
+    key = await run_in_threadpool(result_cache.key, image, method, **kwargs)
+    cached = await run_in_threadpool(result_cache.get, key)
+    if cached is not None:
+        return cached
+
+    result = await inference_pool.run(method, image, **kwargs)
+    await run_in_threadpool(result_cache.put, key, result)
+    return result
+
+
+def check_report_input(file: UploadFile, text_input: str):
+    if not file and not text_input:
+        raise HTTPException(status_code=400, detail="You must provide either an image file or a text_input.")
+    
+    if file and text_input:
+        raise HTTPException(status_code=400, detail="Please provide either an image file or a text_input, not both.")
+
+
+async def load_structured_data(file: UploadFile, text_input: str) -> dict:
+    """Extracts and normalizes the report from the uploaded image or the plain text."""
+    # --- Image Path ---
+    if file:
+        logger.debug("Processing image input...")
+        image = await read_image(file)
+        return await normalize_upload(image)
+
+    # --- Text Path ---
+    logger.debug("Processing text input...")
+    structured_data = await parse_text_report(text_input)
+    if not structured_data:
+        raise ValueError("Could not parse the report text.")
+    return structured_data
+
+
+def busy_response(e: InferenceUnavailable | JobQueueFull) -> JSONResponse:
+    return JSONResponse(status_code=503, content={"error": str(e)},
+                        headers={"Retry-After": str(e.retry_after)})
+
+
+async def job_stats() -> dict:
+    stats = {"lanes": await run_in_threadpool(job_store.stats)}
+    if job_workers:
+        stats.update(job_workers.stats())
+    return stats
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, whether or not the models are loaded."""
+    return {
+        "status": "ok",
+        "inference": inference_pool.stats(),
+        "cache": result_cache.stats() if result_cache else None,
+        "explanation_cache": explanation_cache.stats() if explanation_cache else None,
+        "jobs": await job_stats() if job_store else None,
+        "threads": tuning.thread_settings(),
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latency histograms, OCR cell counts and request latency."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the models are loaded and warmed up, image requests can be served."""
+    stats = inference_pool.stats()
+    if not inference_pool.ready():
+        return JSONResponse(status_code=503, content={"status": stats["state"], "error": inference_pool.error})
+    return {"status": "ready"}
+
+
+# Admin endpoints (/cache/invalidate) require "Authorization: Bearer <ADMIN_TOKEN>"
+# and are disabled when ADMIN_TOKEN is not set.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set).")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token.",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.post("/cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_cache():
+    if result_cache:
+        await run_in_threadpool(result_cache.invalidate)
+    if explanation_cache:
+        await run_in_threadpool(explanation_cache.clear)
+    return {"status": "ok"}
 
 @app.post("/extract-table/")
 async def extract_table_from_image(file: UploadFile = File(...)):       # EXTRACT TABLE FROM IMAGE
 
     try:
-        image = Image.open(file.file).convert("RGB")
+        image = await read_image(file)
         
-        extracted_data = extractor.extract_table(image)
+        if isinstance(image, list):
+            extracted_data = {"pages": await run_cached("extract_pages", image)}
+        else:
+            extracted_data = await run_cached("extract_table", image)
 
         return JSONResponse(content=extracted_data)
 
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except InferenceUnavailable as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
@@ -26,10 +265,14 @@ async def extract_table_from_image(file: UploadFile = File(...)):       # EXTRAC
 async def get_nomalized_report(file: UploadFile = File(...)):       # GET NORMALIZED REPORT FROM IMAGE
     try:
 
-        image = Image.open(file.file).convert("RGB")
-        normalized_report = extractor.process_image(image,confidence_threshold=0.5)
+        image = await read_image(file)
+        normalized_report = await normalize_upload(image)
         return JSONResponse(content=normalized_report)
 
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except InferenceUnavailable as e:
+        return busy_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
     
@@ -38,39 +281,19 @@ async def analyze_report_endpoint(
     file: UploadFile = File(None, description="An image file of the lab report."),
     text_input: str = Form(None, description="The plain text content of a lab report.")
 ):
-    if not file and not text_input:
-        raise HTTPException(status_code=400, detail="You must provide either an image file or a text_input.")
-    
-    if file and text_input:
-        raise HTTPException(status_code=400, detail="Please provide either an image file or a text_input, not both.")
+    check_report_input(file, text_input)
 
     try:
-        structured_data = {}
-        
-        # --- Image Path ---
-        if file:
-            print("Processing image input...")
-            image = Image.open(file.file).convert("RGB")
-            structured_data = extractor.process_image(image, confidence_threshold=0.5)
-            
-
-        # --- Text Path ---
-        elif text_input:
-            print("Processing text input...")
-            structured_data = parse_text_to_structured_json(text_input)
-
-
-        abnormal_results = {
-            key: row for key, row in structured_data['data'].items()
-            if isinstance(row, dict) and row.get("status") != "Normal"
-        } 
-        if not abnormal_results:
-            return {"summary": "All results are within the normal range."}
-        
-        final_summary = get_llm_summary(abnormal_results)
+        structured_data = await load_structured_data(file, text_input)
+
+        final_summary = with_parser_stats(await analyze_structured(structured_data), structured_data)
         
         return JSONResponse(content=final_summary)
 
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except InferenceUnavailable as e:
+        return busy_response(e)
     except Exception as e:
         # This will now catch any errors from the entire pipeline
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -81,41 +304,201 @@ async def summarizer(
     file: UploadFile = File(None, description="An image file of the lab report."),
     text_input: str = Form(None, description="The plain text content of a lab report.")
 ):
-    if not file and not text_input:
-        raise HTTPException(status_code=400, detail="You must provide either an image file or a text_input.")
-    
-    if file and text_input:
-        raise HTTPException(status_code=400, detail="Please provide either an image file or a text_input, not both.")
+    check_report_input(file, text_input)
 
     try:
-        structured_data = {}
-        
-        # --- Image Path ---
-        if file:
-            print("Processing image input...")
-            image = Image.open(file.file).convert("RGB")
-            structured_data = extractor.process_image(image, confidence_threshold=0.5)
-            
-
-        # --- Text Path ---
-        elif text_input:
-            print("Processing text input...")
-            structured_data = parse_text_to_structured_json(text_input)
-            print(structured_data)
-
-
-        abnormal_results = {
-            key: row for key, row in structured_data['data'].items()
-            if isinstance(row, dict) and row.get("status") != "Normal"
-        } 
-        
-        if not abnormal_results:
-            return {"summary": "All results are within the normal range."}
-        
-        analyzed_report = get_llm_summary(abnormal_results)
-        final_summary = summarize(analyzed_report, structured_data)
+        structured_data = await load_structured_data(file, text_input)
+
+        final_summary = with_parser_stats(await summarize_structured(structured_data), structured_data)
         return JSONResponse(content=final_summary)
 
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except InferenceUnavailable as e:
+        return busy_response(e)
     except Exception as e:
         # This will now catch any errors from the entire pipeline
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+# --- Streaming (Server-Sent Events) ---
+async def report_events(structured_data: dict, emit, summarize_report: bool, stream_tokens: bool):
+    """
+    Emits the stages of /analyze-report/ and /summarize/ as they complete:
+    "normalized" (the extracted report), "explanations" (after validation)
+    and, when summarizing, "summary". With `stream_tokens` the summary's
+    tokens are emitted as "token" events while it is generated; the
+    explanations are only sent once they passed the validation guardrail.
+    """
+    await emit("normalized", structured_data)
+    # Rejected images ("Picture not clear enough...") stop here.
+    if "data" not in structured_data:
+        return
+
+    abnormal_results = abnormal_findings(structured_data)
+    if not abnormal_results:
+        await emit("summary", with_parser_stats({"summary": "All results are within the normal range."}, structured_data))
+        return
+
+    analyzed_report = await get_llm_summary(abnormal_results)
+    await emit("explanations", with_parser_stats(analyzed_report, structured_data))
+    if not summarize_report:
+        return
+
+    on_token = None
+    if stream_tokens:
+        on_token = lambda text: emit("token", {"stage": "summary", "text": text})
+    final_summary = await summarize(analyzed_report, structured_data, on_token=on_token)
+    await emit("summary", with_parser_stats(final_summary, structured_data))
+
+
+async def stream_report(file: UploadFile, text_input: str, summarize_report: bool, stream_tokens: bool):
+    check_report_input(file, text_input)
+
+    # Extraction runs before the stream starts, so its failures keep their status codes.
+    try:
+        structured_data = await load_structured_data(file, text_input)
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except InferenceUnavailable as e:
+        return busy_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    return StreamingResponse(
+        stream_events(lambda emit: report_events(structured_data, emit, summarize_report, stream_tokens)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/analyze-report/stream")
+async def analyze_report_stream(
+    file: UploadFile = File(None, description="An image file of the lab report."),
+    text_input: str = Form(None, description="The plain text content of a lab report."),
+):
+    """Like /analyze-report/, streamed as Server-Sent Events (see report_events)."""
+    return await stream_report(file, text_input, summarize_report=False, stream_tokens=False)
+
+
+@app.post("/summarize/stream")
+async def summarize_stream(
+    file: UploadFile = File(None, description="An image file of the lab report."),
+    text_input: str = Form(None, description="The plain text content of a lab report."),
+    stream_tokens: bool = Form(False, description="Also stream the summary's tokens as they are generated."),
+):
+    """Like /summarize/, streamed as Server-Sent Events (see report_events)."""
+    return await stream_report(file, text_input, summarize_report=True, stream_tokens=stream_tokens)
+
+
+# --- Bulk processing ---
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_ADMISSION_RETRIES = int(os.getenv("BATCH_ADMISSION_RETRIES", "30"))
+
+
+async def process_batch_item(item: BatchItem, mode: str) -> dict:
+    if item.kind == "image":
+        image = await decode_image(await run_in_threadpool(item.load))
+        # Batch items wait for a free inference slot instead of failing with a 503.
+        for attempt in range(BATCH_ADMISSION_RETRIES + 1):
+            try:
+                structured_data = await normalize_upload(image)
+                break
+            except InferenceUnavailable as e:
+                if attempt == BATCH_ADMISSION_RETRIES:
+                    raise
+                await asyncio.sleep(e.retry_after)
+    else:
+        structured_data = await parse_text_report(item.load())
+        if not structured_data:
+            raise ValueError("Could not parse the report text.")
+    return await finish_report(structured_data, mode)
+
+
+@app.post("/batch/")
+async def batch_endpoint(
+    files: list[UploadFile] = File(None, description="Report images and/or zip/tar archives of report images."),
+    reports: UploadFile = File(None, description="A JSONL file of text reports, one JSON object per line."),
+    mode: str = Form("summarize", description="normalize, analyze or summarize."),
+):
+    """
+    Processes many reports in one request and streams one NDJSON line per
+    report as soon as it is done (in completion order, with its "index").
+    At most BATCH_CONCURRENCY reports are in flight; a failing report yields
+    an error line without failing the rest.
+    """
+    if not files and not reports:
+        raise HTTPException(status_code=400, detail="You must provide image files, archives or a JSONL file of reports.")
+    if mode not in BATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {BATCH_MODES}.")
+
+    files = await spool_uploads(files or [])
+    reports = (await spool_uploads([reports]) or [None])[0]
+
+    async def stream():
+        try:
+            items = iter_batch_items(files, reports)
+            async for line in stream_batch(items, lambda item: process_batch_item(item, mode), concurrency=BATCH_CONCURRENCY):
+                yield line
+        finally:
+            close_uploads(files + ([reports] if reports else []))
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# --- Job queue ---
+@app.post("/jobs/", status_code=202)
+async def submit_job(
+    file: UploadFile = File(None, description="An image file of the lab report."),
+    text_input: str = Form(None, description="The plain text content of a lab report."),
+    mode: str = Form("summarize", description="normalize, analyze or summarize."),
+    lane: str = Form("interactive", description="interactive (served first) or backfill."),
+    webhook_url: str = Form(None, description="Optional URL the finished job is POSTed to (hosts in JOB_WEBHOOK_HOSTS)."),
+):
+    """
+    Queues a report and returns its job id right away; poll GET /jobs/{job_id}
+    (or pass a webhook_url) for the result. Refused with a 503 and Retry-After
+    when the lane's queue is full.
+    """
+    if job_store is None:
+        raise HTTPException(status_code=503, detail="The job queue is not enabled (JOB_QUEUE=1).")
+    check_report_input(file, text_input)
+    if mode not in REPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {REPORT_MODES}.")
+    if lane not in LANES:
+        raise HTTPException(status_code=400, detail=f"lane must be one of {tuple(LANES)}.")
+    if webhook_url:
+        try:
+            await run_in_threadpool(check_webhook_url, webhook_url)
+        except WebhookRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if file:
+            kind, payload = "image", await file.read()
+            # Unreadable and oversized uploads are refused now rather than failing in the worker.
+            await run_in_threadpool(documents.probe_upload, payload)
+        else:
+            kind, payload = "text", text_input.encode("utf-8")
+        job_id = await run_in_threadpool(job_store.submit, kind, mode, payload, lane, webhook_url)
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e)})
+    except JobQueueFull as e:
+        return busy_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    return JSONResponse(status_code=202, content={
+        "job_id": job_id, "status": "queued", "lane": lane, "status_url": f"/jobs/{job_id}",
+    })
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a queued job: queued (with its position), running, done (with the result) or failed (with the error)."""
+    if job_store is None:
+        raise HTTPException(status_code=503, detail="The job queue is not enabled (JOB_QUEUE=1).")
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job
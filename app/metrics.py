@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Before importing prometheus_client, which reads PROMETHEUS_MULTIPROC_DIR at import.
+load_dotenv()
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import REGISTRY, multiprocess
+
+# LOG_LEVEL=WARNING (or OFF) silences the per-request messages on the hot path.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Adds a Server-Timing header with the per-stage breakdown to every response.
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "0") == "1"
+# With several server or inference processes, point PROMETHEUS_MULTIPROC_DIR at
+# an empty directory so /metrics aggregates the samples of all of them.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Stages go from tens of milliseconds (normalization) to tens of seconds (LLM calls).
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+STAGE_SECONDS = Histogram(
+    "report_stage_seconds", "Time spent in each pipeline stage.", ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter("report_stage_errors_total", "Pipeline stages that raised.", ["stage"])
+OCR_CELLS = Counter("report_ocr_cells_total", "Table cells sent to OCR.", ["strategy"])
+OCR_CELLS_PER_TABLE = Histogram(
+    "report_ocr_cells_per_table", "Cells per OCR'd table.", buckets=(8, 16, 32, 64, 128, 256, 512, 1024)
+)
+OCR_CELLS_SKIPPED = Counter("report_ocr_cells_skipped_total", "Table cells not OCR'd, by reason.", ["reason"])
+TEXT_LINES = Counter("report_text_lines_total", "Plain-text report lines by the parser that handled them.", ["parser"])
+GUARDRAIL_REJECTIONS = Counter("llm_guardrail_rejections_total", "Explanations rejected, by validator.", ["validator"])
+SPECULATIVE_SUMMARIES = Counter("llm_speculative_summaries_total", "Speculative summary calls, by outcome.", ["outcome"])
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM call, by call.", ["call"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192)
+)
+JOBS_FINISHED = Counter("report_jobs_finished_total", "Queued jobs finished, by lane and status.", ["lane", "status"])
+REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency.", ["path", "status"], buckets=STAGE_BUCKETS
+)
+
+
+def configure_logging():
+    if LOG_LEVEL == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+class StageTimings:
+    """Per-request stage durations, in the order they were recorded, and LLM prompt tokens by call."""
+    def __init__(self):
+        self.stages = []  # (stage, seconds)
+        self.prompt_tokens = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages.append((stage, seconds))
+
+    def extend(self, stages: list):
+        self.stages.extend(stages)
+
+    def server_timing(self) -> str:
+        """Formats the stages as a Server-Timing header; repeated stages are summed."""
+        totals = {}
+        for stage, seconds in self.stages:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+    def prompt_tokens_header(self) -> str:
+        """Formats the prompt tokens as `generation=412, validation=96, total=508`."""
+        tokens = {**self.prompt_tokens, "total": sum(self.prompt_tokens.values())}
+        return ", ".join(f"{call}={count}" for call, count in tokens.items())
+
+
+_current_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+def start_timings() -> StageTimings:
+    timings = StageTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_timings():
+    return _current_timings.get()
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Times the enclosed block as pipeline stage `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_ocr_cells(strategy: str, cells: int):
+    OCR_CELLS.labels(strategy).inc(cells)
+    OCR_CELLS_PER_TABLE.observe(cells)
+
+
+def record_ocr_skipped(blank: int, column: int):
+    OCR_CELLS_SKIPPED.labels("blank").inc(blank)
+    OCR_CELLS_SKIPPED.labels("column").inc(column)
+
+
+def record_prompt_tokens(call: str, tokens: int):
+    PROMPT_TOKENS.labels(call).observe(tokens)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.prompt_tokens[call] = timings.prompt_tokens.get(call, 0) + tokens
+
+
+def record_text_lines(fast_path: int, llm: int):
+    TEXT_LINES.labels("fast_path").inc(fast_path)
+    TEXT_LINES.labels("llm").inc(llm)
+
+
+def record_guardrail_rejection(validator: str):
+    GUARDRAIL_REJECTIONS.labels(validator).inc()
+
+
+def record_speculative_summary(outcome: str):
+    SPECULATIVE_SUMMARIES.labels(outcome).inc()
+
+
+def call_with_timings(function, *args, **kwargs) -> tuple:
+    """
+    Runs `function` with a fresh StageTimings and returns (result, stages).
+    Executor threads and processes don't see the request's context, so the
+    inference pool uses this to carry their stage timings back to it.
+    """
+    context = contextvars.copy_context()
+
+    def run():
+        timings = start_timings()
+        return function(*args, **kwargs), timings.stages
+
+    return context.run(run)
+
+
+def render() -> tuple:
+    """Returns (body, content type) of the Prometheus exposition."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
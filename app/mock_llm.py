@@ -0,0 +1,141 @@
+import re
+import json
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from text_parser import parse_report_text
+
+# Local stand-in for the chat-completions router, for load tests:
+#   python mock_llm.py --port 9000 --latency-ms 800 --error-rate 0.02
+# and start the API with LLM_API_URL=http://127.0.0.1:9000/v1/chat/completions.
+# Replies are recognized by the system prompt of each llm_service call.
+app = FastAPI()
+
+settings = {
+    "latency_ms": 500.0,     # mean time to the full reply (or to the first token when streaming)
+    "jitter_ms": 100.0,      # uniform +- jitter on the latency
+    "token_ms": 20.0,        # delay between streamed chunks
+    "error_rate": 0.0,       # share of calls answered with an error status
+    "error_codes": [429, 503],
+    "replies": {},           # canned reply content per call kind, overriding the generated ones
+}
+counters = {}
+
+
+def call_kind(system_prompt: str) -> str:
+    if "safety validator" in system_prompt:
+        return "validation"
+    if "data extraction service" in system_prompt:
+        return "parse"
+    if "summarization service" in system_prompt:
+        return "summary"
+    if "explain lab results" in system_prompt:
+        return "generation"
+    return "other"
+
+
+def _findings_in(user_prompt: str) -> list:
+    """(parameter, status) of every `3. Hemoglobin: 10.2 g/dL (ref 13.0 - 17.0) Low` line (see prompts.py)."""
+    return [
+        (match.group(1), match.group(2))
+        for match in re.finditer(r"^\d+\. ([^:\n]*):.*?(\w+)$", user_prompt, re.MULTILINE)
+    ]
+
+
+def reply_content(kind: str, user_prompt: str) -> str:
+    """A well-formed reply of the kind llm_service expects, unless a canned one was configured."""
+    if kind in settings["replies"]:
+        reply = settings["replies"][kind]
+        return reply if isinstance(reply, str) else json.dumps(reply)
+    if kind == "validation":
+        return "TRUE"
+    if kind == "generation":
+        return json.dumps({"explanations": [
+            f"Your {parameter or 'result'} is {status.lower()} compared to the usual range for this test."
+            for parameter, status in _findings_in(user_prompt)
+        ]})
+    if kind == "parse":
+        rows, unparsed = parse_report_text(user_prompt.split("\n", 1)[-1])
+        data = {str(i): row for i, (_, row) in enumerate(rows)}
+        for _, line in unparsed:
+            data[str(len(data))] = {"parameter": line[:40], "results": "", "range": "", "status": "Undetermined"}
+        return json.dumps({"data": data})
+    if kind == "summary":
+        return json.dumps({"summary": "A few results are outside their usual ranges; the rest are normal."})
+    return "{}"
+
+
+async def _sleep_latency():
+    latency = settings["latency_ms"] + random.uniform(-settings["jitter_ms"], settings["jitter_ms"])
+    await asyncio.sleep(max(latency, 0.0) / 1000)
+
+
+def _completion(content: str) -> dict:
+    return {
+        "object": "chat.completion",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+async def _stream(content: str):
+    # Chunks of a few words, like a token stream.
+    words = content.split(" ")
+    for i in range(0, len(words), 3):
+        text = " ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "")
+        chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": text}}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(settings["token_ms"] / 1000)
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    messages = payload.get("messages", [])
+    system_prompt = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    user_prompt = next((m["content"] for m in messages if m.get("role") == "user"), "")
+    kind = call_kind(system_prompt)
+    counters[kind] = counters.get(kind, 0) + 1
+
+    await _sleep_latency()
+    if random.random() < settings["error_rate"]:
+        status = random.choice(settings["error_codes"])
+        counters[f"error_{status}"] = counters.get(f"error_{status}", 0) + 1
+        return JSONResponse(status_code=status, content={"error": "Injected error."})
+
+    content = reply_content(kind, user_prompt)
+    if payload.get("stream"):
+        return StreamingResponse(_stream(content), media_type="text/event-stream")
+    return _completion(content)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "calls": counters, "settings": {k: v for k, v in settings.items() if k != "replies"}}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock chat-completions server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=settings["jitter_ms"])
+    parser.add_argument("--token-ms", type=float, default=settings["token_ms"])
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"])
+    parser.add_argument("--error-codes", type=int, nargs="+", default=settings["error_codes"])
+    parser.add_argument("--replies", help='JSON file of canned replies, e.g. {"validation": "FALSE"}')
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    settings.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, token_ms=args.token_ms,
+                    error_rate=args.error_rate, error_codes=args.error_codes)
+    if args.replies:
+        with open(args.replies) as f:
+            settings["replies"] = json.load(f)
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -2,10 +2,23 @@ import torch
 from transformers import AutoModelForObjectDetection, TableTransformerForObjectDetection
 from PIL import Image
 from torchvision import transforms
-import numpy as np
 import easyocr
-from tqdm.auto import tqdm
 import re
+import logging
+import contextvars
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from batching import MicroBatcher, pad_images, split_outputs
+from backends import load_backend
+from metrics import stage, record_ocr_cells, record_ocr_skipped
+from text_parser import RESULT_REGEX, RANGE_REGEX, compare_to_range
+from imaging import as_array, crop_view, ink_ratio
+from columns import columns_to_ocr
+from grid import TableGrid, IntervalIndex, ROW_LABEL, COLUMN_LABEL
+from confidence import ConfidenceGate
+from tuning import apply_thread_settings
+
+logger = logging.getLogger(__name__)
 
 class MaxResize(object):
     def __init__(self, max_size=800):
@@ -18,23 +31,114 @@ class MaxResize(object):
         resized_image = image.resize((int(round(scale*width)), int(round(scale*height))))
         return resized_image
 
+# Model checkpoints. Anything that caches pipeline output keys on these, so
+# bumping a revision here invalidates previously cached results.
+DETECTION_MODEL = "microsoft/table-transformer-detection"
+DETECTION_REVISION = "no_timm"
+STRUCTURE_MODEL = "microsoft/table-structure-recognition-v1.1-all"
+STRUCTURE_REVISION = "main"
+
+# Longest side the detection transform resizes pages to; document pages are
+# rendered at this size for detection (see _extract_page).
+DETECTION_MAX_SIZE = 800
+
+# "per_cell" (the default) is the original detector+recognizer pass for every
+# cell, with one confidence score per detected text line.
+# "batched" sends the cell boxes straight to EasyOCR's recognizer and skips
+# text detection, since the structure model already gives us the cell boxes.
+# Each cell is read as one line with one score, so multi-line cells and the
+# averaged confidence can differ from "per_cell".
+# "whole_table" runs EasyOCR once over the whole table crop and assigns the
+# recognized words to cells by position.
+OCR_STRATEGIES = ("batched", "whole_table", "per_cell")
+# Strategies that OCR cell by cell, and so can skip cells (see _apply_ocr).
+CELL_OCR_STRATEGIES = ("batched", "per_cell")
+
+
+def _add_ocr_stats(ocr_stats: dict, **counts):
+    """Adds cell counts (cells, ocr_cells, skipped_blank, ...) to an `ocr_stats` dict, if there is one."""
+    if ocr_stats is None:
+        return
+    for name, count in counts.items():
+        ocr_stats[name] = ocr_stats.get(name, 0) + count
+
+
+def _box_iou(a, b) -> float:
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
 class TableExtractor:
-    def __init__(self, device="cuda" if torch.cuda.is_available() else "cpu"):
+    def __init__(self, device="cuda" if torch.cuda.is_available() else "cpu",
+                 ocr_strategy: str = "per_cell", ocr_batch_size: int = 32,
+                 micro_batching: bool = False, max_batch_size: int = 4, max_batch_wait_ms: float = 5.0,
+                 table_score_threshold: float = 0.7, max_tables: int = 8, ocr_workers: int = 4,
+                 backend: str = "eager", grid_nms_threshold: float = 0.5, page_workers: int = 2,
+                 column_pruning: bool = True, blank_ink_ratio: float = 0.002, torch_threads: int = 0):
         """
         Initializes the workshop. This is where we load all the heavy models,
         and it runs only once.
+
+        With `micro_batching` on, concurrent extract_table calls (e.g. from the
+        inference thread pool) share padded detection/structure batches of up
+        to `max_batch_size` images, waiting at most `max_batch_wait_ms`.
+
+        Every detected table scoring at least `table_score_threshold` (up to
+        `max_tables`) is extracted, with up to `ocr_workers` tables OCR'd in parallel.
+
+        `backend` picks how the two table transformers run: "eager" PyTorch or,
+        on CPU, "torch-int8", "onnx" or "onnx-int8" (see backends.py).
+
+        Predicted rows (columns) overlapping a better-scoring one by more than
+        `grid_nms_threshold` IoU are treated as duplicates and dropped before
+        OCR; 0 keeps them all.
+
+        Multi-page documents are extracted `page_workers` pages at a time, which
+        also bounds how many rendered pages are held in memory.
+
+        With `column_pruning`, process_image reads each table's header row first
+        and skips OCR of the columns the normalizer doesn't use (units,
+        methods, flags). Cells with less than `blank_ink_ratio` ink are skipped
+        as blank; 0 OCRs them all.
+
+        `torch_threads` caps the intra-op threads of this process's torch (and
+        OpenCV) pools, which the table models and EasyOCR share; 0 leaves
+        torch's default of one per core. See tuning.py for calibrating it.
         """
-        print("Initializing Table Extractor and loading models...")
+        logger.info("Initializing Table Extractor and loading models...")
         self.device = device if device else ("cuda" if torch.cuda.is_available() else "cpu")
+        if torch_threads:
+            apply_thread_settings(torch_threads)
+        if ocr_strategy not in OCR_STRATEGIES:
+            raise ValueError(f"Unknown OCR strategy '{ocr_strategy}', expected one of {OCR_STRATEGIES}.")
+        self.ocr_strategy = ocr_strategy
+        self.ocr_batch_size = ocr_batch_size
+        self.table_score_threshold = table_score_threshold
+        self.max_tables = max_tables
+        self.ocr_workers = ocr_workers
+        self.grid_nms_threshold = grid_nms_threshold
+        self.page_workers = page_workers
+        self.column_pruning = column_pruning
+        self.blank_ink_ratio = blank_ink_ratio
         
         # Load models and processor
-        self.detection_model = AutoModelForObjectDetection.from_pretrained("microsoft/table-transformer-detection", revision="no_timm")
-        self.structure_model = TableTransformerForObjectDetection.from_pretrained("microsoft/table-structure-recognition-v1.1-all")
+        self.detection_model = AutoModelForObjectDetection.from_pretrained(DETECTION_MODEL, revision=DETECTION_REVISION)
+        self.structure_model = TableTransformerForObjectDetection.from_pretrained(STRUCTURE_MODEL, revision=STRUCTURE_REVISION)
         self.ocr_reader = easyocr.Reader(['en'])
         
         # Move models to the specified device
         self.detection_model.to(self.device)
         self.structure_model.to(self.device)
+
+        # Wrap them in the configured inference backend (exports are cached on disk)
+        self.backend = backend
+        self.detection_backend = load_backend(backend, self.detection_model, DETECTION_MODEL, DETECTION_REVISION, self.device)
+        self.structure_backend = load_backend(backend, self.structure_model, STRUCTURE_MODEL, STRUCTURE_REVISION, self.device)
         
         # Prepare transforms
         self.detection_transform = self._get_detection_transform()
@@ -46,12 +150,20 @@ class TableExtractor:
         
         self.structure_id2label = self.structure_model.config.id2label
         self.structure_id2label[len(self.structure_id2label)] = "no object"
-        print("Initialization complete.")
+        self.structure_label_ids = {label: idx for idx, label in self.structure_id2label.items()}
+
+        self.batchers = {}
+        if micro_batching:
+            self.batchers = {
+                name: MicroBatcher(model, self.device, max_batch_size, max_batch_wait_ms, name=name)
+                for name, model in (("detection", self.detection_backend), ("structure", self.structure_backend))
+            }
+        logger.info("Initialization complete.")
 
     # Helper methods are now part of the class
     def _get_detection_transform(self):
         return transforms.Compose([
-            MaxResize(800),
+            MaxResize(DETECTION_MAX_SIZE),
             transforms.ToTensor(),
             transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
         ])
@@ -63,6 +175,32 @@ class TableExtractor:
             transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
         ])
 
+    def _run_model(self, name: str, pixel_values: torch.Tensor):
+        """
+        Runs the "detection" or "structure" model on one (C, H, W) image,
+        through its micro-batcher when micro-batching is enabled.
+        """
+        if name in self.batchers:
+            return self.batchers[name].submit(pixel_values)
+        backend = self.detection_backend if name == "detection" else self.structure_backend
+        return backend(pixel_values.unsqueeze(0))
+
+    def _run_model_batch(self, name: str, images: list) -> list:
+        """
+        Runs the "detection" or "structure" model on several (C, H, W) images
+        as one padded batch and returns batch-size-1 outputs per image.
+        """
+        if name in self.batchers:
+            return self.batchers[name].submit_many(images)
+        if len(images) == 1:
+            return [self._run_model(name, images[0])]
+        backend = self.detection_backend if name == "detection" else self.structure_backend
+        pixel_values, pixel_mask = pad_images(images)
+        return split_outputs(backend(pixel_values, pixel_mask=pixel_mask))
+
+    def batching_stats(self) -> dict:
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
+
     def _box_cxcywh_to_xyxy(self, x):
         x_c, y_c, w, h = x.unbind(-1)
         b = [(x_c - 0.5 * w), (y_c - 0.5 * h), (x_c + 0.5 * w), (y_c + 0.5 * h)]
@@ -74,52 +212,145 @@ class TableExtractor:
         b = b * torch.tensor([img_w, img_h, img_w, img_h], dtype=torch.float32)
         return b
 
+    def _outputs_to_arrays(self, outputs, img_size, id2label_map) -> tuple:
+        """
+        Label ids, scores and xyxy boxes (NumPy arrays) of every query that isn't
+        predicted as "no object".
+        """
+        probabilities = outputs.logits[0].detach().cpu().softmax(-1)
+        scores, labels = probabilities.max(-1)
+        no_object = next(idx for idx, label in id2label_map.items() if label == 'no object')
+        keep = labels != no_object
+        boxes = self._rescale_bboxes(outputs.pred_boxes[0].detach().cpu()[keep], img_size)
+        return labels[keep].numpy(), scores[keep].numpy(), boxes.numpy()
+
     def _outputs_to_objects(self, outputs, img_size, id2label_map):
-        m = outputs.logits.softmax(-1).max(-1)
-        pred_labels = list(m.indices.detach().cpu().numpy())[0]
-        pred_scores = list(m.values.detach().cpu().numpy())[0]
-        pred_bboxes = outputs['pred_boxes'].detach().cpu()[0]
-        pred_bboxes = [elem.tolist() for elem in self._rescale_bboxes(pred_bboxes, img_size)]
-
-        objects = []
-        for label, score, bbox in zip(pred_labels, pred_scores, pred_bboxes):
-            class_label = id2label_map[int(label)]
-            if not class_label == 'no object':
-                objects.append({'label': class_label, 'score': float(score),
-                                'bbox': [float(elem) for elem in bbox]})
-        return objects
+        labels, scores, boxes = self._outputs_to_arrays(outputs, img_size, id2label_map)
+        return [
+            {'label': id2label_map[label], 'score': score, 'bbox': bbox}
+            for label, score, bbox in zip(labels.tolist(), scores.tolist(), boxes.tolist())
+        ]
+
+    def _build_grid(self, labels, scores, boxes) -> TableGrid:
+        """Row x column grid of one table from its structure predictions (see grid.py)."""
+        return TableGrid.from_predictions(
+            labels, scores, boxes,
+            row_label=self.structure_label_ids[ROW_LABEL],
+            column_label=self.structure_label_ids[COLUMN_LABEL],
+            nms_threshold=self.grid_nms_threshold,
+        )
 
     def _get_cell_coordinates_by_row(self, table_data):
-        rows = [entry for entry in table_data if entry['label'] == 'table row']
-        columns = [entry for entry in table_data if entry['label'] == 'table column']
-        rows.sort(key=lambda x: x['bbox'][1])
-        columns.sort(key=lambda x: x['bbox'][0])
-        
-        cell_coordinates = []
-        for row in rows:
-            row_cells = []
-            for column in columns:
-                cell_bbox = [column['bbox'][0], row['bbox'][1], column['bbox'][2], row['bbox'][3]]
-                row_cells.append({'column': column['bbox'], 'cell': cell_bbox})
-            row_cells.sort(key=lambda x: x['column'][0])
-            cell_coordinates.append({'row': row['bbox'], 'cells': row_cells, 'cell_count': len(row_cells)})
-        cell_coordinates.sort(key=lambda x: x['row'][1])
-        return cell_coordinates
-
-    def _apply_ocr(self, cell_coordinates, cropped_table) -> tuple[dict, list]:
+        """The grid of `_outputs_to_objects` dicts in the original list-of-dicts format."""
+        return TableGrid.from_objects(table_data, nms_threshold=self.grid_nms_threshold).to_cell_coordinates()
+
+    def _apply_ocr(self, cell_coordinates, cropped_table, ocr_strategy: str = None, gate=None,
+                   prune_columns: bool = False, ocr_stats: dict = None) -> tuple[dict, list]:
         """
         Applies OCR to each cell and returns the extracted data and a list of
-        all OCR confidence scores.
+        all OCR confidence scores, which are also added to the confidence `gate`
+        if one is given. Only the "batched" strategy can stop early on the gate;
+        it's the only one that yields a bounded number of scores.
+
+        `cell_coordinates` is a TableGrid or the list-of-dicts grid of
+        `_get_cell_coordinates_by_row`.
+
+        The cell strategies ("batched", "per_cell") leave blank cells (see
+        `blank_ink_ratio`) empty without OCR. With `prune_columns` they OCR the
+        header row first and, if it names the result and range columns, skip
+        the columns the normalizer doesn't read (see columns.py); otherwise the
+        whole table is OCR'd. Skipped cells come back as "". The counts are
+        added to the `ocr_stats` dict if one is given.
         """
+        ocr_strategy = ocr_strategy or self.ocr_strategy
+        grid = TableGrid.coerce(cell_coordinates)
+        if ocr_strategy in CELL_OCR_STRATEGIES:
+            data, ocr_confidence_scores = self._apply_ocr_cells(grid, cropped_table, ocr_strategy, gate,
+                                                                prune_columns, ocr_stats)
+        elif ocr_strategy == "whole_table":
+            record_ocr_cells(ocr_strategy, grid.num_cells)
+            _add_ocr_stats(ocr_stats, cells=grid.num_cells, ocr_cells=grid.num_cells)
+            data, ocr_confidence_scores = self._apply_ocr_whole_table(grid, cropped_table)
+        else:
+            raise ValueError(f"Unknown OCR strategy '{ocr_strategy}', expected one of {OCR_STRATEGIES}.")
+        if gate is not None and ocr_strategy != "batched":
+            gate.add(ocr_confidence_scores)
+
+        max_num_columns = max((len(row_data) for row_data in data.values()), default=0)
+        for row, row_data in data.items():
+            data[row] = row_data + [""] * (max_num_columns - len(row_data))
+
+        # This is the crucial line. Ensure it only returns two items.
+        return data, ocr_confidence_scores
+
+    def _apply_ocr_cells(self, grid: TableGrid, cropped_table, ocr_strategy: str, gate,
+                         prune_columns: bool, ocr_stats: dict) -> tuple[dict, list]:
+        """The cell strategies of _apply_ocr, with blank cells and unneeded columns skipped."""
+        table_image = as_array(cropped_table)
+        apply_ocr = self._apply_ocr_batched if ocr_strategy == "batched" else self._apply_ocr_per_cell
+        gate_kwargs = {"gate": gate} if ocr_strategy == "batched" else {}
+
+        # 1. Cheap pixel test: cells with (almost) no ink are never OCR'd
+        ocr_mask = ~self._blank_cells(grid, table_image)
+        blank = grid.num_cells - int(ocr_mask.sum())
+
+        # 2. Read the header row alone and keep only the columns the normalizer needs
+        data, ocr_confidence_scores = {}, []
+        body_rows = range(grid.num_rows)
+        pruned = 0
+        if prune_columns and grid.num_rows > 1:
+            data, ocr_confidence_scores = apply_ocr(grid, table_image, rows=range(1), mask=ocr_mask, **gate_kwargs)
+            keep = columns_to_ocr(data.get(0, []))
+            if keep is not None:
+                column_mask = np.array(keep, dtype=bool)
+                pruned = int((ocr_mask[1:] & ~column_mask).sum())
+                ocr_mask[1:] &= column_mask
+            body_rows = range(1, grid.num_rows)
+
+        # 3. OCR the rest of the table
+        body_data, body_scores = apply_ocr(grid, table_image, rows=body_rows, mask=ocr_mask, **gate_kwargs)
+        data.update(body_data)
+        ocr_confidence_scores.extend(body_scores)
+
+        ocr_cells = int(ocr_mask.sum())
+        record_ocr_cells(ocr_strategy, ocr_cells)
+        record_ocr_skipped(blank=blank, column=pruned)
+        _add_ocr_stats(ocr_stats, cells=grid.num_cells, ocr_cells=ocr_cells, skipped_blank=blank,
+                       skipped_columns=pruned, pruned_tables=int(pruned > 0))
+        return data, ocr_confidence_scores
+
+    def _blank_cells(self, grid: TableGrid, table_image) -> np.ndarray:
+        """(R, C) mask of the cells with less than `blank_ink_ratio` ink (see imaging.ink_ratio)."""
+        blank = np.zeros((grid.num_rows, grid.num_columns), dtype=bool)
+        if self.blank_ink_ratio <= 0:
+            return blank
+        # One channel is contrast enough to tell ink from paper, and is a view rather than a copy.
+        grey = table_image[..., 1] if table_image.ndim == 3 else table_image
+        boxes, valid = grid.pixel_boxes(grey.shape[1], grey.shape[0])
+        for (r, c) in zip(*np.nonzero(valid)):
+            x_min, y_min, x_max, y_max = boxes[r, c]
+            blank[r, c] = ink_ratio(grey[y_min:y_max, x_min:x_max]) < self.blank_ink_ratio
+        return blank
+
+    def _apply_ocr_per_cell(self, grid: TableGrid, cropped_table, rows: range = None,
+                            mask: np.ndarray = None) -> tuple[dict, list]:
+        """
+        Runs the full EasyOCR pipeline (text detection + recognition) on every
+        cell crop separately. Cells are slice views of the table array, not copies.
+        Only `rows` are read (all by default), and cells False in `mask` are left empty.
+        """
+        table_image = as_array(cropped_table)
         data = {}
         ocr_confidence_scores = []
-        max_num_columns = 0
 
-        for idx, row in enumerate(tqdm(cell_coordinates)):
+        for idx in rows if rows is not None else range(grid.num_rows):
             row_text = []
-            for cell in row["cells"]:
-                cell_image = np.array(cropped_table.crop(cell["cell"]))
-                result = self.ocr_reader.readtext(cell_image)
+            for column_idx, cell in enumerate(grid.cells[idx]):
+                if mask is not None and not mask[idx, column_idx]:
+                    row_text.append("")
+                    continue
+                cell_image = crop_view(table_image, cell)
+                result = self.ocr_reader.readtext(cell_image) if cell_image is not None else []
                 
                 if result:
                     text = " ".join([res[1] for res in result])
@@ -128,62 +359,282 @@ class TableExtractor:
                     ocr_confidence_scores.extend(confidence_scores)
                 else:
                     row_text.append("")
-
-            if len(row_text) > max_num_columns:
-                max_num_columns = len(row_text)
             data[idx] = row_text
-        
-        for row, row_data in data.items():
-            data[row] = row_data + [""] * (max_num_columns - len(row_data))
-            
-        # This is the crucial line. Ensure it only returns two items.
+
+        return data, ocr_confidence_scores
+
+    def _apply_ocr_batched(self, grid: TableGrid, cropped_table, gate=None, rows: range = None,
+                           mask: np.ndarray = None) -> tuple[dict, list]:
+        """
+        Recognizes the cell crops of the table with EasyOCR's recognizer only. The
+        cell boxes go straight to the recognizer, so the CRAFT text detector never
+        runs. Rows are sent in chunks of about `ocr_batch_size` cells, and when a
+        confidence `gate` is given OCR stops as soon as it can no longer pass.
+        EasyOCR only recognizes a chunk as one batch on a GPU; on CPU it reads
+        the boxes one at a time, and the chunk size just spaces the gate checks.
+        Only `rows` are read (all by default), and cells False in `mask` are left empty.
+        """
+        table_image = as_array(cropped_table)
+        height, width = table_image.shape[:2]
+        rows = rows if rows is not None else range(grid.num_rows)
+
+        # EasyOCR wants integer [x_min, x_max, y_min, y_max] boxes inside the image.
+        pixel_boxes, valid = grid.pixel_boxes(width, height)
+        if mask is not None:
+            valid &= mask
+        row_boxes = [
+            [(x_min, x_max, y_min, y_max) if ok else None for (x_min, y_min, x_max, y_max), ok in zip(boxes, row_valid)]
+            for boxes, row_valid in zip(pixel_boxes.tolist(), valid.tolist())
+        ]
+
+        data = {}
+        ocr_confidence_scores = []
+        chunk_start = rows.start
+        while chunk_start < rows.stop:
+            # Another table's OCR thread may already have rejected the image.
+            if gate is not None and gate.rejected_stage:
+                break
+            chunk_end, chunk_cells = chunk_start, 0
+            while chunk_end < rows.stop and (chunk_cells == 0 or chunk_cells < self.ocr_batch_size):
+                chunk_cells += sum(1 for box in row_boxes[chunk_end] if box)
+                chunk_end += 1
+
+            unique_boxes = list(dict.fromkeys(box for boxes in row_boxes[chunk_start:chunk_end] for box in boxes if box))
+            recognized = {}
+            if unique_boxes:
+                results = self.ocr_reader.recognize(
+                    table_image,
+                    horizontal_list=[list(box) for box in unique_boxes],
+                    free_list=[],
+                    batch_size=self.ocr_batch_size,
+                )
+                # Results come back sorted by vertical position, so map them back by box.
+                for bbox, text, confidence in results:
+                    (x_min, y_min), _, (x_max, y_max), _ = bbox
+                    recognized[(int(x_min), int(x_max), int(y_min), int(y_max))] = (text, confidence)
+
+            chunk_scores = []
+            for idx in range(chunk_start, chunk_end):
+                row_text = []
+                for box in row_boxes[idx]:
+                    text, confidence = recognized.get(box, ("", None))
+                    if text.strip():
+                        row_text.append(text)
+                        chunk_scores.append(confidence)
+                    else:
+                        row_text.append("")
+                data[idx] = row_text
+            ocr_confidence_scores.extend(chunk_scores)
+
+            if gate is not None:
+                # Each cell was expected to yield at most one score.
+                gate.add(chunk_scores, settled=sum(len(boxes) for boxes in row_boxes[chunk_start:chunk_end]))
+                if not gate.can_pass():
+                    gate.reject("ocr")
+                    break
+            chunk_start = chunk_end
+
         return data, ocr_confidence_scores
 
+    def _apply_ocr_whole_table(self, grid: TableGrid, cropped_table) -> tuple[dict, list]:
+        """
+        Runs EasyOCR once over the whole table crop and assigns every recognized
+        word to the row/column cell that contains its centre. Words that cross a
+        cell border are kept whole instead of being cut in two by the crop.
+        """
+        if not grid.num_rows:
+            return {}, []
+
+        results = self.ocr_reader.readtext(as_array(cropped_table))
+
+        # Every row shares the same columns, so one index per axis is enough.
+        row_index = IntervalIndex(grid.rows[:, [1, 3]].tolist())
+        column_index = IntervalIndex(grid.columns[:, [0, 2]].tolist())
+
+        cell_words = {}
+        ocr_confidence_scores = []
+        for bbox, text, confidence in results:
+            xs = [point[0] for point in bbox]
+            ys = [point[1] for point in bbox]
+            row_idx = row_index.find((min(ys) + max(ys)) / 2)
+            column_idx = column_index.find((min(xs) + max(xs)) / 2)
+            # Words outside the recognized grid would never have been OCR'd per cell.
+            if row_idx is None or column_idx is None:
+                continue
+            cell_words.setdefault((row_idx, column_idx), []).append((min(xs), min(ys), max(ys), text))
+            ocr_confidence_scores.append(confidence)
+
+        data = {}
+        for row_idx in range(grid.num_rows):
+            data[row_idx] = [
+                self._join_words(cell_words.get((row_idx, column_idx), []))
+                for column_idx in range(grid.num_columns)
+            ]
+        return data, ocr_confidence_scores
+
+    def _join_words(self, words) -> str:
+        """
+        Joins (x_min, y_min, y_max, text) words of one cell in reading order:
+        top to bottom by line, then left to right within a line.
+        """
+        lines = []
+        for word in sorted(words, key=lambda w: (w[1] + w[2]) / 2):
+            centre_y = (word[1] + word[2]) / 2
+            if lines and centre_y <= lines[-1][0]:
+                lines[-1][1].append(word)
+            else:
+                lines.append([word[2], [word]])
+        return " ".join(w[3] for _, line in lines for w in sorted(line, key=lambda w: w[0]))
+
+    def _select_tables(self, tables: list) -> list:
+        """
+        Picks the detected tables to extract: every table scoring at least
+        `table_score_threshold` (the best one is always kept), skipping
+        duplicates that mostly overlap a better one, ordered top to bottom.
+        """
+        selected = []
+        for table in sorted(tables, key=lambda t: t['score'], reverse=True):
+            if selected and (table['score'] < self.table_score_threshold or len(selected) >= self.max_tables):
+                break
+            if any(_box_iou(table['bbox'], kept['bbox']) > 0.5 for kept in selected):
+                continue
+            selected.append(table)
+        selected.sort(key=lambda t: (t['bbox'][1], t['bbox'][0]))
+        return selected
+
+    def _ocr_tables(self, table_grids: list, cropped_tables: list, ocr_strategy: str, gate,
+                    prune_columns: bool = False) -> tuple[list, dict]:
+        """
+        OCRs every table and returns each table's rows plus the cell counts of
+        _apply_ocr summed over the tables, running the tables in parallel
+        threads when there is more than one.
+        """
+        jobs = list(zip(table_grids, cropped_tables))
+        table_stats = [{} for _ in jobs]
+
+        def ocr(job):
+            (coordinates, table), ocr_stats = job
+            return self._apply_ocr(coordinates, table, ocr_strategy, gate, prune_columns, ocr_stats)[0]
+
+        if len(jobs) == 1 or self.ocr_workers <= 1:
+            table_data = [ocr(job) for job in zip(jobs, table_stats)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.ocr_workers, len(jobs)), thread_name_prefix="table-ocr") as pool:
+                table_data = list(pool.map(ocr, zip(jobs, table_stats)))
+
+        ocr_stats = {}
+        for stats in table_stats:
+            _add_ocr_stats(ocr_stats, **stats)
+        return table_data, ocr_stats
+
     # This is the main method you will call from your API
-    def extract_table(self, image: Image.Image) -> dict:
+    def extract_table(self, image: Image.Image, ocr_strategy: str = None, confidence_threshold: float = None,
+                      prune_columns: bool = False) -> dict:
         """
         This method now extracts raw data, calculates the overall confidence,
         and returns them together in a single dictionary.
+
+        Rows of every extracted table are merged into "data" in table order;
+        "row_tables" maps each row key to the index of its table in "tables".
+
+        `ocr_strategy` overrides the extractor's default for this call ("per_cell",
+        "batched" or "whole_table"), which is handy for comparisons.
+
+        With a `confidence_threshold`, the pipeline stops as soon as the overall
+        confidence provably can't reach it and the output carries an "error"
+        plus the "rejected_stage" ("detection", "structure" or "ocr").
+
+        `prune_columns` skips OCR of the columns clean_and_normalize_report
+        doesn't read (see _apply_ocr); "ocr" counts the cells OCR'd and skipped.
         """
-        all_confidence_scores = []
+        gate = ConfidenceGate(confidence_threshold if confidence_threshold is not None else 0.0)
 
         # 1. Detect tables
-        pixel_values = self.detection_transform(image).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            outputs = self.detection_model(pixel_values)
-        
-        tables = self._outputs_to_objects(outputs, image.size, self.id2label)
+        tables = self._detect_tables(image, gate)
         if not tables:
-            return {"data": {}, "confidence": 0.0, "error": "No tables detected."}
-        all_confidence_scores.extend([obj['score'] for obj in tables])
-
-        # 2. Crop table and recognize structure
-        table_bbox = tables[0]['bbox']
-        cropped_table = image.crop(table_bbox)
-        pixel_values = self.structure_transform(cropped_table).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            outputs = self.structure_model(pixel_values)
-        cells = self._outputs_to_objects(outputs, cropped_table.size, self.structure_id2label)
-        all_confidence_scores.extend([obj['score'] for obj in cells])
+            return {"data": {}, "confidence": 0.0, "error": "No tables detected.", "rejected_stage": "detection"}
+        return self._extract_tables(image, tables, gate, ocr_strategy, confidence_threshold, prune_columns)
+
+    def _detect_tables(self, image: Image.Image, gate) -> list:
+        """Runs table detection and returns the selected tables (see _select_tables), scoring them in `gate`."""
+        with stage("detection"):
+            pixel_values = self.detection_transform(image)
+            outputs = self._run_model("detection", pixel_values)
+            tables = self._outputs_to_objects(outputs, image.size, self.id2label)
+        if not tables:
+            return []
+        gate.add([obj['score'] for obj in tables])
+        return self._select_tables(tables)
+
+    def _extract_tables(self, image: Image.Image, tables: list, gate, ocr_strategy: str = None,
+                        confidence_threshold: float = None, prune_columns: bool = False) -> dict:
+        """Steps 2-6 of extract_table: structure, grid and OCR of the detected `tables` of `image`."""
+        ocr_strategy = ocr_strategy or self.ocr_strategy
+
+        # 2. Crop the tables and recognize their structure as one batch
+        with stage("structure"):
+            cropped_tables = [image.crop(table['bbox']) for table in tables]
+            outputs = self._run_model_batch("structure", [self.structure_transform(table) for table in cropped_tables])
+            table_predictions = [
+                self._outputs_to_arrays(table_outputs, cropped_table.size, self.structure_id2label)
+                for table_outputs, cropped_table in zip(outputs, cropped_tables)
+            ]
+        for _, scores, _ in table_predictions:
+            gate.add(scores.tolist())
+        with stage("grid"):
+            table_grids = [self._build_grid(*prediction) for prediction in table_predictions]
 
         # 3. Apply OCR and get scores
-        cell_coordinates = self._get_cell_coordinates_by_row(cells)
-        data, ocr_scores = self._apply_ocr(cell_coordinates, cropped_table)
-        all_confidence_scores.extend(ocr_scores)
-        
+        if ocr_strategy == "batched":
+            # Batched OCR adds at most one score per cell, so we can already tell
+            # whether even perfect OCR would lift the average over the threshold.
+            gate.expect(sum(grid.num_cells for grid in table_grids))
+            if not gate.can_pass():
+                return self._rejected_output(gate, "structure")
+
+        with stage("ocr"):
+            # One contiguous array per table; OCR reads the cells as views into it.
+            table_images = [as_array(table) for table in cropped_tables]
+            table_data, ocr_stats = self._ocr_tables(table_grids, table_images, ocr_strategy, gate, prune_columns)
+        if gate.rejected_stage:
+            return self._rejected_output(gate, gate.rejected_stage)
+
         # 4. Calculate Overall Confidence
-        overall_confidence = (sum(all_confidence_scores) / len(all_confidence_scores)) if all_confidence_scores else 0.0
+        overall_confidence = gate.average()
         
         # --- THIS IS THE CHANGE ---
         # 5. Structure the final output as a single dictionary
+        data, row_tables = {}, {}
+        for table_idx, rows in enumerate(table_data):
+            for row in rows.values():
+                key = str(len(data))
+                data[key] = row
+                row_tables[key] = table_idx
+
         final_output = {
-            "data": {str(k): v for k, v in data.items()}, # The extracted table data
-            "confidence": round(overall_confidence, 4)   # The calculated score
+            "data": data,                                 # The extracted table data
+            "confidence": round(overall_confidence, 4),   # The calculated score
+            "row_tables": row_tables,
+            "tables": [
+                {"bbox": table['bbox'], "score": round(table['score'], 4), "rows": len(rows)}
+                for table, rows in zip(tables, table_data)
+            ],
+            "ocr": ocr_stats,
         }
+        if confidence_threshold is not None and not gate.can_pass():
+            final_output["rejected_stage"] = "ocr"
         
         # 6. Return the single dictionary
         return final_output
 
+    def _rejected_output(self, gate, stage: str) -> dict:
+        return {
+            "data": {},
+            "confidence": round(gate.average(), 4),
+            "error": "Confidence too low to continue.",
+            "rejected_stage": stage,
+        }
+
     def clean_and_normalize_report(self, raw_data: dict) -> dict:
         """
         Cleans, filters, and normalizes a lab report from a JSON object.
@@ -193,9 +644,13 @@ class TableExtractor:
         All other rows are eliminated.
         """
             # --- Step 1: Define the Rules (Regex) ---
-        result_regex = re.compile(r'^(\d+\.?\d*)\s*.*$')
+        # Shared with the plain-text fast path (see text_parser.py)
+        result_regex = RESULT_REGEX
         # A string that CONTAINS a number-hyphen-number pattern
-        range_regex = re.compile(r'\d+\.?\d*(\s*-\s*|\s+)\d+\.?\d*')
+        range_regex = RANGE_REGEX
+
+        # Which table each row came from (reports can hold several tables)
+        row_tables = raw_data.get('row_tables', {})
 
         # --- Step 2: Filter for Valid Rows Only ---
         valid_rows = []
@@ -211,11 +666,11 @@ class TableExtractor:
             # The first item is assumed to be the parameter.
             # If all three components are found, keep the row.
             if has_result and has_range:
-                valid_rows.append(row_list)
+                valid_rows.append((row_tables.get(key, 0), row_list))
 
         # --- Step 3: Process the Filtered Rows ---
         final_report = {}
-        for i, row in enumerate(valid_rows):
+        for i, (table_idx, row) in enumerate(valid_rows):
             parameter = row[0].strip()
             result_str = ""
             range_str = ""
@@ -238,13 +693,7 @@ class TableExtractor:
                 if len(range_numbers) == 2:
                     lower_bound = float(range_numbers[0])
                     upper_bound = float(range_numbers[1])
-                    
-                    if lower_bound <= result_val <= upper_bound:
-                        status = "Normal"
-                    elif result_val > upper_bound:
-                        status = "High"
-                    else:
-                        status = "Low"
+                    status = compare_to_range(result_val, lower_bound, upper_bound)
             except (ValueError, IndexError, AttributeError):
                 status = "Undetermined"
                 
@@ -252,7 +701,8 @@ class TableExtractor:
                 "parameter": parameter,
                 "results": result_str,
                 "range": range_str,
-                "status": status
+                "status": status,
+                "table": table_idx
             }
         return final_report
     
@@ -261,27 +711,124 @@ class TableExtractor:
         """
         This is the new main entry point. It orchestrates the entire pipeline.
         """
-        # Step 1: Extract the raw data and the confidence score.
-        raw_data = self.extract_table(image)
+        # Step 1: Extract the raw data and the confidence score. The threshold
+        # is checked after every stage, so blurry uploads are rejected early.
+        raw_data = self.extract_table(image, confidence_threshold=confidence_threshold,
+                                      prune_columns=self.column_pruning)
         confidence = raw_data.get("confidence", 0.0)
-        if float(confidence) < float(confidence_threshold):
+        if float(confidence) < float(confidence_threshold) or raw_data.get("rejected_stage"):
             return {
                 "error": "Picture not clear enough to extract details.",
-                "confidence": round(confidence, 4)
+                "confidence": round(confidence, 4),
+                "rejected_stage": raw_data.get("rejected_stage", "ocr")
             }
 
         # Step 3: If confidence is high enough, clean and normalize the data.
-        normalized_data = self.clean_and_normalize_report(raw_data)
+        with stage("normalize"):
+            normalized_data = self.clean_and_normalize_report(raw_data)
         
         # Step 4: Return the final, structured output.
         final_output = {
             "data": normalized_data,
-            "normalization confidence": round(confidence, 4)
+            "normalization confidence": round(confidence, 4),
+            "ocr": raw_data.get("ocr", {}),
         }
         
         return final_output
 
 
+    def _extract_page(self, page, ocr_strategy: str = None, confidence_threshold: float = None,
+                      prune_columns: bool = False) -> dict:
+        """
+        extract_table for one document page (see documents.py). The page is
+        rendered at detection size first; it is only rendered again at full
+        resolution for structure recognition and OCR if it holds a table.
+        """
+        gate = ConfidenceGate(confidence_threshold if confidence_threshold is not None else 0.0)
+        with stage("render"):
+            preview = page.render(DETECTION_MAX_SIZE)
+        tables = self._detect_tables(preview, gate)
+        if not tables:
+            return {"data": {}, "confidence": 0.0, "error": "No tables detected.", "rejected_stage": "detection"}
+
+        with stage("render"):
+            image = page.render()
+        scale_x, scale_y = image.width / preview.width, image.height / preview.height
+        tables = [
+            {**table, 'bbox': [table['bbox'][0] * scale_x, table['bbox'][1] * scale_y,
+                               table['bbox'][2] * scale_x, table['bbox'][3] * scale_y]}
+            for table in tables
+        ]
+        return self._extract_tables(image, tables, gate, ocr_strategy, confidence_threshold, prune_columns)
+
+    def extract_pages(self, pages: list, ocr_strategy: str = None, confidence_threshold: float = None,
+                      prune_columns: bool = False) -> list:
+        """
+        Runs extract_table on every page of a document, `page_workers` pages
+        in parallel threads (with micro-batching on, their detection and
+        structure passes share model batches). Only the pages in flight are
+        rendered, so memory stays bounded however long the document is.
+        Returns one output per page, in page order, each with its "page" number.
+        """
+        def extract(page):
+            return {"page": page.number, **self._extract_page(page, ocr_strategy, confidence_threshold, prune_columns)}
+
+        if len(pages) == 1 or self.page_workers <= 1:
+            return [extract(page) for page in pages]
+        with ThreadPoolExecutor(max_workers=min(self.page_workers, len(pages)), thread_name_prefix="page") as pool:
+            # Each page runs in a copy of the caller's context, so its stages land in the request's timings.
+            futures = [pool.submit(contextvars.copy_context().run, extract, page) for page in pages]
+            return [future.result() for future in futures]
+
+    def process_document(self, pages: list, confidence_threshold: float = 0.5) -> dict:
+        """
+        process_image for multi-page PDFs and TIFFs: the normalized rows of all
+        pages are merged into one report, each row carrying its "page".
+        Pages without a readable table (cover letters, notes, blurry scans)
+        are listed under "pages" with their error instead of failing the report.
+        """
+        page_outputs = self.extract_pages(pages, confidence_threshold=confidence_threshold,
+                                          prune_columns=self.column_pruning)
+
+        data, pages_info, ocr_stats = {}, [], {}
+        confidence_total, confidence_weight = 0.0, 0
+        for raw_data in page_outputs:
+            _add_ocr_stats(ocr_stats, **raw_data.get("ocr", {}))
+            confidence = raw_data.get("confidence", 0.0)
+            if float(confidence) < float(confidence_threshold) or raw_data.get("rejected_stage"):
+                pages_info.append({
+                    "page": raw_data["page"],
+                    "rows": 0,
+                    "confidence": round(confidence, 4),
+                    "error": raw_data.get("error", "Picture not clear enough to extract details."),
+                    "rejected_stage": raw_data.get("rejected_stage", "ocr"),
+                })
+                continue
+
+            with stage("normalize"):
+                normalized_data = self.clean_and_normalize_report(raw_data)
+            for row in normalized_data.values():
+                data[str(len(data))] = {**row, "page": raw_data["page"]}
+            pages_info.append({"page": raw_data["page"], "rows": len(normalized_data), "confidence": round(confidence, 4)})
+            # Pages are weighted by their extracted rows, like cells weigh into a single page's confidence.
+            weight = max(len(raw_data["data"]), 1)
+            confidence_total += confidence * weight
+            confidence_weight += weight
+
+        if not confidence_weight:
+            return {
+                "error": "Picture not clear enough to extract details.",
+                "confidence": max((page["confidence"] for page in pages_info), default=0.0),
+                "rejected_stage": "detection" if all(p["rejected_stage"] == "detection" for p in pages_info) else "ocr",
+                "pages": pages_info,
+            }
+        return {
+            "data": data,
+            "normalization confidence": round(confidence_total / confidence_weight, 4),
+            "pages": pages_info,
+            "ocr": ocr_stats,
+        }
+
 
 # # This block allows you to test the code directly
 # if __name__ == '__main__':
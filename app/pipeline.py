@@ -0,0 +1,44 @@
+from llm_service import get_llm_summary, summarize_findings
+
+# What the batch and job APIs return per report.
+REPORT_MODES = ("normalize", "analyze", "summarize")
+
+
+def abnormal_findings(structured_data: dict) -> dict:
+    return {
+        key: row for key, row in structured_data['data'].items()
+        if isinstance(row, dict) and row.get("status") != "Normal"
+    }
+
+
+async def analyze_structured(structured_data: dict) -> dict:
+    """Explains the abnormal findings of a normalized report."""
+    abnormal_results = abnormal_findings(structured_data)
+    if not abnormal_results:
+        return {"summary": "All results are within the normal range."}
+    return await get_llm_summary(abnormal_results)
+
+
+async def summarize_structured(structured_data: dict) -> dict:
+    """Explains the abnormal findings and adds a high-level summary."""
+    abnormal_results = abnormal_findings(structured_data)
+    if not abnormal_results:
+        return {"summary": "All results are within the normal range."}
+    return await summarize_findings(abnormal_results, structured_data)
+
+
+def with_parser_stats(response: dict, structured_data: dict) -> dict:
+    """Passes the text fast-path hit rate (see llm_service.parse_text_report) on to the client."""
+    if isinstance(structured_data, dict) and "parser" in structured_data:
+        return {**response, "parser": structured_data["parser"]}
+    return response
+
+
+async def finish_report(structured_data: dict, mode: str) -> dict:
+    """Runs the LLM stages of `mode` (one of REPORT_MODES) on a normalized report."""
+    # Rejected images ("Picture not clear enough...") are returned as they are.
+    if mode == "normalize" or "data" not in structured_data:
+        return structured_data
+    if mode == "analyze":
+        return with_parser_stats(await analyze_structured(structured_data), structured_data)
+    return with_parser_stats(await summarize_structured(structured_data), structured_data)
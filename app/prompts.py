@@ -0,0 +1,109 @@
+import os
+import re
+import math
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Findings and explanations are sent to the LLM one per line instead of as
+# indented JSON, and every user prompt's data block is kept under
+# PROMPT_TOKEN_BUDGET (estimated) tokens. Larger abnormal sets are split into
+# chunks of at most EXPLANATION_CHUNK_SIZE findings, generated concurrently.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1024"))
+EXPLANATION_CHUNK_SIZE = int(os.getenv("EXPLANATION_CHUNK_SIZE", "8"))
+# Longer field values (OCR noise, merged cells) are cut to this many characters.
+MAX_FIELD_CHARS = 80
+
+_TOKEN_REGEX = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of `text` for a BPE tokenizer: one token per
+    punctuation mark and per started 4 characters of every word.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_REGEX.findall(text))
+
+
+def prompt_tokens(payload: dict, response: dict = None) -> int:
+    """Prompt tokens of a chat-completions call: the upstream's count when it reports usage, else the estimate."""
+    usage = (response or {}).get("usage") or {}
+    if isinstance(usage.get("prompt_tokens"), int):
+        return usage["prompt_tokens"]
+    return sum(estimate_tokens(str(message.get("content", ""))) + 4 for message in payload.get("messages", []))
+
+
+def _field(value) -> str:
+    return " ".join(str(value).split())[:MAX_FIELD_CHARS]
+
+
+def encode_finding(number: int, row: dict) -> str:
+    """One finding as `3. Hemoglobin: 10.2 g/dL (ref 13.0 - 17.0) Low`, leaving out fields it doesn't have."""
+    if not isinstance(row, dict):
+        return f"{number}. {_field(row)}"
+    line = f"{number}. {_field(row.get('parameter', ''))}: {_field(row.get('results', ''))}"
+    if row.get("range"):
+        line += f" (ref {_field(row['range'])})"
+    if row.get("status"):
+        line += f" {_field(row['status'])}"
+    return line
+
+
+def encode_findings(results: dict) -> str:
+    return "\n".join(encode_finding(i, row) for i, row in enumerate(results.values(), start=1))
+
+
+def encode_explanations(explanation: dict, budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """
+    The explanations of get_llm_summary one per line, or its error, cut to
+    `budget` tokens; cut lines are replaced by a "(N more)" note.
+    """
+    if "error" in explanation:
+        return f"Error: {_field(explanation['error'])}"
+    explanations = explanation.get("explanations")
+    if not isinstance(explanations, list):
+        return " ".join(str(explanation).split())
+    lines, used = [], 0
+    for i, text in enumerate(explanations, start=1):
+        line = f"{i}. {' '.join(str(text).split())}"
+        tokens = estimate_tokens(line)
+        if lines and used + tokens > budget:
+            lines.append(f"({len(explanations) - len(lines)} more)")
+            break
+        lines.append(line)
+        used += tokens
+    return "\n".join(lines)
+
+
+def chunk_findings(results: dict, budget: int = PROMPT_TOKEN_BUDGET, max_findings: int = EXPLANATION_CHUNK_SIZE) -> list:
+    """
+    Splits findings into consecutive chunks (dicts, in report order) of at
+    most `max_findings` findings whose encoded lines fit in `budget` tokens.
+    A finding is never split, so a chunk always holds at least one.
+    """
+    chunks, chunk, used = [], {}, 0
+    for key, row in results.items():
+        tokens = estimate_tokens(encode_finding(len(chunk) + 1, row))
+        if chunk and (len(chunk) >= max_findings > 0 or used + tokens > budget):
+            chunks.append(chunk)
+            chunk, used = {}, 0
+        chunk[key] = row
+        used += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def chunk_explanations(explanations: list, budget: int = PROMPT_TOKEN_BUDGET) -> list:
+    """Splits an explanations list into consecutive lists whose lines fit in `budget` tokens."""
+    chunks, chunk, used = [], [], 0
+    for text in explanations:
+        tokens = estimate_tokens(f"{len(chunk) + 1}. {text}")
+        if chunk and used + tokens > budget:
+            chunks.append(chunk)
+            chunk, used = [], 0
+        chunk.append(text)
+        used += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
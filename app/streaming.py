@@ -0,0 +1,40 @@
+import json
+import asyncio
+
+
+def sse_event(event: str, data) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_events(run):
+    """
+    Runs `await run(emit)` and yields every `await emit(event, data)` it makes
+    as a Server-Sent Event as soon as it is emitted. An exception becomes an
+    "error" event, and the stream always ends with a "done" event. If the
+    client disconnects, the remaining work is cancelled.
+    """
+    events = asyncio.Queue()
+    finished = object()
+
+    async def emit(event: str, data):
+        await events.put((event, data))
+
+    async def runner():
+        try:
+            await run(emit)
+        except Exception as e:
+            await events.put(("error", {"error": str(e)}))
+        finally:
+            await events.put(finished)
+
+    task = asyncio.create_task(runner())
+    try:
+        while True:
+            item = await events.get()
+            if item is finished:
+                break
+            yield sse_event(*item)
+        yield sse_event("done", {})
+    finally:
+        task.cancel()
@@ -0,0 +1,152 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from text_parser import compare_to_range
+
+# Lab parameters with their unit and reference range. Units never start with
+# a digit, so a unit cell can't be mistaken for a result cell.
+PARAMETERS = [
+    ("Hemoglobin", "g/dL", 13.0, 17.0), ("Total WBC Count", "thou/uL", 4.0, 11.0),
+    ("Platelet Count", "thou/uL", 150, 450), ("RBC Count", "mill/uL", 4.5, 5.9),
+    ("Hematocrit", "%", 40.0, 50.0), ("MCV", "fL", 80.0, 100.0), ("MCH", "pg", 27.0, 33.0),
+    ("MCHC", "g/dL", 32.0, 36.0), ("Neutrophils", "%", 40, 75), ("Lymphocytes", "%", 20, 45),
+    ("Monocytes", "%", 2, 10), ("Eosinophils", "%", 1, 6), ("Glucose Fasting", "mg/dL", 70, 100),
+    ("Urea", "mg/dL", 15, 40), ("Creatinine", "mg/dL", 0.7, 1.3), ("Sodium", "mmol/L", 135, 145),
+    ("Potassium", "mmol/L", 3.5, 5.1), ("Chloride", "mmol/L", 98, 107), ("Total Cholesterol", "mg/dL", 125, 200),
+    ("Triglycerides", "mg/dL", 50, 150), ("HDL Cholesterol", "mg/dL", 40, 60), ("LDL Cholesterol", "mg/dL", 50, 100),
+    ("SGOT", "U/L", 5, 40), ("SGPT", "U/L", 7, 56), ("Total Bilirubin", "mg/dL", 0.3, 1.2),
+    ("Albumin", "g/dL", 3.5, 5.0), ("TSH", "uIU/mL", 0.4, 4.0), ("Vitamin D", "ng/mL", 30, 100),
+    ("Vitamin B12", "pg/mL", 200, 900), ("Calcium", "mg/dL", 8.5, 10.5), ("Uric Acid", "mg/dL", 3.5, 7.2),
+    ("HbA1c", "%", 4.0, 5.6),
+]
+
+# Columns by table width; relative widths in COLUMN_WEIGHTS.
+LAYOUTS = {
+    3: ("Test", "Result", "Reference Range"),
+    4: ("Test", "Result", "Unit", "Reference Range"),
+    5: ("Test", "Result", "Unit", "Reference Range", "Flag"),
+    6: ("Test", "Method", "Result", "Unit", "Reference Range", "Flag"),
+}
+COLUMN_WEIGHTS = {"Test": 0.32, "Method": 0.14, "Result": 0.14, "Unit": 0.13, "Reference Range": 0.22, "Flag": 0.08}
+METHODS = ("Photometry", "Impedance", "ISE", "CLIA", "HPLC", "Enzymatic")
+
+
+def _format(value: float, decimals: int) -> str:
+    return f"{value:.{decimals}f}"
+
+
+def _decimals(number) -> int:
+    return 0 if isinstance(number, int) else max(1, len(str(number).split(".")[1]))
+
+
+class SyntheticReport:
+    """
+    A generated lab-report image with its ground truth: `raw` is what a
+    perfect extract_table would return (header row included) and `expected`
+    what clean_and_normalize_report should make of it.
+    """
+    def __init__(self, image: Image.Image, raw: dict, expected: dict, params: dict):
+        self.image = image
+        self.raw = raw
+        self.expected = expected
+        self.params = params
+
+
+def generate_report(rows: int = 12, columns: int = 4, width: int = 1600, noise: float = 0.0,
+                    blur: float = 0.0, seed: int = 0) -> SyntheticReport:
+    """
+    Draws a lab report with one ruled results table of `rows` findings and
+    `columns` columns (3 to 6, see LAYOUTS) on a `width` pixels wide page,
+    then adds Gaussian pixel `noise` (standard deviation in grey levels) and
+    a Gaussian `blur` radius. The same arguments always give the same image.
+    """
+    if columns not in LAYOUTS:
+        raise ValueError(f"columns must be one of {tuple(LAYOUTS)}.")
+    rng = np.random.default_rng(seed)
+    header = LAYOUTS[columns]
+
+    # 1. Pick the findings and their results (60% normal, 20% high, 20% low)
+    order = rng.permutation(len(PARAMETERS))
+    table, expected = [list(header)], {}
+    for i in range(rows):
+        name, unit, low, high = PARAMETERS[order[i % len(PARAMETERS)]]
+        decimals = max(_decimals(low), _decimals(high))
+        outcome = rng.choice(["normal", "high", "low"], p=[0.6, 0.2, 0.2])
+        span = high - low
+        if outcome == "normal":
+            value = rng.uniform(low, high)
+        elif outcome == "high":
+            value = rng.uniform(high + 0.05 * span, high + 0.6 * span)
+        else:
+            value = rng.uniform(max(low - 0.6 * span, 0.0), low - 0.05 * span)
+        result = _format(value, decimals)
+        range_str = f"{_format(low, decimals)} - {_format(high, decimals)}"
+        status = compare_to_range(float(result), float(low), float(high))
+
+        cells = {
+            "Test": name,
+            "Method": METHODS[rng.integers(len(METHODS))],
+            "Result": result if "Unit" in header else f"{result} {unit}",
+            "Unit": unit,
+            "Reference Range": range_str,
+            "Flag": {"High": "H", "Low": "L"}.get(status, ""),
+        }
+        table.append([cells[column] for column in header])
+        expected[str(i)] = {"parameter": name, "results": cells["Result"], "range": range_str,
+                            "status": status, "table": 0}
+
+    # 2. Draw the page: a letterhead, patient details and the ruled table
+    font_size = max(10, width // 60)
+    font = ImageFont.load_default(size=font_size)
+    title_font = ImageFont.load_default(size=int(font_size * 1.5))
+    margin, row_height = width // 16, int(font_size * 2.2)
+    table_top = margin + 5 * font_size
+    height = table_top + row_height * (rows + 1) + margin
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((margin, margin), "City Diagnostics Laboratory", font=title_font, fill=0)
+    draw.text((margin, margin + 2.2 * font_size), f"Patient ID: {1000 + seed}    Sample: Blood    Age: 45 Y",
+              font=font, fill=40)
+
+    table_width = width - 2 * margin
+    weights = np.array([COLUMN_WEIGHTS[column] for column in header])
+    edges = margin + np.concatenate([[0], np.cumsum(weights / weights.sum() * table_width)]).round().astype(int)
+    bottom = table_top + row_height * len(table)
+    for r, row in enumerate(table):
+        y = table_top + r * row_height
+        draw.line([(margin, y), (width - margin, y)], fill=0, width=2 if r <= 1 else 1)
+        for c, text in enumerate(row):
+            draw.text((edges[c] + font_size // 2, y + (row_height - font_size) // 2), text, font=font, fill=0)
+    draw.line([(margin, bottom), (width - margin, bottom)], fill=0, width=2)
+    for x in edges:
+        draw.line([(x, table_top), (x, bottom)], fill=0, width=1)
+
+    # 3. Scanner artefacts
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    if noise:
+        pixels = np.asarray(image, dtype=np.float32) + rng.normal(0.0, noise, (height, width))
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    raw = {"data": {str(r): row for r, row in enumerate(table)}, "confidence": 1.0}
+    params = {"rows": rows, "columns": columns, "width": width, "noise": noise, "blur": blur, "seed": seed}
+    return SyntheticReport(image.convert("RGB"), raw, expected, params)
+
+
+def score_report(expected: dict, normalized: dict) -> dict:
+    """
+    Compares a normalized report ("data" of process_image) with the ground
+    truth: the share of expected findings found with the right result, and
+    the share of those whose status matches.
+    """
+    found = {row.get("parameter", "").strip().lower(): row for row in normalized.values()}
+    matched = status_ok = 0
+    for row in expected.values():
+        candidate = found.get(row["parameter"].lower())
+        if candidate and candidate.get("results", "").split()[:1] == row["results"].split()[:1]:
+            matched += 1
+            status_ok += candidate.get("status") == row["status"]
+    total = len(expected)
+    return {
+        "row_recall": round(matched / total, 4) if total else 1.0,
+        "status_accuracy": round(status_ok / matched, 4) if matched else 0.0,
+    }
@@ -0,0 +1,124 @@
+import re
+
+# The cell rules TableExtractor.clean_and_normalize_report uses on OCR'd tables:
+# a result cell starts with a number, a range cell contains number-hyphen-number.
+RESULT_REGEX = re.compile(r'^(\d+\.?\d*)\s*.*$')
+RANGE_REGEX = re.compile(r'\d+\.?\d*(\s*-\s*|\s+)\d+\.?\d*')
+
+# Plain-text reports put a whole finding on one line, e.g.
+#   pH: 7.38 (7.350 - 7.450)
+#   ck + : 6.0 mrol/l (3.5 - 5.5)
+#   Hemoglobin 10.2 g/dL 13.0-17.0
+#   LDL Cholesterol | 160 | mg/dL | < 100
+#   WBC = 7,500 /cumm (Ref: 4,000 to 11,000)
+#   Potassium 3.2 L 3.5-5.1
+#   Creatinine: 1.2 mg/dL (0.7 - 1.3) Normal
+_NUMBER = r'(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?'
+_RANGE_WORDS = r'(?:biological|ref|reference|normal|range|up|upto|below|less|above|more|greater)\b'
+# H/L/N flags and status words next to a result or range; skipped, never a unit.
+_FLAG = r'(?:[hln]|normal|high|low|abnormal)(?![^\s()\[\]<>≤≥|,;:])'
+_UNIT_TOKEN = rf'(?:x?10\^\d+[^\s()\[\]<>≤≥|,;]*|(?!{_RANGE_WORDS}|{_FLAG})[A-Za-zµμ%/][^\s()\[\]<>≤≥|,;:]*)'
+_UNIT = rf'(?:{_UNIT_TOKEN}(?:\s+{_UNIT_TOKEN})?)'
+LINE_REGEX = re.compile(rf'''
+    ^(?P<parameter>[A-Za-z][^:=|\t]*?)                    # name, may contain digits (Vitamin B12)
+    \s*(?:[:=|\t]|\s(?=\d))\s*                            # separator
+    (?P<result>{_NUMBER})
+    \s*[|\t]?\s*(?P<unit>{_UNIT})?
+    (?:\s*[|\t]?\s*{_FLAG})?
+    \s*[|\t]?\s*[(\[]?\s*
+    (?:(?:biological\s+)?(?:ref(?:erence)?\.?|normal|range)(?:\s+(?:range|interval|value))?\s*[:=-]?\s*)?
+    (?:
+        (?P<low>{_NUMBER})\s*(?:-|–|to)\s*(?P<high>{_NUMBER})
+      | (?P<upper_op><=|≤|<|up\s*to|below|less\s+than)\s*(?P<upper>{_NUMBER})
+      | (?P<lower_op>>=|≥|>|above|more\s+than|greater\s+than)\s*(?P<lower>{_NUMBER})
+    )?
+    \s*(?P<range_unit>{_UNIT})?\s*[)\]]?\s*(?P<trailing_unit>{_UNIT})?
+    (?:\s*[|\t]?\s*{_FLAG})?\s*\.?$
+''', re.VERBOSE | re.IGNORECASE)
+
+
+def _to_float(number: str) -> float:
+    return float(number.replace(",", ""))
+
+
+def compare_to_range(value: float, lower_bound: float = None, upper_bound: float = None,
+                     inclusive: bool = True) -> str:
+    """Normal / High / Low of a result against a closed or one-sided reference range."""
+    if upper_bound is not None and (value > upper_bound or (not inclusive and value == upper_bound)):
+        return "High"
+    if lower_bound is not None and (value < lower_bound or (not inclusive and value == lower_bound)):
+        return "Low"
+    return "Normal"
+
+
+def parse_line(line: str):
+    """
+    Parses one "parameter result [unit] [range]" line into a report row, or
+    returns None when the line doesn't fit the known formats confidently.
+    """
+    line = line.strip().lstrip("-*•").strip()
+    match = LINE_REGEX.match(line)
+    if not match:
+        return None
+
+    parameter = match.group("parameter").strip()
+    result = match.group("result")
+    unit = match.group("unit") or match.group("range_unit") or match.group("trailing_unit") or ""
+    value = _to_float(result)
+
+    if match.group("low"):
+        low, high = _to_float(match.group("low")), _to_float(match.group("high"))
+        if low > high:
+            return None
+        range_str = f"{match.group('low')} - {match.group('high')}"
+        status = compare_to_range(value, low, high)
+    elif match.group("upper"):
+        operator = "<=" if match.group("upper_op") in ("<=", "≤") else "<"
+        range_str = f"{operator} {match.group('upper')}"
+        status = compare_to_range(value, upper_bound=_to_float(match.group("upper")), inclusive=operator == "<=")
+    elif match.group("lower"):
+        operator = ">=" if match.group("lower_op") in (">=", "≥") else ">"
+        range_str = f"{operator} {match.group('lower')}"
+        status = compare_to_range(value, lower_bound=_to_float(match.group("lower")), inclusive=operator == ">=")
+    else:
+        # Without a reference range "Age: 45 years" would look like a finding.
+        return None
+
+    return {
+        "parameter": parameter,
+        "results": result,
+        "range": f"{range_str} {unit}".strip(),
+        "status": status,
+    }
+
+
+# Header lines of a report that carry numbers but never a finding.
+METADATA_REGEX = re.compile(
+    r'^\W*(patient|name|age|sex|gender|date|time|id|uhid|mrn|lab\s*no|sample|specimen|collected|received|'
+    r'reported|report|ref(?:erred)?\s*by|doctor|dr\.?|phone|mobile|address|page)\b',
+    re.IGNORECASE,
+)
+
+
+def is_candidate_line(line: str) -> bool:
+    """Lines that could hold a finding: some text, at least one number, not a header field."""
+    return bool(re.search(r'[A-Za-z]', line) and re.search(r'\d', line) and not METADATA_REGEX.match(line))
+
+
+def parse_report_text(plain_text: str) -> tuple:
+    """
+    Runs the fast-path parser over every line of a plain-text report.
+    Returns (rows, unparsed) as lists of (line number, row) and
+    (line number, line); lines without a number (titles, blank lines) and
+    header fields (name, age, dates) are neither.
+    """
+    rows, unparsed = [], []
+    for line_number, line in enumerate(plain_text.splitlines()):
+        if not is_candidate_line(line):
+            continue
+        row = parse_line(line)
+        if row is None:
+            unparsed.append((line_number, line.strip()))
+        else:
+            rows.append((line_number, row))
+    return rows, unparsed
@@ -0,0 +1,280 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Calibrated CPU settings (see `python tuning.py`), applied at startup as the
+# defaults of INFERENCE_MODE, INFERENCE_WORKERS, TORCH_THREADS and
+# OCR_BATCH_SIZE; variables set explicitly in the environment still win.
+TUNING_PROFILE = os.getenv("TUNING_PROFILE", "cache/tuning_profile.json")
+GOALS = ("throughput", "latency")
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (the container's CPU set, not the host's core count)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def load_profile(path: str = TUNING_PROFILE) -> dict:
+    """
+    The profile written by the calibration, or {} when there is none. A
+    profile calibrated for a different number of CPUs is ignored, since its
+    thread counts would over- or under-subscribe this machine.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning("Ignoring the tuning profile %s: %s", path, e)
+        return {}
+    if profile.get("cpus") != available_cpus():
+        logger.warning("Ignoring the tuning profile %s: calibrated for %s CPUs, this machine has %s.",
+                       path, profile.get("cpus"), available_cpus())
+        return {}
+    return {**profile, "path": path}
+
+
+PROFILE = load_profile()
+
+
+def setting(name: str, default: str) -> str:
+    """The environment variable `name`, else its calibrated value from the profile, else `default`."""
+    value = PROFILE.get("settings", {}).get(name)
+    return os.getenv(name, str(value) if value is not None else default)
+
+
+def apply_thread_settings(torch_threads: int):
+    """Caps this process's torch intra-op threads (also used by the EasyOCR models) and OpenCV's pool."""
+    import torch
+    torch.set_num_threads(torch_threads)
+    try:
+        import cv2
+        cv2.setNumThreads(torch_threads)
+    except ImportError:
+        pass
+
+
+def thread_settings() -> dict:
+    """The thread settings of this process, for /healthz."""
+    import torch
+    settings = {
+        "cpus": available_cpus(),
+        "torch_threads": torch.get_num_threads(),
+        "torch_interop_threads": torch.get_num_interop_threads(),
+        "omp_num_threads": os.getenv("OMP_NUM_THREADS"),
+        "profile": {key: PROFILE[key] for key in ("path", "goal", "settings", "measured") if key in PROFILE} or None,
+    }
+    try:
+        import cv2
+        settings["cv2_threads"] = cv2.getNumThreads()
+    except ImportError:
+        pass
+    return settings
+
+
+# --- Calibration ---
+def candidate_grid(cpus: int, workers: list = None, threads: list = None) -> list:
+    """(workers, torch threads) pairs to try: powers of two (and `cpus`) that don't oversubscribe the CPUs."""
+    counts = sorted({n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cpus} | {cpus})
+    pairs = [(w, t) for w in workers or counts for t in threads or counts if w * t <= cpus]
+    return pairs or [(1, 1)]
+
+
+def calibration_images(paths: list = None) -> list:
+    """The given report images, or the sample report plus the benchmark's synthetic small/medium/large reports."""
+    from PIL import Image
+    if paths:
+        return [Image.open(path).convert("RGB") for path in paths]
+    from benchmark import DEFAULT_CASES
+    from synthetic import generate_report
+    images = [generate_report(seed=i, **case).image for i, case in enumerate(DEFAULT_CASES)]
+    here = os.path.dirname(os.path.abspath(__file__))
+    sample = os.path.join(here, "..", "sample_report.png")
+    if os.path.exists(sample):
+        images.insert(0, Image.open(sample).convert("RGB"))
+    return images
+
+
+async def _drive(pool, images: list, requests: int) -> list:
+    """Keeps every pool worker busy with extract_table calls until `requests` are done; returns their latencies."""
+    latencies, sent = [], 0
+
+    async def client():
+        nonlocal sent
+        while sent < requests:
+            image = images[sent % len(images)]
+            sent += 1
+            started = time.perf_counter()
+            await pool.run("extract_table", image)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(pool.workers)))
+    return latencies
+
+
+def measure_config(mode: str, workers: int, torch_threads: int, ocr_batch_size: int, images: list,
+                   requests: int, extractor_kwargs: dict = None) -> dict:
+    """Throughput and latency of `requests` extract_table calls on a fresh InferencePool with these settings."""
+    from inference import InferencePool
+    pool = InferencePool(mode=mode, workers=workers, max_queue=0, extractor_kwargs={
+        **(extractor_kwargs or {}), "torch_threads": torch_threads, "ocr_batch_size": ocr_batch_size,
+    })
+    pool.start_in_background().join()
+    if not pool.ready():
+        raise RuntimeError(f"The inference pool failed to start: {pool.error}")
+    try:
+        async def run():
+            # One warm-up call per worker, so lazy initialisation isn't measured.
+            await _drive(pool, images, workers)
+            started = time.perf_counter()
+            latencies = await _drive(pool, images, requests)
+            return latencies, time.perf_counter() - started
+
+        latencies, wall = asyncio.run(run())
+    finally:
+        pool.shutdown(wait=True)
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "workers": workers,
+        "torch_threads": torch_threads,
+        "ocr_batch_size": ocr_batch_size,
+        "images_per_second": round(len(latencies) / wall, 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+    }
+
+
+def pick_best(results: list, goal: str, target_rps: float = None, target_p95_ms: float = None) -> dict:
+    """
+    The best measured configuration for `goal`: the highest throughput with a
+    p95 within `target_p95_ms`, or the lowest p95 with a throughput of at
+    least `target_rps`. When no configuration meets the target, the best one
+    regardless of it, with "target_met" False.
+    """
+    if goal == "throughput":
+        eligible = [r for r in results if target_p95_ms is None or r["p95_ms"] <= target_p95_ms]
+        key = lambda r: (-r["images_per_second"], r["p95_ms"])
+    else:
+        eligible = [r for r in results if target_rps is None or r["images_per_second"] >= target_rps]
+        key = lambda r: (r["p95_ms"], -r["images_per_second"])
+    return {**min(eligible or results, key=key), "target_met": bool(eligible)}
+
+
+def ocr_batching_effective(extractor_kwargs: dict = None) -> bool:
+    """
+    Whether OCR_BATCH_SIZE batches recognition: only for the "batched" OCR
+    strategy on a GPU. On CPU EasyOCR's recognizer reads one box at a time
+    whatever its batch_size, and the setting only sets how many cells the
+    batched strategy OCRs between confidence-gate checks.
+    """
+    import torch
+    extractor_kwargs = extractor_kwargs or {}
+    device = extractor_kwargs.get("device") or ("cuda" if torch.cuda.is_available() else "cpu")
+    return extractor_kwargs.get("ocr_strategy", "per_cell") == "batched" and device != "cpu"
+
+
+def calibrate(images: list, goal: str = "throughput", mode: str = "process", workers: list = None,
+              threads: list = None, batch_sizes: list = (16, 32, 64), requests: int = 24, full_grid: bool = False,
+              target_rps: float = None, target_p95_ms: float = None, extractor_kwargs: dict = None) -> dict:
+    """
+    Measures the (workers x torch threads x OCR batch size) grid on this
+    machine and returns the profile of the best configuration for `goal`.
+    Unless `full_grid`, the thread splits are measured with the middle batch
+    size and the other batch sizes only on the best split, which keeps the
+    run to a fraction of the full grid. Where the batch size doesn't batch
+    anything (see ocr_batching_effective) only the middle one is measured.
+    """
+    cpus = available_cpus()
+    results = []
+    batch_sizes = sorted(batch_sizes)
+    if len(batch_sizes) > 1 and not ocr_batching_effective(extractor_kwargs):
+        batch_sizes = [batch_sizes[len(batch_sizes) // 2]]
+        print(f"OCR batch sizes are not measured: EasyOCR only batches recognition with the batched OCR strategy "
+              f"on a GPU (on CPU it reads one box at a time). Using OCR_BATCH_SIZE={batch_sizes[0]}.", file=sys.stderr)
+
+    def measure(w, t, b):
+        result = measure_config(mode, w, t, b, images, requests, extractor_kwargs)
+        results.append(result)
+        print(f"workers={w:<3} threads={t:<3} ocr_batch={b:<4} {result['images_per_second']:>8} img/s"
+              f"  p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms", file=sys.stderr)
+
+    pairs = candidate_grid(cpus, workers, threads)
+    if full_grid:
+        for w, t in pairs:
+            for b in batch_sizes:
+                measure(w, t, b)
+    else:
+        first_batch = batch_sizes[len(batch_sizes) // 2]
+        for w, t in pairs:
+            measure(w, t, first_batch)
+        best = pick_best(results, goal, target_rps, target_p95_ms)
+        for b in batch_sizes:
+            if b != first_batch:
+                measure(best["workers"], best["torch_threads"], b)
+
+    best = pick_best(results, goal, target_rps, target_p95_ms)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpus": cpus,
+        "goal": goal,
+        "targets": {"rps": target_rps, "p95_ms": target_p95_ms},
+        "target_met": best["target_met"],
+        "settings": {
+            "INFERENCE_MODE": mode,
+            "INFERENCE_WORKERS": best["workers"],
+            "TORCH_THREADS": best["torch_threads"],
+            "OCR_BATCH_SIZE": best["ocr_batch_size"],
+        },
+        "measured": {key: best[key] for key in ("images_per_second", "p50_ms", "p95_ms")},
+        "results": results,
+    }
+
+
+if __name__ == '__main__':
+    # Usage (from the app/ directory), once per machine type:
+    #   python tuning.py --goal throughput                  # writes cache/tuning_profile.json
+    #   python tuning.py --goal latency --target-rps 2      # lowest p95 that still sustains 2 img/s
+    from inference import INFERENCE_MODE, extractor_kwargs_from_env
+
+    parser = argparse.ArgumentParser(description="Calibrates inference workers, torch threads and OCR batch size.")
+    parser.add_argument("--goal", choices=GOALS, default="throughput")
+    parser.add_argument("--target-rps", type=float, help="with --goal latency: minimum images per second")
+    parser.add_argument("--target-p95-ms", type=float, help="with --goal throughput: maximum p95 latency")
+    parser.add_argument("--mode", choices=("thread", "process"), default=INFERENCE_MODE)
+    parser.add_argument("--workers", type=int, nargs="+", help="inference worker counts (default: powers of two)")
+    parser.add_argument("--threads", type=int, nargs="+", help="torch thread counts (default: powers of two)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, 64],
+                        help="OCR batch sizes, only measured with OCR_STRATEGY=batched on a GPU")
+    parser.add_argument("--requests", type=int, default=24, help="extract_table calls measured per configuration")
+    parser.add_argument("--images", nargs="+", help="report images to use instead of the sample and synthetic ones")
+    parser.add_argument("--full-grid", action="store_true", help="try every batch size with every thread split")
+    parser.add_argument("--output", default=TUNING_PROFILE)
+    args = parser.parse_args()
+
+    extractor_kwargs = extractor_kwargs_from_env()
+    profile = calibrate(
+        calibration_images(args.images), goal=args.goal, mode=args.mode, workers=args.workers,
+        threads=args.threads, batch_sizes=args.batch_sizes, requests=args.requests, full_grid=args.full_grid,
+        target_rps=args.target_rps, target_p95_ms=args.target_p95_ms, extractor_kwargs=extractor_kwargs,
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+
+    print(json.dumps({key: profile[key] for key in ("goal", "target_met", "settings", "measured")}, indent=2))
+    if not profile["target_met"]:
+        print("No configuration met the target; the profile holds the best one regardless.", file=sys.stderr)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The app modules import each other as top-level modules (run from app/).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+# llm_service refuses to import without a token, and would load the explanation cache from disk.
+os.environ.setdefault("HF_TOKEN", "test-token")
+os.environ.setdefault("EXPLANATION_CACHE", "0")
@@ -0,0 +1,65 @@
+import io
+import json
+import asyncio
+import hashlib
+import tarfile
+
+from batch import SpooledUpload, iter_batch_items, stream_batch
+
+
+def _tar_gz(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _run(upload, concurrency: int) -> list:
+    async def process_item(item):
+        data = await asyncio.to_thread(item.load)
+        await asyncio.sleep(0)
+        return hashlib.sha256(data).hexdigest()
+
+    async def collect():
+        items = iter_batch_items([upload])
+        return [json.loads(line) async for line in stream_batch(items, process_item, concurrency=concurrency)]
+
+    return asyncio.run(collect())
+
+
+def test_tar_gz_members_are_read_intact_concurrently():
+    members = {f"reports/{i:02d}.png": bytes([i]) * (20000 + 997 * i) for i in range(40)}
+    upload = SpooledUpload("reports.tar.gz", io.BytesIO(_tar_gz(members)))
+
+    lines = _run(upload, concurrency=4)
+
+    assert len(lines) == len(members)
+    assert all(line["status"] == "ok" for line in lines)
+    by_id = {line["id"]: line["result"] for line in lines}
+    assert by_id == {f"reports.tar.gz:{name}": hashlib.sha256(data).hexdigest() for name, data in members.items()}
+
+
+def test_truncated_tar_gz_yields_an_error_line():
+    members = {f"{i}.png": bytes(range(256)) * 400 for i in range(10)}
+    data = _tar_gz(members)
+    upload = SpooledUpload("reports.tar.gz", io.BytesIO(data[: len(data) // 2]))
+
+    lines = _run(upload, concurrency=4)
+
+    errors = [line for line in lines if line["index"] is None]
+    assert len(errors) == 1
+    assert errors[0]["status"] == "error"
+    assert errors[0]["error"].startswith("Could not read batch input:")
+    assert all(line["status"] == "ok" for line in lines if line["index"] is not None)
+
+
+def test_unreadable_archive_yields_an_error_line():
+    upload = SpooledUpload("reports.tgz", io.BytesIO(b"not an archive at all"))
+
+    lines = _run(upload, concurrency=2)
+
+    assert [line["status"] for line in lines] == ["error"]
+    assert lines[0]["index"] is None
@@ -0,0 +1,146 @@
+import os
+
+import pytest
+
+import cache
+from cache import ExplanationCache, ResultCache
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def _disk_files(result_cache: ResultCache) -> list:
+    return sorted(name for _, _, files in os.walk(result_cache.disk_dir) for name in files)
+
+
+def _set_mtime(result_cache: ResultCache, key: str, when: float):
+    os.utime(result_cache._disk_path(key), (when, when))
+
+
+def test_memory_tier_is_an_lru(clock):
+    result_cache = ResultCache("models", max_entries=2)
+    result_cache.put("a", {"v": 1})
+    result_cache.put("b", {"v": 2})
+    assert result_cache.get("a") == {"v": 1}
+    result_cache.put("c", {"v": 3})
+
+    assert result_cache.get("b") is None
+    assert result_cache.get("a") == {"v": 1}
+    assert result_cache.get("c") == {"v": 3}
+    assert result_cache.stats()["evictions"] == 1
+
+
+def test_memory_entries_expire(clock):
+    result_cache = ResultCache("models", ttl=60)
+    result_cache.put("a", {"v": 1})
+    clock.now += 59
+    assert result_cache.get("a") == {"v": 1}
+    clock.now += 61
+    assert result_cache.get("a") is None
+    assert result_cache.stats()["expired"] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path, clock):
+    ResultCache("models", cache_dir=str(tmp_path)).put("ab12", {"v": 1})
+    restarted = ResultCache("models", cache_dir=str(tmp_path))
+
+    assert restarted.get("ab12") == {"v": 1}
+    assert restarted.stats()["disk_hits"] == 1
+    assert ResultCache("other models", cache_dir=str(tmp_path)).get("ab12") is None
+
+
+def test_expired_disk_entries_are_deleted(tmp_path, clock):
+    result_cache = ResultCache("models", cache_dir=str(tmp_path), ttl=60, max_entries=1)
+    result_cache.put("aa01", {"v": 1})
+    result_cache.put("bb02", {"v": 2})  # pushes aa01 out of memory
+    _set_mtime(result_cache, "aa01", clock.now - 61)
+
+    assert result_cache.get("aa01") is None
+    assert _disk_files(result_cache) == ["bb02.json"]
+
+    _set_mtime(result_cache, "bb02", clock.now - 61)
+    result_cache.prune_disk()
+    assert _disk_files(result_cache) == []
+
+
+def test_disk_tier_evicts_the_least_recently_used_beyond_max_entries(tmp_path, clock):
+    result_cache = ResultCache("models", cache_dir=str(tmp_path), max_entries=1, disk_max_entries=3)
+    for i, key in enumerate(("aa01", "bb02", "cc03")):
+        result_cache.put(key, {"v": i})
+        _set_mtime(result_cache, key, clock.now - 100 + i)
+    # A hit makes aa01 the most recently used file.
+    ResultCache("models", cache_dir=str(tmp_path)).get("aa01")
+
+    result_cache.put("dd04", {"v": 3})
+
+    assert _disk_files(result_cache) == ["aa01.json", "cc03.json", "dd04.json"]
+    assert result_cache.stats()["disk_evictions"] == 1
+    assert result_cache.stats()["disk_entries"] == 3
+
+
+def test_disk_tier_is_bounded_in_bytes(tmp_path, clock):
+    result_cache = ResultCache("models", cache_dir=str(tmp_path), disk_max_bytes=2500)
+    for i, key in enumerate(("aa01", "bb02", "cc03", "dd04")):
+        result_cache.put(key, {"blob": "x" * 1000})
+        _set_mtime(result_cache, key, clock.now - 100 + i)
+    result_cache.prune_disk()
+
+    assert _disk_files(result_cache) == ["cc03.json", "dd04.json"]
+    assert result_cache.stats()["disk_bytes"] <= 2500
+
+
+def test_invalidate_clears_both_tiers(tmp_path, clock):
+    result_cache = ResultCache("models", cache_dir=str(tmp_path))
+    result_cache.put("aa01", {"v": 1})
+    result_cache.invalidate()
+
+    assert result_cache.get("aa01") is None
+    assert _disk_files(result_cache) == []
+
+
+def test_explanation_cache_is_an_lru(clock):
+    explanations = ExplanationCache(max_entries=2)
+    explanations.put("hemoglobin|low", "a")
+    explanations.put("glucose|high", "b")
+    assert explanations.get("hemoglobin|low") == "a"
+    explanations.put("tsh|high", "c")
+    assert explanations.get("glucose|high") is None
+    assert explanations.get("hemoglobin|low") == "a"
+    assert explanations.stats()["evictions"] == 1
+
+
+def test_explanations_expire(clock):
+    explanations = ExplanationCache(ttl=60)
+    explanations.put("hemoglobin|low", "a")
+    clock.now += 59
+    assert explanations.get("hemoglobin|low") == "a"
+    # Unlike the result cache, reads don't extend an explanation's lifetime.
+    clock.now += 1
+    assert explanations.get("hemoglobin|low") is None
+    assert explanations.stats()["expired"] == 1
+
+
+def test_explanations_survive_a_restart_until_they_expire(tmp_path, clock):
+    path = str(tmp_path / "explanations.json")
+    explanations = ExplanationCache(ttl=60, path=path)
+    explanations.put("hemoglobin|low", "a")
+    clock.now += 30
+    explanations.put("glucose|high", "b")
+    explanations.save()
+
+    clock.now += 40
+    reloaded = ExplanationCache(ttl=60, path=path)
+    assert reloaded.get("hemoglobin|low") is None
+    assert reloaded.get("glucose|high") == "b"
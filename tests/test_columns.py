@@ -0,0 +1,29 @@
+import pytest
+
+from columns import column_role, columns_to_ocr
+
+
+@pytest.mark.parametrize("header, role", [
+    ("Test Name", "parameter"),
+    ("Result", "result"),
+    ("Resu1t", "result"),
+    ("Result Unit", "result"),
+    ("Value (Units)", "result"),
+    ("Units", "unit"),
+    ("Normal Value", "range"),
+    ("Biological Ref. Interval", "range"),
+    ("Test Method", "method"),
+    ("Flag", "flag"),
+    ("", None),
+])
+def test_column_role(header, role):
+    assert column_role(header) == role
+
+
+def test_combined_result_unit_column_is_kept():
+    assert columns_to_ocr(["Investigation", "Result Unit", "Reference Range", "Method"]) == [True, True, True, False]
+    assert columns_to_ocr(["Test", "Value (Units)", "Units", "Normal Range"]) == [True, True, False, True]
+
+
+def test_everything_is_ocrd_without_result_and_range_columns():
+    assert columns_to_ocr(["Test", "Units", "Reference Range"]) is None
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from confidence import ConfidenceGate
+
+
+def test_empty_gate_passes_only_a_zero_threshold():
+    assert ConfidenceGate(0.0).can_pass()
+    assert not ConfidenceGate(0.5).can_pass()
+
+
+def test_pending_scores_count_as_perfect():
+    gate = ConfidenceGate(0.8)
+    gate.add([0.6])
+    assert not gate.can_pass()
+    gate.expect(2)
+    # Best case (0.6 + 1 + 1) / 3 = 0.8667.
+    assert gate.can_pass()
+    gate.add([0.9], settled=1)
+    assert gate.can_pass()
+    # A cell without any text settles its expected score without adding one.
+    gate.add([], settled=1)
+    assert not gate.can_pass()
+    assert gate.average() == pytest.approx(0.75)
+
+
+def test_threshold_is_compared_after_rounding():
+    gate = ConfidenceGate(0.6667)
+    gate.add([1.0, 1.0, 0.0])
+    assert gate.can_pass()
+    gate = ConfidenceGate(0.6668)
+    gate.add([1.0, 1.0, 0.0])
+    assert not gate.can_pass()
+
+
+def test_structure_stage_rejects_before_any_ocr():
+    # Low detection and structure scores, and too few cells to make up for them.
+    gate = ConfidenceGate(0.9)
+    gate.add([0.5])
+    gate.add([0.6, 0.55])
+    gate.expect(4)
+    assert not gate.can_pass()
+
+
+def test_ocr_stops_at_the_first_chunk_that_rules_the_threshold_out():
+    gate = ConfidenceGate(0.9)
+    gate.add([0.95, 0.9])
+    gate.expect(6)
+    chunks = [[0.9, 0.95], [0.2, 0.3], [0.99, 0.99]]
+    for index, chunk in enumerate(chunks):
+        gate.add(chunk, settled=len(chunk))
+        if not gate.can_pass():
+            gate.reject("ocr")
+            break
+    assert (index, gate.rejected_stage) == (1, "ocr")
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_early_rejection_agrees_with_the_final_average(seed):
+    # Whenever the gate rejects part-way, the finished pipeline would have failed too.
+    rng = random.Random(seed)
+    threshold = rng.uniform(0.5, 0.95)
+    scores = [rng.uniform(0.3, 1.0) for _ in range(12)]
+    gate = ConfidenceGate(threshold)
+    gate.expect(len(scores))
+    rejected = False
+    for score in scores:
+        # An OCR'd cell may also yield no score at all, which only settles the expectation.
+        gate.add([score] if score > 0.4 else [], settled=1)
+        rejected = rejected or not gate.can_pass()
+    final = gate.can_pass()
+    assert not (rejected and final)
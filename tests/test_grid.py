@@ -0,0 +1,97 @@
+import numpy as np
+
+from grid import IntervalIndex, TableGrid, suppress_overlaps
+
+
+def test_suppress_overlaps_keeps_the_best_of_overlapping_intervals():
+    starts = np.array([0.0, 1.0, 20.0, 40.0])
+    ends = np.array([10.0, 11.0, 30.0, 50.0])
+    scores = np.array([0.6, 0.9, 0.8, 0.7])
+    assert suppress_overlaps(starts, ends, scores, 0.5).tolist() == [1, 2, 3]
+
+
+def test_suppress_overlaps_threshold():
+    starts, ends, scores = np.array([0.0, 5.0]), np.array([10.0, 15.0]), np.array([0.9, 0.8])
+    # IoU of the two intervals is 5 / 15.
+    assert suppress_overlaps(starts, ends, scores, 0.3).tolist() == [0]
+    assert suppress_overlaps(starts, ends, scores, 0.5).tolist() == [0, 1]
+
+
+def test_suppress_overlaps_ignores_empty_intervals():
+    starts, ends, scores = np.array([5.0, 5.0]), np.array([5.0, 5.0]), np.array([0.9, 0.8])
+    assert suppress_overlaps(starts, ends, scores, 0.5).tolist() == [0, 1]
+
+
+def _predictions():
+    # Label 0 = row, 1 = column, 2 = anything else; rows and columns are out of order.
+    labels = np.array([0, 1, 0, 1, 2, 0])
+    scores = np.array([0.9, 0.95, 0.8, 0.85, 0.99, 0.7])
+    boxes = np.array([
+        [0, 20, 100, 30],    # row 2
+        [50, 0, 100, 40],    # column 1
+        [0, 0, 100, 10],     # row 0
+        [0, 0, 50, 40],      # column 0
+        [0, 0, 100, 40],     # table
+        [0, 1, 100, 11],     # duplicate of row 0
+    ], dtype=np.float64)
+    return labels, scores, boxes
+
+
+def test_from_predictions_sorts_rows_and_columns():
+    grid = TableGrid.from_predictions(*_predictions(), row_label=0, column_label=1)
+    assert (grid.num_rows, grid.num_columns, grid.num_cells) == (3, 2, 6)
+    assert grid.rows[:, 1].tolist() == [0, 1, 20]
+    assert grid.columns[:, 0].tolist() == [0, 50]
+    assert grid.cells[2, 1].tolist() == [50, 20, 100, 30]
+
+
+def test_from_predictions_drops_duplicate_rows():
+    grid = TableGrid.from_predictions(*_predictions(), row_label=0, column_label=1, nms_threshold=0.5)
+    assert grid.rows.tolist() == [[0, 0, 100, 10], [0, 20, 100, 30]]
+    assert grid.row_scores.tolist() == [0.8, 0.9]
+    assert grid.num_columns == 2
+
+
+def test_from_predictions_without_rows_or_columns():
+    labels, scores, boxes = _predictions()
+    grid = TableGrid.from_predictions(labels, scores, boxes, row_label=0, column_label=3, nms_threshold=0.5)
+    assert (grid.num_rows, grid.num_columns) == (2, 0)
+    assert grid.cells.shape == (2, 0, 4)
+
+
+def test_to_cell_coordinates_round_trips_through_coerce():
+    grid = TableGrid.from_predictions(*_predictions(), row_label=0, column_label=1, nms_threshold=0.5)
+    coordinates = grid.to_cell_coordinates()
+    assert coordinates[1]['cells'][0]['cell'] == [0, 20, 50, 30]
+    assert coordinates[1]['cell_count'] == 2
+    coerced = TableGrid.coerce(coordinates)
+    assert np.array_equal(coerced.cells, grid.cells)
+
+
+def test_interval_index_finds_the_containing_interval():
+    index = IntervalIndex([[20, 30], [0, 10], [10, 20]])
+    assert index.find(5) == 1
+    assert index.find(25) == 0
+    assert index.find(-1) is None
+    assert index.find(31) is None
+
+
+def test_interval_index_prefers_the_closest_centre_among_overlaps():
+    index = IntervalIndex([[0, 100], [40, 60], [45, 50]])
+    assert index.find(47) == 2
+    assert index.find(55) == 1
+    assert index.find(90) == 0
+
+
+def test_interval_index_looks_past_short_intervals_to_a_long_one():
+    # The long first interval is only reachable through the running maximum of the ends.
+    index = IntervalIndex([[0, 100], [10, 12], [20, 22], [30, 32]])
+    assert index.find(50) == 0
+    assert index.find(21) == 2
+
+
+def test_interval_index_boundaries_and_empty_index():
+    index = IntervalIndex([[0, 10], [10, 20]])
+    assert index.find(0) == 0
+    assert index.find(20) == 1
+    assert IntervalIndex([]).find(5) is None
@@ -0,0 +1,26 @@
+import pytest
+
+from guardrails import pre_validate
+
+
+@pytest.mark.parametrize("explanation", [
+    "Your insulin level is higher than usual, which means your body is making more of this hormone.",
+    "Thyroxine (T4) is a thyroid hormone; a low value can mean the thyroid is less active.",
+    "Folic acid is a B vitamin; your level is below the reference range.",
+    "Cyanocobalamin, also called vitamin B12, is a little low in your blood.",
+    "Erythropoietin is a hormone from the kidneys that tells the body to make red blood cells.",
+])
+def test_analyte_names_are_not_medicines(explanation):
+    assert pre_validate({"explanations": [explanation]}) == []
+
+
+def test_medicine_names_are_rejected():
+    violations = pre_validate({"explanations": ["Your sugar is high, so metformin may be discussed."]})
+    assert violations == ["Explanation 0 mentions the medicine 'metformin'."]
+
+
+def test_the_findings_own_parameter_is_exempt():
+    explanation = "Your heparin level is above the target range for this test."
+    assert pre_validate({"explanations": [explanation]}) != []
+    assert pre_validate({"explanations": [explanation]}, ["Heparin Anti-Xa"]) == []
+    assert pre_validate({"explanations": [explanation + " Warfarin is also mentioned."]}, ["Heparin Anti-Xa"]) != []
@@ -0,0 +1,123 @@
+import socket
+
+import pytest
+
+import jobs
+from jobs import WebhookRejected, check_webhook_url
+
+
+def _resolve_to(monkeypatch, *addresses):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET6 if ":" in a else socket.AF_INET, socket.SOCK_STREAM, 6, "", (a, port)) for a in addresses]
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", getaddrinfo)
+
+
+def test_webhooks_are_off_without_an_allowlist():
+    with pytest.raises(WebhookRejected, match="not enabled"):
+        check_webhook_url("https://hooks.example.com/done", allowed_hosts=[])
+
+
+def test_allowed_public_host(monkeypatch):
+    _resolve_to(monkeypatch, "93.184.216.34")
+    assert check_webhook_url("https://hooks.example.com/done", ["hooks.example.com"]) == "https://hooks.example.com/done"
+    assert check_webhook_url("https://a.b.example.org/done", [".example.org"])
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://hooks.example.com/done",
+    "hooks.example.com/done",
+    "https://evil.com/done",
+    "https://hooks.example.com.evil.com/done",
+    "https://hooks.example.com:99999/done",
+])
+def test_rejected_urls(monkeypatch, url):
+    _resolve_to(monkeypatch, "93.184.216.34")
+    with pytest.raises(WebhookRejected):
+        check_webhook_url(url, ["hooks.example.com"])
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "192.168.1.10", "169.254.169.254", "::1", "fd00::1", "0.0.0.0"])
+def test_allowed_host_resolving_to_an_internal_address_is_rejected(monkeypatch, address):
+    _resolve_to(monkeypatch, "93.184.216.34", address)
+    with pytest.raises(WebhookRejected, match="non-public"):
+        check_webhook_url("https://hooks.example.com/done", ["hooks.example.com"])
+
+
+def test_literal_metadata_address_is_rejected():
+    with pytest.raises(WebhookRejected, match="non-public"):
+        check_webhook_url("http://169.254.169.254/latest/meta-data/", ["169.254.169.254"])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(jobs.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    return jobs.JobStore(str(tmp_path / "jobs.sqlite3"), max_queued={"interactive": 2, "backfill": 2},
+                         lease_seconds=60, max_attempts=2)
+
+
+def test_claim_takes_interactive_jobs_first_then_oldest(store, clock):
+    backfill = store.submit("text", "analyze", b"a", lane="backfill")
+    clock[0] += 1
+    first = store.submit("text", "analyze", b"b")
+    clock[0] += 1
+    second = store.submit("text", "analyze", b"c")
+    assert store.get(second)["position"] == 1
+
+    assert [store.claim("w")["id"] for _ in range(3)] == [first, second, backfill]
+    assert store.claim("w") is None
+    job = store.get(first)
+    assert (job["status"], job["attempts"]) == ("running", 1)
+
+
+def test_full_lane_is_refused(store):
+    store.submit("text", "analyze", b"a")
+    store.submit("text", "analyze", b"b")
+    with pytest.raises(jobs.JobQueueFull):
+        store.submit("text", "analyze", b"c")
+    store.submit("text", "analyze", b"c", lane="backfill")
+
+
+def test_only_the_lease_holder_finishes_a_job(store):
+    job_id = store.submit("text", "analyze", b"a")
+    store.claim("w1")
+    assert not store.complete(job_id, "w2", {"ok": True})
+    assert store.complete(job_id, "w1", {"ok": True})
+    assert store.get(job_id)["result"] == {"ok": True}
+    assert not store.fail(job_id, "w1", "too late")
+
+
+def test_expired_lease_is_requeued(store, clock):
+    job_id = store.submit("text", "analyze", b"a")
+    store.claim("w1")
+    clock[0] += 30
+    assert store.heartbeat(job_id, "w1")
+    clock[0] += 60
+    assert store.requeue_expired() == 0
+    clock[0] += 1
+    assert store.requeue_expired() == 1
+    assert store.get(job_id)["status"] == "queued"
+
+    # The old worker lost the job: it can neither renew nor finish it.
+    assert not store.heartbeat(job_id, "w1")
+    assert store.claim("w2")["id"] == job_id
+    assert not store.complete(job_id, "w1", {})
+    assert store.get(job_id)["attempts"] == 2
+
+
+def test_job_fails_after_max_attempts(store, clock):
+    job_id = store.submit("text", "analyze", b"a")
+    store.claim("w1")
+    assert store.requeue_worker("w1") == 1
+    store.claim("w2")
+    clock[0] += 61
+    assert store.requeue_expired() == 0
+    job = store.get(job_id)
+    assert (job["status"], job["attempts"]) == ("failed", 2)
+    assert "too many times" in job["error"]
+    assert store.claim("w3") is None
@@ -0,0 +1,63 @@
+import re
+import asyncio
+
+import llm_service
+from cache import ExplanationCache
+
+
+def _findings(count: int) -> dict:
+    return {f"row_{i}": {"parameter": f"Test {i}", "results": "10", "range": "1 - 5", "status": "High"}
+            for i in range(count)}
+
+
+def _fake_llm(monkeypatch, explanations_for):
+    """query_llm answering every generation call with explanations_for(parameters of the chunk)."""
+    async def query_llm(payload, **kwargs):
+        parameters = re.findall(r"^\d+\. ([^:\n]*):", payload["messages"][-1]["content"], re.MULTILINE)
+        explanations = explanations_for(parameters)
+        content = '{"explanations": [' + ", ".join(f'"{e}"' for e in explanations) + "]}"
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+    monkeypatch.setattr(llm_service, "query_llm", query_llm)
+
+
+def test_chunks_are_merged_in_report_order(monkeypatch):
+    monkeypatch.setattr(llm_service, "chunk_findings", lambda results: [
+        dict(list(results.items())[:3]), dict(list(results.items())[3:])])
+    _fake_llm(monkeypatch, lambda parameters: [f"About {p} being high." for p in parameters])
+
+    output = asyncio.run(llm_service._generate_explanations(_findings(5)))
+
+    assert output == {"explanations": [f"About Test {i} being high." for i in range(5)]}
+
+
+def test_a_chunk_with_the_wrong_count_fails_instead_of_shifting(monkeypatch):
+    monkeypatch.setattr(llm_service, "chunk_findings", lambda results: [
+        dict(list(results.items())[:3]), dict(list(results.items())[3:])])
+    # The first chunk drops one explanation, the second adds one: same total.
+    _fake_llm(monkeypatch, lambda parameters: [f"About {p} being high." for p in parameters][:-1]
+              if "Test 0" in parameters else [f"About {p} being high." for p in parameters] + ["Extra."])
+
+    output = asyncio.run(llm_service._generate_explanations(_findings(6)))
+
+    assert output == {"error": llm_service.EXPLANATION_COUNT_MISMATCH}
+
+
+def test_explanations_quoting_the_patients_values_are_not_cached(monkeypatch):
+    cache = ExplanationCache(path=None)
+    monkeypatch.setattr(llm_service, "explanation_cache", cache)
+    results = {
+        "row_0": {"parameter": "Hemoglobin", "results": "10.2", "range": "13.0 - 17.0", "status": "Low"},
+        "row_1": {"parameter": "WBC", "results": "12,500", "range": "4,000 - 11,000", "status": "High"},
+        "row_2": {"parameter": "Glucose", "results": "140", "range": "70 - 100", "status": "High"},
+    }
+    explanations = [
+        "Your hemoglobin of 10.2 g/dL is below the normal 13 to 17.",
+        "Your white cell count is 12500, a little higher than usual.",
+        "Your blood sugar is higher than usual.",
+    ]
+
+    asyncio.run(llm_service._remember_explanations(results, {"explanations": explanations}))
+
+    assert cache.get(llm_service.explanation_key(results["row_0"])) is None
+    assert cache.get(llm_service.explanation_key(results["row_1"])) is None
+    assert cache.get(llm_service.explanation_key(results["row_2"])) == "Your blood sugar is higher than usual."
@@ -0,0 +1,27 @@
+import pytest
+
+from text_parser import parse_line
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("pH: 7.38 (7.350 - 7.450)", ("pH", "7.38", "7.350 - 7.450", "Normal")),
+    ("Hemoglobin 10.2 g/dL 13.0-17.0", ("Hemoglobin", "10.2", "13.0 - 17.0 g/dL", "Low")),
+    ("LDL Cholesterol | 160 | mg/dL | < 100", ("LDL Cholesterol", "160", "< 100 mg/dL", "High")),
+    ("WBC = 7,500 /cumm (Ref: 4,000 to 11,000)", ("WBC", "7,500", "4,000 - 11,000 /cumm", "Normal")),
+    ("Potassium 3.2 L 3.5-5.1", ("Potassium", "3.2", "3.5 - 5.1", "Low")),
+    ("Potassium 3.2 mmol/L L 3.5-5.1", ("Potassium", "3.2", "3.5 - 5.1 mmol/L", "Low")),
+    ("Sodium 150 H 135 - 145 mmol/L", ("Sodium", "150", "135 - 145 mmol/L", "High")),
+    ("Glucose 90 N (70-100)", ("Glucose", "90", "70 - 100", "Normal")),
+    ("Creatinine: 1.2 mg/dL (0.7 - 1.3) Normal", ("Creatinine", "1.2", "0.7 - 1.3 mg/dL", "Normal")),
+    ("Urea: 60 mg/dL (15 - 45) High", ("Urea", "60", "15 - 45 mg/dL", "High")),
+    ("TSH | 0.1 | uIU/mL | 0.4 - 4.0 | Abnormal", ("TSH", "0.1", "0.4 - 4.0 uIU/mL", "Low")),
+    ("Platelets 90 x10^3/uL 150-400 L", ("Platelets", "90", "150 - 400 x10^3/uL", "Low")),
+])
+def test_parse_line(line, expected):
+    row = parse_line(line)
+    assert row is not None
+    assert (row["parameter"], row["results"], row["range"], row["status"]) == expected
+
+
+def test_line_without_a_range_is_not_a_finding():
+    assert parse_line("Age: 45 years") is None